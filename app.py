@@ -15,17 +15,25 @@ if str(current_dir) not in sys.path:
     sys.path.insert(0, str(current_dir))
 
 from src.spotify import (
+    get_client_pool,
     get_spotify_auth_manager,
-    get_spotify_client,
-    search_track_on_spotify
+    get_spotify_client
 )
+from src.jobs import get_job_executor, DONE, FAILED
+from src.prefetch import get_track_prefetcher
+from src.tokens import get_token_store, get_valid_token, token_expires_soon
+from src.tour import get_tour_setlist
+from src.sync import app_playlist_marker
+from src.metrics import start_metrics_server
 from src.setlistfm import (
     search_artist,
-    get_latest_setlist
+    get_latest_setlist,
+    get_artist,
+    get_setlist,
+    get_cache_stats
 )
 from src.utils import (
-    format_setlist_structure,
-    extract_songs_from_setlist,
+    parse_setlist,
     format_song_display
 )
 
@@ -35,6 +43,9 @@ logging.basicConfig(
     format='%(asctime)s - %(levelname)s - %(message)s'
 )
 
+# Serve Prometheus metrics if METRICS_PORT is set (once per process)
+start_metrics_server()
+
 # Page configuration
 st.set_page_config(
     page_title="Setlist to Spotify",
@@ -68,31 +79,42 @@ with st.sidebar:
     st.header("Step 1: Connect to Spotify")
     spotify_connected = False
     
+    if "spotify_token_info" in st.session_state and token_expires_soon(st.session_state["spotify_token_info"]):
+        # Refresh ahead of expiry, so background playlist builds don't run out of token
+        try:
+            st.session_state["spotify_token_info"] = get_valid_token(get_spotify_auth_manager(
+                cache_handler=get_token_store().handler(st.session_state["user_id"])
+            ))
+        except Exception as e:
+            logging.error(f"Error refreshing Spotify token: {str(e)}")
+            st.session_state["spotify_token_info"] = None
+        if not st.session_state["spotify_token_info"]:
+            del st.session_state["spotify_token_info"]
+    
     if "spotify_token_info" in st.session_state:
         spotify_connected = True
         st.success("✓ Connected to your Spotify account")
         if st.button("Disconnect from Spotify", key="disconnect_button"):
             # Clear all Spotify-related session state
-            keys_to_clear = ["spotify_token_info", "selected_artist", "selected_setlist"]
+            keys_to_clear = ["spotify_token_info", "selected_artist_mbid", "selected_setlist_id"]
             for key in keys_to_clear:
                 if key in st.session_state:
                     del st.session_state[key]
-            # Remove the user-specific cache file if it exists
-            cache_file = f".spotify_caches-{st.session_state['user_id']}"
-            if os.path.exists(cache_file):
-                os.remove(cache_file)
+            # Forget the user's stored token and pooled client
+            get_token_store().delete(st.session_state["user_id"])
+            get_client_pool().discard(st.session_state["user_id"])
             st.rerun()
     else:
         st.warning("⚠️ Not connected to Spotify")
         try:
-            # Create a unique cache file for this user
-            cache_file = f".spotify_caches-{st.session_state['user_id']}"
-            
-            # Initialize Spotify auth manager
-            spotify_auth_manager = get_spotify_auth_manager(cache_path=cache_file)
+            # Initialize Spotify auth manager with this user's entry in the token store
+            spotify_auth_manager = get_spotify_auth_manager(
+                cache_handler=get_token_store().handler(st.session_state["user_id"]),
+                redirect_uri=st.query_params.get("redirect_uri")
+            )
             
             # Check if we have a cached token
-            token_info = spotify_auth_manager.get_cached_token()
+            token_info = get_valid_token(spotify_auth_manager)
             
             if token_info:
                 # If we have a cached token, use it
@@ -102,12 +124,11 @@ with st.sidebar:
                 st.info("👉 Connect your Spotify account to create playlists")
                 if st.button("Connect to Spotify", key="connect_button"):
                     # Store current state before authentication
+                    # Only IDs are kept; the objects live in the shared Setlist.fm cache
                     st.session_state["pre_auth_state"] = {
                         "search_query": st.session_state.get("last_search", ""),
-                        "current_artist": st.session_state.get("current_artist", None),
-                        "current_setlist": st.session_state.get("current_setlist", None),
-                        "selected_artist": st.session_state.get("selected_artist", None),
-                        "selected_setlist": st.session_state.get("selected_setlist", None)
+                        "selected_artist_mbid": st.session_state.get("selected_artist_mbid", None),
+                        "selected_setlist_id": st.session_state.get("selected_setlist_id", None)
                     }
                     
                     # Get authorization URL and redirect
@@ -119,12 +140,12 @@ with st.sidebar:
 # Check for Spotify authentication callback
 if "code" in st.query_params and not "spotify_token_info" in st.session_state:
     try:
-        # Create a unique cache file for this user
-        cache_file = f".spotify_caches-{st.session_state['user_id']}"
-        
-        # Initialize Spotify auth manager
+        # Initialize Spotify auth manager with this user's entry in the token store
         try:
-            spotify_auth_manager = get_spotify_auth_manager(cache_path=cache_file)
+            spotify_auth_manager = get_spotify_auth_manager(
+                cache_handler=get_token_store().handler(st.session_state["user_id"]),
+                redirect_uri=st.query_params.get("redirect_uri")
+            )
         except Exception as e:
             st.error(f"""
                 Failed to initialize Spotify connection. Please check your Spotify API credentials.
@@ -211,6 +232,47 @@ if not spotify_connected:
     st.warning("Please connect to Spotify using the sidebar before searching for artists.")
     st.stop()
 
+def get_session_spotify_client():
+    """Reuse this user's client and its warm connections; it refreshes the token in place"""
+    return get_spotify_client(
+        st.session_state["spotify_token_info"],
+        key=st.session_state["user_id"],
+        auth_manager=get_spotify_auth_manager(
+            cache_handler=get_token_store().handler(st.session_state["user_id"]),
+            redirect_uri=st.query_params.get("redirect_uri")
+        )
+    )
+
+def load_selected_setlist():
+    """Get the selected artist and setlist, or (None, None) if Setlist.fm could not be reached"""
+    try:
+        return get_artist(st.session_state["selected_artist_mbid"]), get_setlist(st.session_state["selected_setlist_id"])
+    except Exception as e:
+        logging.error(f"Error loading the selected setlist: {str(e)}")
+        return None, None
+
+with st.expander("Festival mode: one playlist for a whole lineup"):
+    lineup_text = st.text_area("Lineup (one artist per line):", key="festival_lineup")
+    festival_name = st.text_input("Playlist Name:", value="Festival lineup", key="festival_name")
+    
+    if st.button("Create Festival Playlist"):
+        lineup = [line.strip() for line in lineup_text.splitlines() if line.strip()]
+        if not lineup:
+            st.warning("Add at least one artist to the lineup.")
+        else:
+            try:
+                # Every artist's setlist is fetched at once and the songs go into a single playlist
+                get_job_executor().submit_festival(
+                    st.session_state["user_id"],
+                    get_session_spotify_client(),
+                    lineup,
+                    name=festival_name,
+                    description=f"The latest setlists of the {festival_name} lineup. {app_playlist_marker('festival')}."
+                )
+                st.info(f"Creating your festival playlist from {len(lineup)} artists in the background.")
+            except Exception as e:
+                st.error(f"An error occurred: {str(e)}")
+
 search_query = st.text_input("Enter artist name:", key="search_input", value=st.session_state.get("last_search", ""))
 
 # Store the search query in session state
@@ -219,15 +281,17 @@ if search_query:
 
 if search_query:
     with st.spinner("Searching for artist..."):
-        artist = search_artist(search_query)
+        try:
+            artist = search_artist(search_query)
+            latest_setlist = get_latest_setlist(artist['mbid']) if artist else None
+        except Exception as e:
+            # Not cached, so the next search tries Setlist.fm again
+            logging.error(f"Error searching Setlist.fm for {search_query}: {str(e)}")
+            st.error("Could not reach Setlist.fm right now. Please try again in a moment.")
+            st.stop()
         
         if artist:
-            latest_setlist = get_latest_setlist(artist['mbid'])
-            
             if latest_setlist:
-                # Store the search results in session state
-                st.session_state["current_artist"] = artist
-                st.session_state["current_setlist"] = latest_setlist
                 
                 st.subheader(artist["name"])
                 if "disambiguation" in artist:
@@ -236,18 +300,24 @@ if search_query:
                 # Display the latest setlist info
                 st.write(f"Latest tour: {latest_setlist['eventDate']} at {latest_setlist['venue']['name']}, {latest_setlist['venue']['city']['name']}")
                 
-                # Store the selected artist and setlist
-                st.session_state["selected_artist"] = artist
-                st.session_state["selected_setlist"] = latest_setlist
+                # Store the selected artist and setlist by ID; the objects stay in the shared cache
+                st.session_state["selected_artist_mbid"] = artist["mbid"]
+                st.session_state["selected_setlist_id"] = latest_setlist["id"]
             else:
                 st.warning(f"{artist['name']} has not been reported touring in the last 12 months.")
         else:
             st.warning(f"No exact matches found for '{search_query}'. Try searching for the exact artist name.")
+    
+    # Reruns that keep the same query are answered from the Setlist.fm cache
+    logging.debug(f"Setlist.fm cache saved {get_cache_stats()['calls_saved']} calls so far")
 
 # Display stored search results if they exist (after authentication)
-elif "current_artist" in st.session_state and "current_setlist" in st.session_state:
-    artist = st.session_state["current_artist"]
-    latest_setlist = st.session_state["current_setlist"]
+elif "selected_artist_mbid" in st.session_state and "selected_setlist_id" in st.session_state:
+    artist, latest_setlist = load_selected_setlist()
+    
+    if not artist or not latest_setlist:
+        st.error("Could not load the selected setlist. Please search for the artist again.")
+        st.stop()
     
     st.subheader(artist["name"])
     if "disambiguation" in artist:
@@ -255,47 +325,73 @@ elif "current_artist" in st.session_state and "current_setlist" in st.session_st
     
     # Display the latest setlist info
     st.write(f"Latest tour: {latest_setlist['eventDate']} at {latest_setlist['venue']['name']}, {latest_setlist['venue']['city']['name']}")
-    
-    # Ensure the selected artist and setlist are stored
-    st.session_state["selected_artist"] = artist
-    st.session_state["selected_setlist"] = latest_setlist
+
+# Whether this run shows a setlist whose tracks are being prefetched
+prefetching = False
 
 # Create Playlist section (only shown if an artist is selected)
-if "selected_setlist" in st.session_state:
+if "selected_setlist_id" in st.session_state:
     st.markdown("---")
     st.header("Step 3: Create Spotify Playlist")
     
-    setlist = st.session_state["selected_setlist"]
-    artist = st.session_state["selected_artist"]
+    artist, setlist = load_selected_setlist()
+    if not setlist or not artist:
+        st.error("Could not load the selected setlist. Please search for the artist again.")
+        st.stop()
     
-    # Extract and display setlist
-    songs = extract_songs_from_setlist(setlist, artist["name"])
+    playlist_source = st.radio(
+        "Build the playlist from:",
+        ("Latest show", "Whole tour"),
+        horizontal=True,
+        help="Whole tour ranks songs by how often they were played across the artist's recent shows."
+    )
+    
+    if playlist_source == "Whole tour":
+        try:
+            with st.spinner("Collecting setlists from the tour..."):
+                tour = get_tour_setlist(artist["mbid"], artist["name"])
+        except Exception as e:
+            logging.error(f"Error collecting tour setlists for {artist['name']}: {str(e)}")
+            st.error("Could not collect the tour's setlists from Setlist.fm. Please try again in a moment.")
+            st.stop()
+        songs = [song for song, _ in tour["songs"]] if tour else []
+        prefetch_key = f"tour-{artist['mbid']}"
+        default_name = f"{artist['name']} - Tour setlist ({tour['shows'] if tour else 0} shows)"
+        default_description = (
+            f"The expected setlist of {artist['name']}'s tour, from their last "
+            f"{tour['shows'] if tour else 0} shows. {app_playlist_marker('tour')}."
+        )
+        # Tour and latest-show playlists are tagged apart, so each only syncs with its own kind
+        playlist_kind = "tour"
+    else:
+        # Parse the setlist once; rendering and playlist creation share the result
+        parsed_setlist = parse_setlist(setlist, artist["name"])
+        songs = list(parsed_setlist.songs)
+        prefetch_key = setlist["id"]
+        default_name = f"{artist['name']} - {setlist['venue']['name']} ({setlist['eventDate']})"
+        default_description = f"Setlist from {artist['name']} at {setlist['venue']['name']}, {setlist['venue']['city']['name']} on {setlist['eventDate']}. {app_playlist_marker()}."
+        playlist_kind = "show"
     
     if songs:
         st.subheader("Setlist")
-        formatted_sets = format_setlist_structure(setlist)
-        song_index = 1
-        
-        for set_name, set_data_list in formatted_sets:
-            st.write(f"**{set_name}:**")
-            
-            for set_data in set_data_list:
-                if "song" in set_data:
-                    for song in set_data["song"]:
-                        display_text = format_song_display({
-                            "name": song["name"],
-                            "original_artist": song.get("cover", {}).get("name", artist["name"]),
-                            "info": song.get("info", ""),
-                            "is_tape": song.get("tape", False),
-                            "is_cover": "cover" in song
-                        }, song_index)
-                        st.write(display_text)
-                        song_index += 1
-                else:
-                    st.write("*No songs listed for this set*")
+        if playlist_source == "Whole tour":
+            for song, plays in tour["songs"]:
+                st.write(f"{format_song_display(song, song.position)} · played at {plays} of {tour['shows']} shows")
+        else:
+            formatted_sets = parsed_setlist.sections
             
-            if set_name != formatted_sets[-1][0]:  # Don't add space after last set
-                st.write("")
+            for set_name, sets in formatted_sets:
+                st.write(f"**{set_name}:**")
+                
+                for set_ in sets:
+                    if set_.songs:
+                        for song in set_.songs:
+                            st.write(format_song_display(song, song.position))
+                    else:
+                        st.write("*No songs listed for this set*")
+                
+                if set_name != formatted_sets[-1][0]:  # Don't add space after last set
+                    st.write("")
         
         st.write(f"**Total tracks:** {len(songs)}")
         st.markdown("---")
@@ -303,60 +399,114 @@ if "selected_setlist" in st.session_state:
         if "spotify_token_info" not in st.session_state:
             st.warning("Please connect to Spotify using the sidebar before creating a playlist.")
         else:
+            sp = get_session_spotify_client()
+            # Start resolving the songs while the user edits the playlist details
+            get_track_prefetcher().start(st.session_state["user_id"], prefetch_key, sp, songs)
+            prefetching = True
+            
             playlist_name = st.text_input(
                 "Playlist Name:", 
-                value=f"{artist['name']} - {setlist['venue']['name']} ({setlist['eventDate']})"
+                value=default_name
             )
             
             playlist_description = st.text_area(
                 "Playlist Description:", 
-                value=f"Setlist from {artist['name']} at {setlist['venue']['name']}, {setlist['venue']['city']['name']} on {setlist['eventDate']}. Created with Setlist to Spotify app."
+                value=default_description
+            )
+            
+            sync_playlist = st.checkbox(
+                f"Update my previous {'tour' if playlist_kind == 'tour' else 'latest show'} playlist for this artist",
+                help="Only the songs that changed since the last "
+                     f"{'tour playlist' if playlist_kind == 'tour' else 'show'} are added, removed or moved, "
+                     "instead of creating another playlist. A new one is created if none is found."
             )
             
             if st.button("Create Playlist"):
-                with st.spinner("Creating playlist..."):
-                    try:
-                        # Initialize Spotify client
-                        sp = get_spotify_client(st.session_state["spotify_token_info"]["access_token"])
-                        
-                        # Get current user info
-                        user_info = sp.current_user()
-                        user_id = user_info["id"]
-                        
-                        # Create a new playlist
-                        playlist = sp.user_playlist_create(
-                            user=user_id,
-                            name=playlist_name,
-                            public=True,
-                            description=playlist_description
-                        )
-                        
-                        # Search for songs and add them to the playlist
-                        track_uris = []
-                        not_found = []
-                        
-                        for song in songs:
-                            track_uri = search_track_on_spotify(sp, song["name"], song["original_artist"])
-                            if track_uri:
-                                track_uris.append(track_uri)
-                            else:
-                                not_found.append(song["name"])
-                        
-                        if track_uris:
-                            sp.playlist_add_items(playlist["id"], track_uris)
-                        
-                        # Display results
-                        st.success(f"Successfully created playlist with {len(track_uris)} songs!")
-                        st.write(f"[Open in Spotify](https://open.spotify.com/playlist/{playlist['id']})")
-                        
-                        if not_found:
-                            st.warning(f"Could not find {len(not_found)} songs on Spotify:")
-                            st.write(", ".join(not_found))
-                    except Exception as e:
-                        st.error(f"An error occurred: {str(e)}")
+                try:
+                    # Build the playlist in the background; progress shows in the sidebar.
+                    # Songs the prefetch already resolved are not looked up again.
+                    get_job_executor().submit(
+                        st.session_state["user_id"],
+                        sp,
+                        songs,
+                        name=playlist_name,
+                        description=playlist_description,
+                        access_token=st.session_state["spotify_token_info"]["access_token"],
+                        cover_artist=artist["name"],
+                        resolved=get_track_prefetcher().take(prefetch_key, songs),
+                        sync_artist=artist["name"] if sync_playlist else None,
+                        kind=playlist_kind
+                    )
+                    st.info("Creating your playlist in the background. You can keep browsing while it builds.")
+                except Exception as e:
+                    st.error(f"An error occurred: {str(e)}")
+    elif playlist_source == "Whole tour":
+        st.warning("No recent shows with songs found for this artist.")
     else:
         st.warning("No songs found in this setlist.")
 
+if not prefetching:
+    # Cancel lookups for a setlist this session no longer shows
+    get_track_prefetcher().release(st.session_state["user_id"])
+
+# Why a lineup artist added no songs to a festival playlist
+LINEUP_STATUSES = {
+    "no_artist": "not found on Setlist.fm",
+    "no_setlist": "no setlist in the last 12 months",
+    "no_songs": "latest setlist has no songs",
+    "error": "could not be looked up"
+}
+
+def render_playlist_jobs(polling):
+    """Show this session's playlist builds, refreshing while any are still running"""
+    jobs = [job.snapshot() for job in get_job_executor().session_jobs(st.session_state["user_id"])]
+    
+    for job in jobs:
+        if job["status"] == DONE:
+            message = f"✓ {job['name']}: {job['tracks']} songs"
+            changes = job["changes"]
+            if changes is not None and changes["requests"]:
+                message += f" ({changes['added']} added, {changes['removed']} removed, {changes['moved']} moved)"
+            elif changes is not None:
+                message += " (already up to date)"
+            st.success(message)
+            st.write(f"[Open in Spotify](https://open.spotify.com/playlist/{job['playlist_id']})")
+        elif job["status"] == FAILED:
+            st.error(f"{job['name']}: {job['error']}")
+        else:
+            progress = job["completed"] / job["total"] if job["total"] else 0.0
+            st.progress(progress, text=f"{job['name']}: {job['stage']} ({job['completed']}/{job['total']})")
+        
+        if job["not_found"]:
+            with st.expander(f"Could not find {len(job['not_found'])} songs on Spotify"):
+                st.write(", ".join(job["not_found"]))
+        
+        if job["artists"]:
+            with st.expander(f"Lineup: {len(job['artists'])} artists"):
+                for artist in job["artists"]:
+                    name = artist["artist"] or artist["input"]
+                    if artist["status"] == "found":
+                        duplicates = artist["songs"] - artist["unique_songs"]
+                        st.write(
+                            f"**{name}**: {artist['tracks']}/{artist['unique_songs']} tracks"
+                            f"{f', {duplicates} already in the playlist' if duplicates else ''} "
+                            f"(setlist {artist['setlist_seconds']:.1f}s, tracks {artist['resolve_seconds']:.1f}s)"
+                        )
+                    else:
+                        st.write(f"**{name}**: {LINEUP_STATUSES.get(artist['status'], artist['status'])}")
+    
+    # Stop polling once the last build has finished
+    if polling and not any(job["status"] not in (DONE, FAILED) for job in jobs):
+        st.rerun()
+
+# Playlist builds run in the background and survive reruns
+session_jobs = get_job_executor().session_jobs(st.session_state["user_id"])
+if session_jobs:
+    with st.sidebar:
+        st.header("Your Playlists")
+        polling = any(job.active for job in session_jobs)
+        st.fragment(run_every=1 if polling else None)(render_playlist_jobs)(polling)
+
 # Footer
 st.markdown("---")
 st.caption("Created with ❤️ using Streamlit, Setlist.fm API, and Spotify API")
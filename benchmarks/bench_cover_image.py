@@ -0,0 +1,113 @@
+"""
+Benchmark cover image preparation
+
+Compares, for source images of different sizes and detail:
+
+- before: full decode, LANCZOS thumbnail to 800x800 and a fixed quality=85
+  encode, uploaded as raw bytes, as upload_playlist_image used to
+- after: draft-mode decode and a quality search against Spotify's 256 KB
+  base64 limit (src/images.py)
+
+and then times get_cover_image against the local Spotify stand-in in
+benchmarks/mock_servers.py with a cold and a warm disk cache.
+
+Usage:
+    python benchmarks/bench_cover_image.py [--repeat 5]
+"""
+
+import argparse
+import io
+import random
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+# Add the project root directory to Python path
+project_root = Path(__file__).parent.parent.resolve()
+if str(project_root) not in sys.path:
+    sys.path.insert(0, str(project_root))
+
+from benchmarks.mock_servers import MockConfig, SpotifyServer
+
+# (label, size, blur radius); noise stands in for detailed photos, blur for smooth ones
+SOURCES = [
+    ("noisy 640", 640, 0),
+    ("noisy 1200", 1200, 0),
+    ("detailed 2000", 2000, 1),
+    ("smooth 3000", 3000, 4)
+]
+
+def make_source(size, blur):
+    from PIL import Image, ImageFilter
+
+    rng = random.Random(size)
+    img = Image.frombytes("RGB", (size, size), rng.randbytes(size * size * 3))
+    if blur:
+        img = img.filter(ImageFilter.GaussianBlur(blur))
+    buffer = io.BytesIO()
+    img.save(buffer, format="JPEG", quality=95)
+    return buffer.getvalue()
+
+def before(data):
+    from PIL import Image
+
+    img = Image.open(io.BytesIO(data))
+    if img.mode != "RGB":
+        img = img.convert("RGB")
+    img.thumbnail((800, 800), Image.Resampling.LANCZOS)
+    buffer = io.BytesIO()
+    img.save(buffer, format="JPEG", quality=85, optimize=True)
+    return buffer.getvalue(), 1
+
+def after(data):
+    from src.images import decode_image, encode_jpeg
+
+    jpeg, _, encodes = encode_jpeg(decode_image(data))
+    return jpeg, encodes
+
+def best_of(func, data, repeat):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func(data)
+        times.append(time.perf_counter() - start)
+    return min(times), result
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=5, help="Runs per measurement, best is reported")
+    args = parser.parse_args()
+
+    from src.images import COVER_UPLOAD_MAX_BYTES
+
+    print(f"{'source':<14} {'KiB':>6}   {'before ms':>9} {'upload KiB':>10} {'fits':>5}"
+          f"   {'after ms':>8} {'upload KiB':>10} {'encodes':>7} {'fits':>5}")
+    for label, size, blur in SOURCES:
+        data = make_source(size, blur)
+        old_time, (old_jpeg, _) = best_of(before, data, args.repeat)
+        new_time, (new_jpeg, encodes) = best_of(after, data, args.repeat)
+        # Spotify counts the base64 body; the old code sent raw bytes, which it rejects
+        old_upload = len(old_jpeg)
+        new_upload = (len(new_jpeg) + 2) // 3 * 4
+        print(f"{label:<14} {len(data) / 1024:>6.0f}   {old_time * 1000:>9.1f} {old_upload / 1024:>10.1f}"
+              f" {str(old_upload <= COVER_UPLOAD_MAX_BYTES):>5}   {new_time * 1000:>8.1f}"
+              f" {new_upload / 1024:>10.1f} {encodes:>7} {str(new_upload <= COVER_UPLOAD_MAX_BYTES):>5}")
+
+    server = SpotifyServer(MockConfig(latency=0.05)).start()
+    try:
+        with tempfile.TemporaryDirectory() as cache_dir:
+            import src.images as images
+
+            images.IMAGE_CACHE_DIR = cache_dir
+            url = server.image_url()
+            start = time.perf_counter()
+            images.get_cover_image(url)
+            cold = time.perf_counter() - start
+            warm, _ = best_of(images.get_cover_image, url, args.repeat)
+    finally:
+        server.stop()
+    print(f"\nget_cover_image over HTTP (50 ms latency): cold {cold * 1000:.1f} ms, cached {warm * 1000:.2f} ms")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+"""
+Benchmark the cold import time of the src package
+
+Imports each module in a fresh interpreter with `python -X importtime` and
+fails if the import takes longer than its budget or pulls in a heavy
+dependency the module should not need at load time (streamlit, PIL, ...).
+Short-lived batch workers pay this cost on every start.
+
+Usage:
+    python benchmarks/bench_import_time.py [--repeat 5] [--json results.json]
+"""
+
+import argparse
+import json
+import re
+import subprocess
+import sys
+from pathlib import Path
+
+project_root = Path(__file__).parent.parent.resolve()
+
+# Module -> (budget in ms, modules that must not be imported)
+BUDGETS = {
+    "src": (5, ("src.spotify", "src.setlistfm", "requests", "spotipy", "streamlit", "PIL")),
+    "src.utils": (10, ("requests", "spotipy", "streamlit", "PIL")),
+    "src.resolver": (80, ("requests", "spotipy", "streamlit", "PIL")),
+    "src.pipeline": (80, ("requests", "spotipy", "streamlit", "PIL")),
+    "src.setlistfm": (300, ("spotipy", "streamlit", "PIL")),
+    "src.batch": (300, ("spotipy", "streamlit", "PIL")),
+}
+
+IMPORTTIME_LINE = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \| (\s*)(\S+)")
+
+def run_importtime(statement):
+    """Run a statement with -X importtime and return [(cumulative_us, depth, module)]"""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", statement],
+        cwd=project_root, capture_output=True, text=True, check=True
+    )
+    entries = []
+    for line in result.stderr.splitlines():
+        match = IMPORTTIME_LINE.match(line)
+        if match:
+            entries.append((int(match.group(2)), len(match.group(3)) // 2, match.group(4)))
+    return entries
+
+def measure(module, startup_modules):
+    """
+    Measure one cold import of a module.
+
+    Returns:
+        tuple: (milliseconds, set of modules imported on the way)
+    """
+    entries = run_importtime(f"import {module}")
+    imported = {name for _, _, name in entries} - startup_modules
+    # Top-level entries not loaded by interpreter startup belong to this import
+    total_us = sum(cumulative for cumulative, depth, name in entries if depth == 0 and name in imported)
+    return total_us / 1000, imported
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=5, help="Cold imports per module; the fastest counts (default: 5)")
+    parser.add_argument("--json", help="Write results to this JSON file")
+    args = parser.parse_args()
+
+    startup_modules = {name for _, _, name in run_importtime("pass")}
+
+    failed = False
+    results = {}
+    print(f"{'module':<16} {'import ms':>10} {'budget ms':>10}")
+    for module, (budget, forbidden) in BUDGETS.items():
+        runs = [measure(module, startup_modules) for _ in range(args.repeat)]
+        elapsed = min(ms for ms, _ in runs)
+        leaked = sorted(name for name in forbidden if name in runs[0][1])
+
+        flags = []
+        if elapsed > budget:
+            flags.append("OVER BUDGET")
+        if leaked:
+            flags.append(f"imports {', '.join(leaked)}")
+        failed = failed or bool(flags)
+        print(f"{module:<16} {elapsed:>10.1f} {budget:>10}  {'  '.join(flags)}")
+
+        results[module] = {"import_ms": elapsed, "budget_ms": budget, "unexpected_imports": leaked}
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+    if failed:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+"""
+Benchmark track matching against a local search fixture
+
+Compares the legacy three-step search cascade with the single-query ranked
+matcher on calls per song and accuracy. No network access is needed: an
+in-process stand-in answers Spotify search queries from
+benchmarks/fixtures/matching.json.
+
+Usage:
+    python benchmarks/bench_matching.py [--json results.json]
+"""
+
+import argparse
+import json
+import re
+import sys
+from pathlib import Path
+
+# Add the project root directory to Python path
+project_root = Path(__file__).parent.parent.resolve()
+if str(project_root) not in sys.path:
+    sys.path.insert(0, str(project_root))
+
+from src.spotify import match_track
+
+FIXTURE_PATH = Path(__file__).parent / "fixtures" / "matching.json"
+
+def _tokens(text):
+    """Split text into lowercase word tokens, ignoring apostrophes"""
+    return set(re.findall(r"\w+", text.lower().replace("'", "")))
+
+class FixtureSpotify:
+    """Minimal stand-in for spotipy.Spotify.search backed by a fixture catalog"""
+
+    def __init__(self, tracks):
+        self.tracks = tracks
+        self.calls = 0
+
+    def search(self, q, type="track", limit=10):
+        self.calls += 1
+        fields = re.findall(r'(track|artist):"([^"]*)"', q)
+        free_text = _tokens(re.sub(r'(track|artist):"[^"]*"', " ", q))
+
+        items = []
+        for track in self.tracks:
+            artists = " ".join(artist["name"] for artist in track["artists"])
+            searchable = _tokens(f"{track['name']} {artists} {track['album']['name']}")
+            if not free_text <= searchable:
+                continue
+            if any(
+                not _tokens(value) <= _tokens(track["name"] if field == "track" else artists)
+                for field, value in fields
+            ):
+                continue
+            items.append(track)
+
+        # Like Spotify, rank plain text matches by popularity
+        items.sort(key=lambda track: track["popularity"], reverse=True)
+        return {"tracks": {"items": items[:limit]}}
+
+def legacy_cascade(sp, song_name, artist_name=None):
+    """The strict -> loose -> bare-name search cascade used before ranked matching"""
+    queries = []
+    if artist_name:
+        queries.append(f"track:\"{song_name}\" artist:\"{artist_name}\"")
+        queries.append(f"{song_name} {artist_name}")
+    queries.append(song_name)
+
+    for query in queries:
+        result = sp.search(query, type="track", limit=1)
+        if result["tracks"]["items"]:
+            return result["tracks"]["items"][0]["uri"]
+    return None
+
+def ranked(sp, song_name, artist_name=None):
+    """Single-query ranked matching"""
+    match = match_track(sp, song_name, artist_name)
+    return match.uri if match else None
+
+def run(strategy, fixture):
+    """Run a matching strategy over every fixture case"""
+    sp = FixtureSpotify(fixture["tracks"])
+    correct = 0
+    misses = []
+    for case in fixture["cases"]:
+        uri = strategy(sp, case["song"], case["artist"])
+        if uri == case["expected"]:
+            correct += 1
+        else:
+            misses.append({"song": case["song"], "artist": case["artist"], "got": uri, "expected": case["expected"]})
+
+    songs = len(fixture["cases"])
+    return {
+        "songs": songs,
+        "api_calls": sp.calls,
+        "calls_per_song": sp.calls / songs,
+        "accuracy": correct / songs,
+        "misses": misses
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--fixture", default=str(FIXTURE_PATH), help="Path to the search fixture")
+    parser.add_argument("--json", help="Write results to this JSON file")
+    args = parser.parse_args()
+
+    with open(args.fixture) as f:
+        fixture = json.load(f)
+
+    results = {
+        "cascade": run(legacy_cascade, fixture),
+        "ranked": run(ranked, fixture)
+    }
+
+    print(f"{'strategy':<10} {'calls/song':>10} {'accuracy':>9}")
+    for name, result in results.items():
+        print(f"{name:<10} {result['calls_per_song']:>10.2f} {result['accuracy']:>8.0%}")
+        for miss in result["misses"]:
+            print(f"    miss: {miss['song']} ({miss['artist']}) -> {miss['got']}, expected {miss['expected']}")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+"""
+Benchmark session state memory for many concurrent users
+
+Simulates N Streamlit sessions that each picked one of K artists and
+measures the memory they retain with tracemalloc:
+
+- before: every session keeps the artist and setlist JSON it fetched, under
+  current_*, selected_* and pre_auth_state, as app.py used to
+- after: sessions keep only the artist MBID and setlist ID, and the objects
+  are resolved through the shared, size-bounded Setlist.fm object cache
+
+Artists and setlists come from the local Setlist.fm stand-in in
+benchmarks/mock_servers.py, so no network access is needed.
+
+Usage:
+    python benchmarks/bench_session_memory.py [--sessions 500] [--artists 50]
+"""
+
+import argparse
+import gc
+import json
+import os
+import sys
+import tracemalloc
+from pathlib import Path
+
+# Add the project root directory to Python path
+project_root = Path(__file__).parent.parent.resolve()
+if str(project_root) not in sys.path:
+    sys.path.insert(0, str(project_root))
+
+from benchmarks.mock_servers import MockConfig, SetlistFmServer, artist_name
+
+def measure(build):
+    """Get the bytes still allocated after build() returns, and its result"""
+    gc.collect()
+    tracemalloc.start()
+    result = build()
+    gc.collect()
+    retained, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return retained, result
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sessions", type=int, default=500, help="Concurrent sessions (default: 500)")
+    parser.add_argument("--artists", type=int, default=50, help="Distinct artists they look at (default: 50)")
+    parser.add_argument("--songs", type=int, default=25, help="Songs per setlist")
+    args = parser.parse_args()
+
+    server = SetlistFmServer(MockConfig(latency=0, songs_per_setlist=args.songs)).start()
+    os.environ["SETLISTFM_API_URL"] = server.api_url
+    os.environ["SETLISTFM_API_KEY"] = "benchmark"
+    for name in ("SETLISTFM_RATE_LIMIT", "SETLISTFM_RATE_BURST"):
+        os.environ.setdefault(name, "10000")
+
+    try:
+        from src.setlistfm import get_artist, get_latest_setlist, get_setlist, search_artist
+
+        # Raw payloads, so each "before" session can hold its own decoded copy
+        payloads = []
+        for index in range(1, args.artists + 1):
+            artist = search_artist(artist_name(index))
+            setlist = get_latest_setlist(artist["mbid"])
+            payloads.append((json.dumps(artist), json.dumps(setlist)))
+
+        def before():
+            sessions = []
+            for session in range(args.sessions):
+                artist_json, setlist_json = payloads[session % args.artists]
+                artist, setlist = json.loads(artist_json), json.loads(setlist_json)
+                sessions.append({
+                    "last_search": artist["name"],
+                    "current_artist": artist,
+                    "current_setlist": setlist,
+                    "selected_artist": artist,
+                    "selected_setlist": setlist,
+                    "pre_auth_state": {
+                        "search_query": artist["name"],
+                        "current_artist": artist,
+                        "current_setlist": setlist,
+                        "selected_artist": artist,
+                        "selected_setlist": setlist
+                    }
+                })
+            return sessions
+
+        def after():
+            sessions = []
+            for session in range(args.sessions):
+                artist = get_artist(json.loads(payloads[session % args.artists][0])["mbid"])
+                setlist = get_setlist(json.loads(payloads[session % args.artists][1])["id"])
+                sessions.append({
+                    "last_search": artist["name"],
+                    "selected_artist_mbid": artist["mbid"],
+                    "selected_setlist_id": setlist["id"],
+                    "pre_auth_state": {
+                        "search_query": artist["name"],
+                        "selected_artist_mbid": artist["mbid"],
+                        "selected_setlist_id": setlist["id"]
+                    }
+                })
+            return sessions
+
+        before_bytes, before_sessions = measure(before)
+        del before_sessions
+        # Start from an empty object cache, so shared objects are counted
+        get_artist.cache.clear()
+        get_setlist.cache.clear()
+        after_bytes, after_sessions = measure(after)
+        shared = len(get_artist.cache) + len(get_setlist.cache)
+    finally:
+        server.stop()
+
+    print(f"{args.sessions} sessions over {args.artists} artists, {args.songs} songs per setlist")
+    print(f"{'layout':<8} {'total KiB':>10} {'bytes/session':>14}")
+    print(f"{'before':<8} {before_bytes / 1024:>10.1f} {before_bytes / args.sessions:>14.0f}")
+    print(f"{'after':<8} {after_bytes / 1024:>10.1f} {after_bytes / args.sessions:>14.0f}"
+          f"   (includes {shared} shared cached objects)")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,501 @@
+"""
+Local stand-ins for the Setlist.fm and Spotify Web APIs
+
+Both servers generate deterministic data for a configurable number of
+artists and songs, count requests per endpoint, and can add latency,
+inject 429 responses and pad payloads to emulate production conditions.
+"""
+
+import hashlib
+import io
+import json
+import random
+import re
+import threading
+import time
+from collections import Counter
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, unquote, urlparse
+
+class MockConfig:
+    """Knobs shared by both mock servers"""
+
+    def __init__(self, latency=0.02, rate_limit_ratio=0.0, retry_after=1, error_ratio=0.0,
+                 songs_per_setlist=25, rotating_songs=0, setlists_per_page=20, setlist_pages=10, empty_pages=1,
+                 search_results=10, markets=80, image_size=1200, seed=0):
+        # Seconds added to every response
+        self.latency = latency
+        # Fraction of requests answered with 429 Too Many Requests
+        self.rate_limit_ratio = rate_limit_ratio
+        self.retry_after = retry_after
+        # Fraction of requests answered with 503 Service Unavailable
+        self.error_ratio = error_ratio
+        self.songs_per_setlist = songs_per_setlist
+        # Main set slots that change from show to show, drawn from twice as many songs
+        self.rotating_songs = rotating_songs
+        self.setlists_per_page = setlists_per_page
+        # Pages of setlists the mock artist has; later pages are a 404
+        self.setlist_pages = setlist_pages
+        # Pages of song-less setlists before the first one with songs
+        self.empty_pages = empty_pages
+        self.search_results = search_results
+        # Length of each album's available_markets list, the bulk of real search payloads
+        self.markets = markets
+        # Width and height of the artist image served for cover uploads
+        self.image_size = image_size
+        self.seed = seed
+
+    @property
+    def repertoire(self):
+        """Every song the mock artist plays, and so has on Spotify"""
+        return self.songs_per_setlist + 2 * self.rotating_songs
+
+# Setlist.fm data rarely changes; every mock resource claims the same modification time
+MOCK_LAST_MODIFIED = "Mon, 01 Jan 2024 00:00:00 GMT"
+
+def artist_name(index):
+    return f"Mock Artist {index}"
+
+def song_name(index):
+    return f"Mock Song {index}"
+
+class MockHandler(BaseHTTPRequestHandler):
+    """Request handler dispatching on (method, path regex) routes"""
+
+    routes = []
+    # Whether GET responses carry an ETag and Last-Modified and honour conditional requests
+    conditional = False
+    protocol_version = "HTTP/1.1"
+    # Headers and body are written separately; don't let Nagle delay the body
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        pass  # Keep benchmark output readable
+
+    def _dispatch(self, method):
+        server = self.server
+        url = urlparse(self.path)
+        query = {key: values[0] for key, values in parse_qs(url.query).items()}
+        length = int(self.headers.get("Content-Length") or 0)
+        body = self.rfile.read(length) if length else b""
+
+        path = url.path.rstrip("/")
+        for route_method, pattern, endpoint in self.routes:
+            match = re.fullmatch(pattern, path)
+            if route_method == method and match:
+                break
+        else:
+            return self._send(404, {"error": {"status": 404, "message": "Not found"}})
+
+        server.record(endpoint)
+        if server.config.latency:
+            time.sleep(server.config.latency)
+        if server.should_rate_limit():
+            server.record("429")
+            return self._send(
+                429, {"error": {"status": 429, "message": "API rate limit exceeded"}},
+                {"Retry-After": str(server.config.retry_after)}
+            )
+        if server.should_fail():
+            server.record("503")
+            return self._send(503, {"error": {"status": 503, "message": "Service unavailable"}})
+
+        status, payload, *headers = getattr(self, endpoint)(query, body, *map(unquote, match.groups()))
+        headers = dict(headers[0]) if headers else {}
+        if self.conditional and method == "GET" and status == 200:
+            etag = '"' + hashlib.sha1(json.dumps(payload, sort_keys=True).encode()).hexdigest()[:16] + '"'
+            headers.update({"ETag": etag, "Last-Modified": MOCK_LAST_MODIFIED})
+            if self.headers.get("If-None-Match") == etag:
+                server.record_not_modified()
+                return self._send(304, None, headers)
+        self._send(status, payload, headers)
+
+    def _send(self, status, payload, headers=None):
+        if payload is None:
+            data, content_type = b"", None
+        elif isinstance(payload, bytes):
+            data, content_type = payload, "image/jpeg"
+        else:
+            data, content_type = json.dumps(payload).encode(), "application/json"
+        self.send_response(status)
+        if content_type:
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        self._dispatch("GET")
+
+    def do_POST(self):
+        self._dispatch("POST")
+
+    def do_PUT(self):
+        self._dispatch("PUT")
+
+    def do_DELETE(self):
+        self._dispatch("DELETE")
+
+class MockServer(ThreadingHTTPServer):
+    """Threaded HTTP server running in a background thread"""
+
+    daemon_threads = True
+    handler_class = MockHandler
+
+    def __init__(self, config=None):
+        super().__init__(("127.0.0.1", 0), self.handler_class)
+        self.config = config or MockConfig()
+        self.calls = Counter()
+        # Requests answered with 304 Not Modified; they are also counted in `calls`
+        self.not_modified = 0
+        self._random = random.Random(self.config.seed)
+        self._lock = threading.Lock()
+        self._thread = None
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+    def record(self, endpoint):
+        with self._lock:
+            self.calls[endpoint] += 1
+
+    def record_not_modified(self):
+        with self._lock:
+            self.not_modified += 1
+
+    def should_rate_limit(self):
+        with self._lock:
+            return self._random.random() < self.config.rate_limit_ratio
+
+    def should_fail(self):
+        with self._lock:
+            return self._random.random() < self.config.error_ratio
+
+    def reset(self):
+        with self._lock:
+            self.calls.clear()
+            self.not_modified = 0
+
+    def start(self):
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+class SetlistFmHandler(MockHandler):
+    """Emulates the parts of api.setlist.fm/rest/1.0 used by the app"""
+
+    conditional = True
+    routes = [
+        ("GET", r"/rest/1\.0/search/artists", "search_artists"),
+        ("GET", r"/rest/1\.0/artist/([^/]+)/setlists", "artist_setlists"),
+        ("GET", r"/rest/1\.0/artist/([^/]+)", "artist"),
+        ("GET", r"/rest/1\.0/setlist/([^/]+)", "setlist"),
+    ]
+
+    def _artist(self, mbid):
+        index = int(mbid.rsplit("-", 1)[-1])
+        return {
+            "mbid": mbid,
+            "name": artist_name(index),
+            "sortName": artist_name(index),
+            "url": f"https://www.setlist.fm/setlists/mock-{index}.html"
+        }
+
+    def _setlist(self, mbid, number, with_songs):
+        config = self.server.config
+        event_date = datetime.now() - timedelta(days=3 * number)
+        sets = []
+        if with_songs:
+            songs = [{"name": song_name(i)} for i in range(1, config.songs_per_setlist + 1)]
+            split = max(1, len(songs) - 3)
+            rotating = min(config.rotating_songs, split)
+            for i in range(rotating):
+                songs[split - rotating + i] = {
+                    "name": song_name(config.songs_per_setlist + 1 + (number * 3 + i) % (2 * rotating))
+                }
+            sets = [{"song": songs[:split]}, {"name": "Encore", "encore": 1, "song": songs[split:]}]
+        return {
+            "id": f"{mbid}-{number}",
+            "eventDate": event_date.strftime("%d-%m-%Y"),
+            "artist": self._artist(mbid),
+            "venue": {"name": f"Mock Venue {number}", "city": {"name": "Mock City", "country": {"code": "GB"}}},
+            "tour": {"name": "Mock Tour"},
+            "sets": {"set": sets}
+        }
+
+    def search_artists(self, query, body):
+        name = query.get("artistName", "")
+        index = name.rsplit(" ", 1)[-1] if name.startswith("Mock Artist") else "0"
+        if not index.isdigit():
+            # Like the real API, an empty result is a 404 rather than an empty list
+            return 404, {"code": 404, "status": "Not Found", "message": "not found"}
+        artists = [self._artist(f"00000000-0000-0000-0000-{int(index):012d}")]
+        return 200, {"artist": artists, "total": len(artists), "page": 1, "itemsPerPage": 30}
+
+    def artist(self, query, body, mbid):
+        return 200, self._artist(mbid)
+
+    def artist_setlists(self, query, body, mbid):
+        config = self.server.config
+        page = int(query.get("p", 1))
+        per_page = config.setlists_per_page
+        if page > config.setlist_pages:
+            return 404, {"code": 404, "status": "Not Found", "message": "not found"}
+        setlists = [
+            self._setlist(mbid, (page - 1) * per_page + i, page > config.empty_pages)
+            for i in range(per_page)
+        ]
+        return 200, {"setlist": setlists, "total": per_page * config.setlist_pages, "page": page,
+                     "itemsPerPage": per_page}
+
+    def setlist(self, query, body, setlist_id):
+        mbid, number = setlist_id.rsplit("-", 1)
+        return 200, self._setlist(mbid, int(number), True)
+
+class SetlistFmServer(MockServer):
+    handler_class = SetlistFmHandler
+
+    @property
+    def api_url(self):
+        return f"{self.url}/rest/1.0"
+
+class SpotifyHandler(MockHandler):
+    """Emulates the Spotify Web API endpoints used by the app"""
+
+    routes = [
+        ("GET", r"/v1/search", "search"),
+        ("GET", r"/v1/me", "me"),
+        ("GET", r"/v1/me/playlists", "my_playlists"),
+        ("GET", r"/v1/artists/([^/]+)/albums", "artist_albums"),
+        ("GET", r"/v1/albums", "albums"),
+        ("GET", r"/v1/albums/([^/]+)/tracks", "album_tracks"),
+        ("POST", r"/v1/users/([^/]+)/playlists", "create_playlist"),
+        ("GET", r"/v1/playlists/([^/]+)", "get_playlist"),
+        ("PUT", r"/v1/playlists/([^/]+)", "change_details"),
+        # Newer spotipy releases use /items, older ones /tracks
+        ("GET", r"/v1/playlists/([^/]+)/(?:tracks|items)", "playlist_items"),
+        ("POST", r"/v1/playlists/([^/]+)/(?:tracks|items)", "add_items"),
+        ("PUT", r"/v1/playlists/([^/]+)/(?:tracks|items)", "update_items"),
+        ("DELETE", r"/v1/playlists/([^/]+)/(?:tracks|items)", "remove_items"),
+        ("PUT", r"/v1/playlists/([^/]+)/images", "upload_image"),
+        ("GET", r"/images/([^/]+)\.jpg", "image"),
+    ]
+
+    # Spotify IDs are base-62, which spotipy validates before sending requests
+    def _album(self, artist_index, album_index):
+        config = self.server.config
+        return {
+            "id": f"al{artist_index}x{album_index}",
+            "name": f"Mock Album {album_index}",
+            "release_date": f"{2000 + album_index}-01-01",
+            "available_markets": ["GB"] * config.markets,
+            "images": [{"url": f"{self.server.url}/images/album-{album_index}.jpg", "width": 640, "height": 640}]
+        }
+
+    def _track(self, artist_index, number, suffix=""):
+        track_id = f"tr{artist_index}x{number}" + re.sub(r"\W", "", suffix)
+        return {
+            "id": track_id,
+            "uri": f"spotify:track:{track_id}",
+            "name": f"{song_name(number)}{suffix}",
+            "artists": [{"id": f"ar{artist_index}", "name": artist_name(artist_index)}],
+            "album": self._album(artist_index, number // 10),
+            "popularity": 60 if suffix else 70
+        }
+
+    def _artist(self, artist_index):
+        return {
+            "id": f"ar{artist_index}",
+            "name": artist_name(artist_index),
+            "images": [{"url": f"{self.server.url}/images/artist-{artist_index}.jpg", "width": 640, "height": 640}]
+        }
+
+    def search(self, query, body):
+        config = self.server.config
+        limit = int(query.get("limit", 10))
+        text = query.get("q", "").lower()
+        artist_match = re.search(r"mock artist (\d+)", text)
+        song_match = re.search(r"mock song (\d+)", text)
+        artist_index = artist_match.group(1) if artist_match else "1"
+
+        if query.get("type") == "artist":
+            return 200, {"artists": {"items": [self._artist(artist_index)], "total": 1}}
+
+        items = []
+        if song_match:
+            number = int(song_match.group(1))
+            if number <= config.repertoire:
+                items.append(self._track(artist_index, number))
+                items.append(self._track(artist_index, number, " - Live"))
+        # Unrelated filler so payloads have a realistic size
+        items += [self._track("999", 1000 + i) for i in range(config.search_results)]
+        return 200, {"tracks": {"items": items[:limit], "total": len(items)}}
+
+    def me(self, query, body):
+        return 200, {"id": "mock-user", "display_name": "Mock User"}
+
+    def _playlist(self, playlist_id, playlist):
+        request = playlist.get("request", {})
+        return {
+            "id": playlist_id,
+            "name": request.get("name"),
+            "description": request.get("description"),
+            "public": request.get("public"),
+            "owner": {"id": "mock-user"},
+            "snapshot_id": f"snapshot-{playlist['snapshot']}",
+            "tracks": {"total": len(playlist["items"])}
+        }
+
+    def my_playlists(self, query, body):
+        offset, limit = int(query.get("offset", 0)), int(query.get("limit", 50))
+        with self.server._lock:
+            # Newest first, like the user's library
+            playlists = [self._playlist(playlist_id, playlist)
+                         for playlist_id, playlist in reversed(self.server.playlists.items())]
+        has_next = offset + limit < len(playlists)
+        return 200, {"items": playlists[offset:offset + limit], "total": len(playlists),
+                     "next": "next" if has_next else None}
+
+    def artist_albums(self, query, body, artist_id):
+        artist_index = artist_id[len("ar"):]
+        albums = [self._album(artist_index, i) for i in range(self.server.config.repertoire // 10 + 1)]
+        return 200, {"items": albums, "next": None, "total": len(albums)}
+
+    def albums(self, query, body):
+        config = self.server.config
+        result = []
+        for album_id in query.get("ids", "").split(","):
+            artist_index, album_index = album_id[len("al"):].split("x")
+            album = self._album(artist_index, int(album_index))
+            numbers = [n for n in range(int(album_index) * 10, int(album_index) * 10 + 10)
+                       if 1 <= n <= config.repertoire]
+            tracks = [self._track(artist_index, n) for n in numbers]
+            album["tracks"] = {"items": tracks, "total": len(tracks)}
+            result.append(album)
+        return 200, {"albums": result}
+
+    def album_tracks(self, query, body, album_id):
+        return 200, {"items": [], "total": 0, "next": None}
+
+    def create_playlist(self, query, body, user_id):
+        request = json.loads(body or b"{}")
+        with self.server._lock:
+            self.server.playlist_count += 1
+            playlist_id = f"pl{self.server.playlist_count}"
+            self.server.playlists[playlist_id] = {"request": request, "items": [], "snapshot": 0}
+        return 201, {"id": playlist_id, "name": request.get("name"), "snapshot_id": "snapshot-0"}
+
+    def get_playlist(self, query, body, playlist_id):
+        playlist = self.server.playlists.get(playlist_id)
+        if playlist is None:
+            return 404, {"error": {"status": 404, "message": "Not found"}}
+        return 200, self._playlist(playlist_id, playlist)
+
+    def change_details(self, query, body, playlist_id):
+        with self.server._lock:
+            playlist = self.server.playlists.get(playlist_id)
+            if playlist is None:
+                return 404, {"error": {"status": 404, "message": "Not found"}}
+            playlist.setdefault("request", {}).update(json.loads(body or b"{}"))
+        return 200, {}
+
+    def playlist_items(self, query, body, playlist_id):
+        playlist = self.server.playlists.get(playlist_id, {"items": []})
+        offset, limit = int(query.get("offset", 0)), int(query.get("limit", 100))
+        items = [{"track": {"uri": uri}} for uri in playlist["items"][offset:offset + limit]]
+        has_next = offset + limit < len(playlist["items"])
+        return 200, {"items": items, "total": len(playlist["items"]), "next": "next" if has_next else None}
+
+    def add_items(self, query, body, playlist_id):
+        request = json.loads(body or b"{}")
+        # spotipy sends a bare list of URIs with the position in the query string
+        if isinstance(request, list):
+            request = {"uris": request, "position": query.get("position")}
+        uris = request.get("uris", [])
+        if len(uris) > 100:
+            return 400, {"error": {"status": 400, "message": "Too many ids requested"}}
+        with self.server._lock:
+            playlist = self.server.playlists.setdefault(playlist_id, {"items": [], "snapshot": 0})
+            position = request.get("position")
+            if position is None:
+                playlist["items"].extend(uris)
+            else:
+                playlist["items"][int(position):int(position)] = uris
+            playlist["snapshot"] += 1
+            snapshot = playlist["snapshot"]
+        return 201, {"snapshot_id": f"snapshot-{snapshot}"}
+
+    def update_items(self, query, body, playlist_id):
+        request = json.loads(body or b"{}")
+        with self.server._lock:
+            playlist = self.server.playlists.setdefault(playlist_id, {"items": [], "snapshot": 0})
+            items = playlist["items"]
+            if "uris" in request:
+                items[:] = request["uris"]
+            else:
+                start, length = request["range_start"], request.get("range_length", 1)
+                insert_before = request["insert_before"]
+                moved = items[start:start + length]
+                rest = items[:start] + items[start + length:]
+                index = insert_before - length if insert_before > start else insert_before
+                items[:] = rest[:index] + moved + rest[index:]
+            playlist["snapshot"] += 1
+            snapshot = playlist["snapshot"]
+        return 200, {"snapshot_id": f"snapshot-{snapshot}"}
+
+    def remove_items(self, query, body, playlist_id):
+        request = json.loads(body or b"{}")
+        uris = {item["uri"] for item in request.get("items", request.get("tracks", []))}
+        if len(uris) > 100:
+            return 400, {"error": {"status": 400, "message": "Too many ids requested"}}
+        with self.server._lock:
+            playlist = self.server.playlists.setdefault(playlist_id, {"items": [], "snapshot": 0})
+            playlist["items"] = [uri for uri in playlist["items"] if uri not in uris]
+            playlist["snapshot"] += 1
+            snapshot = playlist["snapshot"]
+        return 200, {"snapshot_id": f"snapshot-{snapshot}"}
+
+    def upload_image(self, query, body, playlist_id):
+        if len(body) > 256 * 1024:
+            return 413, {"error": {"status": 413, "message": "Payload too large"}}
+        return 202, {}
+
+    def image(self, query, body, name):
+        return 200, self.server.image_bytes()
+
+class SpotifyServer(MockServer):
+    handler_class = SpotifyHandler
+
+    def __init__(self, config=None):
+        super().__init__(config)
+        self.playlists = {}
+        self.playlist_count = 0
+        self._image = None
+
+    @property
+    def api_url(self):
+        return f"{self.url}/v1/"
+
+    def image_url(self, name="artist-1"):
+        return f"{self.url}/images/{name}.jpg"
+
+    def image_bytes(self):
+        """A noisy JPEG, so its size is close to a real photo of the same dimensions"""
+        if self._image is None:
+            from PIL import Image
+
+            size = self.config.image_size
+            rng = random.Random(self.config.seed)
+            img = Image.frombytes("RGB", (size, size), rng.randbytes(size * size * 3))
+            buffer = io.BytesIO()
+            img.save(buffer, format="JPEG", quality=95)
+            self._image = buffer.getvalue()
+        return self._image
@@ -0,0 +1,256 @@
+"""
+End-to-end benchmarks against local Setlist.fm and Spotify stand-ins
+
+Starts the mock servers from benchmarks/mock_servers.py, points the app's
+API clients at them and measures latency and upstream API calls for the
+main code paths. Results are written as JSON and can be compared with a
+previous run to catch regressions.
+
+Usage:
+    python benchmarks/run_benchmarks.py --output results.json
+    python benchmarks/run_benchmarks.py --compare results.json
+"""
+
+import argparse
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+# Add the project root directory to Python path
+project_root = Path(__file__).parent.parent.resolve()
+if str(project_root) not in sys.path:
+    sys.path.insert(0, str(project_root))
+
+from benchmarks.mock_servers import MockConfig, SetlistFmServer, SpotifyServer, artist_name
+
+CONCURRENT_SESSIONS = 20
+FESTIVAL_LINEUP = 8
+
+def configure_environment(setlistfm, spotify, keep_rate_limits):
+    """Point the app at the mock servers; must run before importing src"""
+    os.environ["SETLISTFM_API_URL"] = setlistfm.api_url
+    os.environ["SPOTIFY_API_URL"] = spotify.api_url
+    os.environ["SETLISTFM_API_KEY"] = "benchmark"
+    os.environ["TRACK_CACHE_PATH"] = os.path.join(tempfile.mkdtemp(), "track_cache.sqlite3")
+    os.environ["IMAGE_CACHE_DIR"] = tempfile.mkdtemp()
+    if not keep_rate_limits:
+        # Measure our own overhead, not the production request budget
+        for name in ("SETLISTFM_RATE_LIMIT", "SETLISTFM_RATE_BURST", "SPOTIFY_RATE_LIMIT", "SPOTIFY_RATE_BURST"):
+            os.environ.setdefault(name, "10000")
+
+def percentile(samples, fraction):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))]
+
+class Harness:
+    """Runs scenarios with cold caches and collects latency and call counts"""
+
+    def __init__(self, setlistfm, spotify):
+        self.setlistfm = setlistfm
+        self.spotify = spotify
+
+    def reset(self):
+        import shutil
+        from src import catalog, images, setlistfm, tour
+        from src.cache import get_track_cache
+
+        setlistfm.search_artist.cache.clear()
+        setlistfm.get_latest_setlist.cache.clear()
+        setlistfm.get_artist.cache.clear()
+        setlistfm.get_setlist.cache.clear()
+        tour.get_tour_setlist.cache.clear()
+        get_track_cache().clear()
+        catalog._catalogs.clear()
+        shutil.rmtree(images.IMAGE_CACHE_DIR, ignore_errors=True)
+        self.setlistfm.reset()
+        self.spotify.reset()
+
+    def calls(self):
+        counts = {f"setlistfm.{name}": count for name, count in self.setlistfm.calls.items()}
+        counts.update({f"spotify.{name}": count for name, count in self.spotify.calls.items()})
+        return counts
+
+    def measure(self, name, func, iterations, setup=None):
+        """Time func(iteration) from cold caches; setup(iteration) runs first, untimed"""
+        latencies = []
+        calls = {}
+        for iteration in range(iterations):
+            self.reset()
+            if setup:
+                setup(iteration)
+            started = time.perf_counter()
+            func(iteration)
+            latencies.append((time.perf_counter() - started) * 1000)
+            for endpoint, count in self.calls().items():
+                calls[endpoint] = calls.get(endpoint, 0) + count
+
+        api_calls = {endpoint: count / iterations for endpoint, count in sorted(calls.items())}
+        result = {
+            "iterations": iterations,
+            "latency_ms": {
+                "mean": statistics.mean(latencies),
+                "p50": percentile(latencies, 0.5),
+                "p95": percentile(latencies, 0.95),
+                "max": max(latencies)
+            },
+            "api_calls": api_calls,
+            "total_calls": sum(count for endpoint, count in api_calls.items() if endpoint != "spotify.image")
+        }
+        print(f"{name:<28} p50 {result['latency_ms']['p50']:>8.1f} ms   "
+              f"p95 {result['latency_ms']['p95']:>8.1f} ms   calls {result['total_calls']:>6.1f}")
+        return result
+
+def run_scenarios(harness, config, iterations):
+    from src.festival import create_festival_playlist
+    from src.pipeline import create_playlist_from_songs, sync_playlist_from_songs
+    from src.prefetch import get_track_prefetcher
+    from src.setlistfm import search_artist, get_latest_setlist
+    from src.spotify import get_spotify_client, search_track_on_spotify, upload_playlist_image
+    from src.tour import get_tour_setlist
+    from src.utils import extract_songs_from_setlist
+
+    sp = get_spotify_client("benchmark-token")
+    name = artist_name(1)
+    mbid = search_artist(name)["mbid"]
+    songs = extract_songs_from_setlist(get_latest_setlist(mbid), name)
+
+    def create_playlist(iteration):
+        artist = search_artist(name)
+        setlist = get_latest_setlist(artist["mbid"])
+        setlist_songs = extract_songs_from_setlist(setlist, artist["name"])
+        result = create_playlist_from_songs(sp, setlist_songs, name=f"Benchmark {iteration}", description="Benchmark")
+        upload_playlist_image(result["playlist_id"], harness.spotify.image_url(), "benchmark-token")
+
+    def prefetch(iteration):
+        # The setlist is shown and resolved while the user edits the playlist name
+        prefetch = get_track_prefetcher().start("benchmark", f"setlist-{iteration}", sp, songs)
+        while not prefetch.done:
+            time.sleep(0.005)
+
+    def create_playlist_prefetched(iteration):
+        resolved = get_track_prefetcher().take(f"setlist-{iteration}", songs)
+        create_playlist_from_songs(sp, songs, name=f"Benchmark {iteration}", description="Benchmark",
+                                   resolved=resolved)
+
+    def sync_playlist(iteration):
+        # The same tour's next show: the previous playlist already has these songs
+        sync_playlist_from_songs(sp, songs, name=f"{name} - Benchmark", description="Benchmark", artist_name=name)
+
+    def create_tour_playlist(iteration):
+        tour = get_tour_setlist(mbid, name)
+        tour_songs = [song for song, _ in tour["songs"]]
+        create_playlist_from_songs(sp, tour_songs, name=f"Benchmark {iteration}", description="Benchmark")
+
+    def festival_playlist(iteration):
+        # One playlist from a whole lineup, every artist fetched at once
+        lineup = [artist_name(index) for index in range(1, FESTIVAL_LINEUP + 1)]
+        create_festival_playlist(sp, lineup, name=f"Benchmark {iteration}", description="Benchmark")
+
+    def concurrent_sessions(iteration):
+        # Sessions looking up the same artist at the same moment, e.g. after a tour announcement
+        def session(_):
+            artist = search_artist(name)
+            get_latest_setlist(artist["mbid"])
+            search_track_on_spotify(sp, songs[0]["name"], name)
+
+        with ThreadPoolExecutor(max_workers=CONCURRENT_SESSIONS) as executor:
+            list(executor.map(session, range(CONCURRENT_SESSIONS)))
+
+    return {
+        "search_artist": harness.measure("search_artist", lambda i: search_artist(name), iterations),
+        "get_latest_setlist": harness.measure("get_latest_setlist", lambda i: get_latest_setlist(mbid), iterations),
+        "search_track_on_spotify": harness.measure(
+            "search_track_on_spotify",
+            lambda i: search_track_on_spotify(sp, songs[i % len(songs)]["name"], name),
+            iterations
+        ),
+        "create_playlist": harness.measure("create_playlist", create_playlist, iterations),
+        "create_playlist_prefetched": harness.measure(
+            "create_playlist_prefetched", create_playlist_prefetched, iterations, setup=prefetch
+        ),
+        "sync_playlist_unchanged": harness.measure(
+            "sync_playlist_unchanged", sync_playlist, iterations, setup=sync_playlist
+        ),
+        "create_tour_playlist": harness.measure("create_tour_playlist", create_tour_playlist, iterations),
+        "create_festival_playlist": harness.measure("create_festival_playlist", festival_playlist, iterations),
+        "concurrent_sessions": harness.measure("concurrent_sessions", concurrent_sessions, iterations)
+    }
+
+def compare(results, baseline, tolerance):
+    """Print a comparison with a previous run and return whether anything regressed"""
+    regressed = False
+    print(f"\n{'scenario':<28} {'p50 before':>11} {'p50 after':>10} {'calls before':>13} {'calls after':>12}")
+    for name, result in results["scenarios"].items():
+        before = baseline["scenarios"].get(name)
+        if not before:
+            continue
+        p50_before, p50_after = before["latency_ms"]["p50"], result["latency_ms"]["p50"]
+        calls_before, calls_after = before["total_calls"], result["total_calls"]
+        flag = ""
+        if p50_after > p50_before * (1 + tolerance) or calls_after > calls_before:
+            flag = "  REGRESSED"
+            regressed = True
+        print(f"{name:<28} {p50_before:>11.1f} {p50_after:>10.1f} {calls_before:>13.1f} {calls_after:>12.1f}{flag}")
+    return regressed
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--iterations", type=int, default=10, help="Runs per scenario (default: 10)")
+    parser.add_argument("--latency", type=float, default=0.02, help="Seconds added to every mock response")
+    parser.add_argument("--rate-limit-ratio", type=float, default=0.0, help="Fraction of requests answered with 429")
+    parser.add_argument("--retry-after", type=int, default=1, help="Retry-After seconds sent with injected 429s")
+    parser.add_argument("--error-ratio", type=float, default=0.0, help="Fraction of requests answered with 503")
+    parser.add_argument("--songs", type=int, default=25, help="Songs per setlist")
+    parser.add_argument("--rotating-songs", type=int, default=5, help="Setlist slots that change from show to show")
+    parser.add_argument("--empty-pages", type=int, default=1, help="Pages of song-less setlists before a match")
+    parser.add_argument("--search-results", type=int, default=10, help="Filler tracks per search response")
+    parser.add_argument("--markets", type=int, default=80, help="available_markets entries per album")
+    parser.add_argument("--image-size", type=int, default=1200, help="Width/height of the source cover image")
+    parser.add_argument("--keep-rate-limits", action="store_true", help="Keep the production token bucket rates")
+    parser.add_argument("--output", help="Write results to this JSON file")
+    parser.add_argument("--compare", help="Compare with a previous results JSON file")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Allowed p50 slowdown before flagging (default: 0.2)")
+    args = parser.parse_args()
+
+    config = MockConfig(
+        latency=args.latency,
+        rate_limit_ratio=args.rate_limit_ratio,
+        retry_after=args.retry_after,
+        error_ratio=args.error_ratio,
+        songs_per_setlist=args.songs,
+        rotating_songs=args.rotating_songs,
+        empty_pages=args.empty_pages,
+        search_results=args.search_results,
+        markets=args.markets,
+        image_size=args.image_size
+    )
+    setlistfm = SetlistFmServer(config).start()
+    spotify = SpotifyServer(config).start()
+    configure_environment(setlistfm, spotify, args.keep_rate_limits)
+
+    try:
+        results = {
+            "config": vars(config),
+            "scenarios": run_scenarios(Harness(setlistfm, spotify), config, args.iterations)
+        }
+    finally:
+        setlistfm.stop()
+        spotify.stop()
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        if compare(results, baseline, args.tolerance):
+            sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -3,10 +3,9 @@ from setuptools import setup, find_packages
 setup(
     name="setlist-to-spotify",
     version="1.0.0",
-    package_dir={"": "src"},
-    packages=find_packages(where="src"),
+    packages=find_packages(include=["src", "src.*"]),
     install_requires=[
-        "streamlit>=1.32.0",
+        "streamlit>=1.37.0",
         "spotipy>=2.23.0",
         "python-dotenv>=1.0.0",
         "Pillow>=10.2.0",
@@ -24,4 +23,9 @@ setup(
         "Operating System :: OS Independent",
     ],
     python_requires=">=3.8",
+    entry_points={
+        "console_scripts": [
+            "setlist-to-spotify-batch=src.batch:main",
+        ],
+    },
 ) 
\ No newline at end of file
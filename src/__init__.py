@@ -2,10 +2,18 @@
 Setlist to Spotify - Create Spotify playlists from setlist.fm data
 """
 
+import importlib
+
 __version__ = "1.0.0"
 
-from . import spotify
-from . import setlistfm
-from . import utils
+__all__ = ['spotify', 'setlistfm', 'utils']
+
+def __getattr__(name):
+    # Submodules are imported on first access, so `import src` stays cheap
+    # and consumers only pay for the API clients they actually use
+    if name in __all__:
+        return importlib.import_module(f".{name}", __name__)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
-__all__ = ['spotify', 'setlistfm', 'utils'] 
\ No newline at end of file
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
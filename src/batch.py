@@ -0,0 +1,285 @@
+"""
+Headless batch playlist generation
+
+Reads a file with one artist name or MusicBrainz ID per line and runs the
+search -> latest setlist -> resolve -> create pipeline for every artist,
+several artists at a time. With --festival, the whole list becomes one
+playlist instead.
+
+Usage:
+    setlist-to-spotify-batch artists.txt [--dry-run] [--workers 4]
+    setlist-to-spotify-batch lineup.txt --festival "Festival 2026"
+"""
+
+import argparse
+import json
+import logging
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from .cache import get_track_cache
+from .festival import create_festival_playlist
+from .metrics import start_metrics_server, write_metrics_file
+from .pipeline import create_playlist_from_songs, find_latest_songs, resolve_setlist_songs
+from .ratelimit import get_limiter_stats
+from .setlistfm import get_cache_stats
+from .spotify import create_spotify_client
+from .sync import APP_PLAYLIST_MARKER, app_playlist_marker
+
+PLAYLIST_SCOPE = "playlist-modify-public playlist-modify-private"
+
+# Checkpoint statuses that should not be retried when resuming; "dry_run" only
+# counts for another dry run, so a real run after one still creates the playlists
+FINAL_STATUSES = {"created", "no_artist", "no_setlist", "no_songs"}
+
+def read_artist_list(path):
+    """Read artist names or MBIDs, skipping blank lines and # comments"""
+    with open(path, encoding="utf-8") as f:
+        return [
+            line.strip() for line in f
+            if line.strip() and not line.strip().startswith("#")
+        ]
+
+def load_checkpoint(path, dry_run=False):
+    """Get the inputs already processed according to the checkpoint file"""
+    final_statuses = FINAL_STATUSES | {"dry_run"} if dry_run else FINAL_STATUSES
+    done = set()
+    if os.path.exists(path):
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue  # Partially written line from an interrupted run
+                if record.get("status") in final_statuses:
+                    done.add(record["input"])
+    return done
+
+def default_checkpoint_path(input_path, dry_run=False):
+    """Dry runs keep their own checkpoint, so they never mark artists done for a real run"""
+    return f"{input_path}.dry-run.checkpoint.jsonl" if dry_run else f"{input_path}.checkpoint.jsonl"
+
+class Checkpoint:
+    """Append-only JSON lines log of processed artists, safe to share between threads"""
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def write(self, record):
+        with self._lock:
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(record) + "\n")
+                f.flush()
+
+def get_batch_spotify_client(dry_run, token_cache):
+    """
+    Get a Spotify client for headless use.
+
+    Dry runs only search, so they use the client credentials flow. Real runs
+    need a user token; the first run prompts for the redirect URL once and
+    then reuses the refresh token stored in `token_cache`.
+
+    The token is fetched here, before any worker threads start, so the
+    prompt appears once instead of in every thread that needs a token.
+
+    Credentials are read from SPOTIPY_CLIENT_ID, SPOTIPY_CLIENT_SECRET and
+    SPOTIPY_REDIRECT_URI.
+    """
+    from spotipy.cache_handler import MemoryCacheHandler
+    from spotipy.oauth2 import SpotifyClientCredentials, SpotifyOAuth
+
+    if dry_run:
+        # Keep the app token in memory instead of a .cache file in the working directory
+        auth_manager = SpotifyClientCredentials(cache_handler=MemoryCacheHandler())
+    else:
+        auth_manager = SpotifyOAuth(
+            scope=PLAYLIST_SCOPE,
+            cache_path=token_cache,
+            open_browser=False
+        )
+    sp = create_spotify_client(auth_manager=auth_manager)
+    sp.auth_manager.get_access_token(as_dict=False)
+    return sp
+
+def process_artist(sp, entry, dry_run=False, public=True, track_workers=None):
+    """
+    Run the full pipeline for one artist.
+
+    Args:
+        sp (spotipy.Spotify): An authenticated Spotify client.
+        entry (str): An artist name or MusicBrainz ID.
+        dry_run (bool, optional): Resolve tracks but don't create a playlist.
+        public (bool, optional): Whether created playlists are public.
+        track_workers (int, optional): Concurrent track lookups per artist.
+
+    Returns:
+        dict: A checkpoint record describing the outcome.
+    """
+    started = time.monotonic()
+    record = {"input": entry}
+
+    status, artist_name, setlist, songs = find_latest_songs(entry)
+    if setlist:
+        record["artist"] = artist_name
+        record["setlist_id"] = setlist.get("id")
+    if status:
+        record["status"] = status
+        return record
+
+    venue = setlist["venue"]
+    name = f"{artist_name} - {venue['name']} ({setlist['eventDate']})"
+    description = (
+        f"Setlist from {artist_name} at {venue['name']}, {venue['city']['name']} "
+        f"on {setlist['eventDate']}. {APP_PLAYLIST_MARKER}."
+    )
+
+    if dry_run:
+        track_uris, not_found = resolve_setlist_songs(sp, songs, max_workers=track_workers)
+        record["status"] = "dry_run"
+    else:
+        result = create_playlist_from_songs(
+            sp, songs, name=name, description=description,
+            public=public, max_workers=track_workers
+        )
+        track_uris, not_found = result["track_uris"], result["not_found"]
+        record["playlist_id"] = result["playlist_id"]
+        record["status"] = "created"
+
+    record["tracks"] = len(track_uris)
+    record["not_found"] = not_found
+    record["elapsed"] = round(time.monotonic() - started, 2)
+    return record
+
+def format_summary(records, elapsed):
+    """Build the end-of-run throughput summary"""
+    statuses = {}
+    for record in records:
+        statuses[record["status"]] = statuses.get(record["status"], 0) + 1
+
+    calls = get_limiter_stats()
+    track_stats = get_track_cache().stats()
+    setlist_stats = get_cache_stats()
+    minutes = elapsed / 60
+
+    lines = [
+        f"Processed {len(records)} artists in {elapsed:.1f}s "
+        f"({len(records) / minutes if minutes else 0:.1f} artists/min)",
+        "Outcomes: " + ", ".join(f"{status}={count}" for status, count in sorted(statuses.items())),
+        "API calls: " + ", ".join(
+            f"{api}={api_stats['acquired']} (waited {api_stats['waited']:.1f}s)"
+            for api, api_stats in sorted(calls.items())
+        ),
+        f"Cache hits: tracks={track_stats['hits'] + track_stats['negative_hits']} "
+        f"(hit rate {track_stats['hit_rate']:.0%}), setlist.fm={setlist_stats['calls_saved']}"
+    ]
+    return "\n".join(lines)
+
+def format_festival_summary(result, elapsed):
+    """Build the end-of-run summary for a festival playlist, with a line per artist"""
+    playlist = result["playlist_id"] or "dry run"
+    lines = [
+        f"Built one playlist ({playlist}) from {len(result['artists'])} artists in {elapsed:.1f}s: "
+        f"{len(result['track_uris'])} tracks, {len(result['not_found'])} not found, "
+        f"{result['duplicates']} duplicate songs skipped"
+    ]
+    for artist in result["artists"]:
+        line = f"  {artist['artist'] or artist['input']}: {artist['status']}"
+        if artist["songs"]:
+            line += f", {artist['tracks']}/{artist['unique_songs']} tracks"
+            if artist["songs"] > artist["unique_songs"]:
+                line += f", {artist['songs'] - artist['unique_songs']} already in the playlist"
+            line += f" (setlist {artist['setlist_seconds']:.2f}s, tracks {artist['resolve_seconds']:.2f}s)"
+        lines.append(line)
+    return "\n".join(lines)
+
+def run_festival(sp, entries, name, dry_run=False, public=True, track_workers=None):
+    """Build one playlist from every artist in the list and print the summary"""
+    started = time.monotonic()
+    try:
+        result = create_festival_playlist(
+            sp, entries, name=name,
+            description=f"The latest setlists of the {name} lineup. {app_playlist_marker('festival')}.",
+            public=public, max_workers=track_workers, dry_run=dry_run
+        )
+    except Exception as e:
+        logging.error(f"Error building festival playlist {name}: {str(e)}")
+        return 1
+    print(format_festival_summary(result, time.monotonic() - started))
+    return 0
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Generate Spotify playlists for many artists from their latest setlists."
+    )
+    parser.add_argument("input", help="File with one artist name or MusicBrainz ID per line")
+    parser.add_argument("--checkpoint", help="Checkpoint file (default: <input>.checkpoint.jsonl, "
+                        "or <input>.dry-run.checkpoint.jsonl with --dry-run)")
+    parser.add_argument("--dry-run", action="store_true", help="Resolve tracks but don't create playlists")
+    parser.add_argument("--workers", type=int, default=4, help="Artists processed concurrently (default: 4)")
+    parser.add_argument("--track-workers", type=int, default=4, help="Concurrent track lookups per artist (default: 4)")
+    parser.add_argument("--private", action="store_true", help="Create private playlists")
+    parser.add_argument("--festival", metavar="NAME",
+                        help="Build one playlist called NAME from the whole list, e.g. a festival lineup")
+    parser.add_argument("--token-cache", default=".spotify_caches-batch", help="Spotify token cache file")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    """Entry point for the setlist-to-spotify-batch command"""
+    args = parse_args(argv)
+    logging.basicConfig(
+        level=os.getenv("LOG_LEVEL", "INFO"),
+        format='%(asctime)s - %(levelname)s - %(message)s'
+    )
+
+    if args.festival:
+        # One playlist for the whole list, so there is nothing to checkpoint
+        start_metrics_server()
+        sp = get_batch_spotify_client(args.dry_run, args.token_cache)
+        status = run_festival(
+            sp, read_artist_list(args.input), args.festival,
+            dry_run=args.dry_run, public=not args.private, track_workers=args.track_workers
+        )
+        write_metrics_file()
+        return status
+
+    checkpoint_path = args.checkpoint or default_checkpoint_path(args.input, args.dry_run)
+    done = load_checkpoint(checkpoint_path, dry_run=args.dry_run)
+    entries = [entry for entry in read_artist_list(args.input) if entry not in done]
+    if done:
+        logging.info(f"Resuming: skipping {len(done)} artists already in {checkpoint_path}")
+
+    start_metrics_server()
+    sp = get_batch_spotify_client(args.dry_run, args.token_cache)
+    checkpoint = Checkpoint(checkpoint_path)
+    records = []
+    started = time.monotonic()
+
+    with ThreadPoolExecutor(max_workers=max(1, args.workers), thread_name_prefix="batch") as executor:
+        futures = {
+            executor.submit(
+                process_artist, sp, entry,
+                dry_run=args.dry_run, public=not args.private, track_workers=args.track_workers
+            ): entry
+            for entry in entries
+        }
+        for future in as_completed(futures):
+            entry = futures[future]
+            try:
+                record = future.result()
+            except Exception as e:
+                logging.error(f"Error processing {entry}: {str(e)}")
+                record = {"input": entry, "status": "error", "error": str(e)}
+            checkpoint.write(record)
+            records.append(record)
+            logging.info(f"{entry}: {record['status']}")
+
+    print(format_summary(records, time.monotonic() - started))
+    write_metrics_file()
+    return 0 if all(record["status"] != "error" for record in records) else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,287 @@
+"""
+Caching utilities for API lookups
+"""
+
+import os
+import logging
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+from functools import wraps
+
+from .metrics import COALESCED_CALLS
+
+TRACK_CACHE_PATH = os.getenv("TRACK_CACHE_PATH", ".track_cache.sqlite3")
+TRACK_CACHE_TTL = int(os.getenv("TRACK_CACHE_TTL", 30 * 24 * 3600))
+TRACK_CACHE_NEGATIVE_TTL = int(os.getenv("TRACK_CACHE_NEGATIVE_TTL", 24 * 3600))
+TRACK_CACHE_MAX_ENTRIES = int(os.getenv("TRACK_CACHE_MAX_ENTRIES", 50000))
+
+def normalize_key(*parts):
+    """Build a case- and whitespace-insensitive cache key"""
+    return "\x1f".join(
+        re.sub(r"\s+", " ", (part or "").strip().lower())
+        for part in parts
+    )
+
+class TTLCache:
+    """
+    Thread-safe in-memory cache with per-entry expiry and LRU eviction.
+
+    None results are kept for `negative_ttl` seconds (defaults to `ttl`), so
+    failed lookups are retried sooner than successful ones.
+    """
+
+    def __init__(self, ttl, max_entries, negative_ttl=None):
+        self.ttl = ttl
+        self.negative_ttl = ttl if negative_ttl is None else negative_ttl
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """
+        Look up a cached value.
+
+        Returns:
+            tuple: (hit, value)
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] < time.monotonic():
+                self._entries.pop(key, None)
+                self.misses += 1
+                return False, None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return True, entry[1]
+
+    def set(self, key, value):
+        """Store a value, evicting the least recently used entries if full"""
+        ttl = self.ttl if value is not None else self.negative_ttl
+        with self._lock:
+            self._entries[key] = (time.monotonic() + ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        """Remove every cached entry"""
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def stats(self):
+        """Get hit/miss counters; every hit is an upstream call saved"""
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "calls_saved": self.hits,
+            "entries": len(self._entries)
+        }
+
+class SingleFlight:
+    """
+    Coalesce identical concurrent calls into one.
+
+    While a call for a key is in flight, further calls with the same key
+    wait for it and receive the same result (or exception) instead of
+    making their own upstream request.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.coalesced = 0
+        self._calls = {}
+        self._lock = threading.Lock()
+
+    def do(self, key, func, *args, **kwargs):
+        """Call func(*args, **kwargs), unless an identical call is already running"""
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = Future()
+            else:
+                self.coalesced += 1
+
+        if not leader:
+            COALESCED_CALLS.inc(operation=self.name)
+            return call.result()
+
+        try:
+            value = func(*args, **kwargs)
+            call.set_result(value)
+            return value
+        except BaseException as e:
+            call.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+
+def memoize(cache, key):
+    """
+    Cache a function's results in a TTLCache.
+
+    Concurrent calls that miss the cache with the same key share a single
+    call of the function (see SingleFlight).
+
+    Args:
+        cache (TTLCache): Where to store results.
+        key (callable): Builds the cache key from the function's arguments.
+    """
+    def decorator(func):
+        def call_and_cache(cache_key, *args, **kwargs):
+            value = func(*args, **kwargs)
+            # Cache before releasing waiters, so later callers hit the cache
+            cache.set(cache_key, value)
+            return value
+
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            cache_key = key(*args, **kwargs)
+            hit, value = cache.get(cache_key)
+            if hit:
+                logging.debug(f"Cache hit for {func.__name__}, {cache.hits} calls saved so far")
+                return value
+            return flight.do(cache_key, call_and_cache, cache_key, *args, **kwargs)
+
+        flight = SingleFlight(func.__name__)
+        wrapper.cache = cache
+        wrapper.flight = flight
+        return wrapper
+    return decorator
+
+class TrackCache:
+    """
+    Persistent SQLite cache mapping (song, artist) pairs to Spotify URIs.
+
+    Found tracks are kept for `ttl` seconds, "not found" results for the
+    shorter `negative_ttl`. Once the cache grows past `max_entries`, the least
+    recently used entries are evicted.
+    """
+
+    # How many writes to allow between eviction passes
+    EVICTION_INTERVAL = 100
+    # Only record an access this long after the previous one, to avoid a write per hit
+    TOUCH_INTERVAL = 60
+
+    def __init__(self, path=TRACK_CACHE_PATH, ttl=TRACK_CACHE_TTL,
+                 negative_ttl=TRACK_CACHE_NEGATIVE_TTL, max_entries=TRACK_CACHE_MAX_ENTRIES):
+        self.path = path
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.max_entries = max_entries
+        self.hits = 0
+        self.negative_hits = 0
+        self.misses = 0
+        self._writes = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        # A lost write only costs a repeated search, so don't fsync every commit
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS track_cache (
+                key TEXT PRIMARY KEY,
+                uri TEXT,
+                expires_at REAL NOT NULL,
+                last_access REAL NOT NULL
+            )
+        """)
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS track_cache_last_access ON track_cache (last_access)"
+        )
+
+    def get(self, song_name, artist_name=None):
+        """
+        Look up a cached result.
+
+        Returns:
+            tuple: (hit, uri). `uri` is None for a cached "not found" result.
+        """
+        key = normalize_key(song_name, artist_name)
+        now = time.time()
+        try:
+            with self._lock:
+                row = self._conn.execute(
+                    "SELECT uri, expires_at, last_access FROM track_cache WHERE key = ?", (key,)
+                ).fetchone()
+                if row is None or row[1] < now:
+                    self.misses += 1
+                    return False, None
+                if now - row[2] > self.TOUCH_INTERVAL:
+                    self._conn.execute(
+                        "UPDATE track_cache SET last_access = ? WHERE key = ?", (now, key)
+                    )
+                if row[0] is None:
+                    self.negative_hits += 1
+                else:
+                    self.hits += 1
+                return True, row[0]
+        except sqlite3.Error as e:
+            logging.error(f"Error reading track cache: {str(e)}")
+            return False, None
+
+    def set(self, song_name, artist_name, uri):
+        """Store a resolved URI, or None to remember that nothing was found"""
+        key = normalize_key(song_name, artist_name)
+        now = time.time()
+        expires_at = now + (self.ttl if uri else self.negative_ttl)
+        try:
+            with self._lock:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO track_cache (key, uri, expires_at, last_access) "
+                    "VALUES (?, ?, ?, ?)",
+                    (key, uri, expires_at, now)
+                )
+                self._writes += 1
+                if self._writes % self.EVICTION_INTERVAL == 0:
+                    self._evict(now)
+        except sqlite3.Error as e:
+            logging.error(f"Error writing track cache: {str(e)}")
+
+    def _evict(self, now):
+        """Drop expired entries, then the least recently used ones over the limit"""
+        self._conn.execute("DELETE FROM track_cache WHERE expires_at < ?", (now,))
+        (count,) = self._conn.execute("SELECT COUNT(*) FROM track_cache").fetchone()
+        if count > self.max_entries:
+            self._conn.execute(
+                "DELETE FROM track_cache WHERE key IN ("
+                "SELECT key FROM track_cache ORDER BY last_access ASC LIMIT ?)",
+                (count - self.max_entries,)
+            )
+
+    def clear(self):
+        """Remove every cached entry"""
+        with self._lock:
+            self._conn.execute("DELETE FROM track_cache")
+
+    def stats(self):
+        """Get hit/miss counters for this process"""
+        lookups = self.hits + self.negative_hits + self.misses
+        return {
+            "hits": self.hits,
+            "negative_hits": self.negative_hits,
+            "misses": self.misses,
+            "hit_rate": (self.hits + self.negative_hits) / lookups if lookups else 0.0
+        }
+
+_track_cache = None
+_track_cache_lock = threading.Lock()
+
+def get_track_cache():
+    """Get the process-wide track cache, creating it on first use"""
+    global _track_cache
+    if _track_cache is None:
+        with _track_cache_lock:
+            if _track_cache is None:
+                _track_cache = TrackCache()
+    return _track_cache
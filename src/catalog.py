@@ -0,0 +1,154 @@
+"""
+Spotify artist catalog index for resolving an artist's own songs locally
+"""
+
+import os
+import logging
+import threading
+import time
+
+from .cache import SingleFlight, TTLCache, normalize_key
+from .spotify import call_spotify
+from .utils import normalize_title
+
+CATALOG_TTL = int(os.getenv("CATALOG_TTL", 24 * 3600))
+CATALOG_MAX_ARTISTS = int(os.getenv("CATALOG_MAX_ARTISTS", 64))
+# Seconds a failed catalog build is kept before the next lookup tries again;
+# until then the artist's songs are found by search
+CATALOG_FAILURE_TTL = int(os.getenv("CATALOG_FAILURE_TTL", 300))
+MAX_CATALOG_ALBUMS = 200
+
+# Spotify API page sizes
+ARTIST_ALBUMS_PAGE_SIZE = 50
+ALBUMS_BATCH_SIZE = 20
+ALBUM_TRACKS_PAGE_SIZE = 50
+
+class ArtistCatalog:
+    """
+    In-memory title index over an artist's albums and singles.
+
+    The index is built on the first lookup with a handful of bulk calls
+    (artist search, album pages, album batches), after which songs by the
+    artist are matched locally instead of with one search per song.
+    """
+
+    def __init__(self, sp, artist_name):
+        self.artist_name = artist_name
+        self.failed_at = None
+        self.api_calls = 0
+        self._sp = sp
+        self._index = None
+
+    @property
+    def failed(self):
+        return self.failed_at is not None
+
+    def retry_due(self):
+        """Check whether a failed build is old enough to try again"""
+        return self.failed and time.monotonic() - self.failed_at >= CATALOG_FAILURE_TTL
+
+    def _call(self, endpoint, method, *args, **kwargs):
+        """Call the Spotify client through the shared rate limiter"""
+        self.api_calls += 1
+        return call_spotify(endpoint, method, *args, **kwargs)
+
+    def _find_artist_id(self, sp):
+        """Find the Spotify ID of the artist whose name matches exactly"""
+        results = self._call("artist_search", sp.search, q=f"artist:\"{self.artist_name}\"", type="artist", limit=5)
+        wanted = normalize_key(self.artist_name)
+        for artist in results["artists"]["items"]:
+            if normalize_key(artist["name"]) == wanted:
+                return artist["id"]
+        return None
+
+    def _list_albums(self, sp, artist_id):
+        """List the artist's albums and singles, oldest release first"""
+        albums = []
+        offset = 0
+        while len(albums) < MAX_CATALOG_ALBUMS:
+            page = self._call(
+                "artist_albums", sp.artist_albums, artist_id, include_groups="album,single",
+                limit=ARTIST_ALBUMS_PAGE_SIZE, offset=offset
+            )
+            albums.extend(page["items"])
+            if not page.get("next"):
+                break
+            offset += ARTIST_ALBUMS_PAGE_SIZE
+        # Original releases come before deluxe editions and remasters
+        return sorted(albums[:MAX_CATALOG_ALBUMS], key=lambda album: album.get("release_date") or "")
+
+    def _build(self):
+        """Fetch the artist's discography and index its tracks by title"""
+        sp = self._sp
+        index = {}
+        artist_id = self._find_artist_id(sp)
+        if not artist_id:
+            return index
+
+        album_ids = [album["id"] for album in self._list_albums(sp, artist_id)]
+        for start in range(0, len(album_ids), ALBUMS_BATCH_SIZE):
+            batch = self._call("albums", sp.albums, album_ids[start:start + ALBUMS_BATCH_SIZE])
+            for album in batch["albums"]:
+                if not album:
+                    continue
+                tracks = album["tracks"]["items"]
+                # Long albums only embed their first page of tracks
+                offset = len(tracks)
+                while offset < album["tracks"]["total"]:
+                    page = self._call("album_tracks", sp.album_tracks, album["id"], limit=ALBUM_TRACKS_PAGE_SIZE, offset=offset)
+                    if not page["items"]:
+                        break
+                    tracks = tracks + page["items"]
+                    offset += len(page["items"])
+
+                for track in tracks:
+                    if not any(artist["id"] == artist_id for artist in track["artists"]):
+                        continue
+                    index.setdefault(normalize_title(track["name"]), track["uri"])
+        return index
+
+    def lookup(self, song_name):
+        """
+        Look up a song by the artist in the catalog.
+
+        Returns:
+            str: The Spotify URI, or None if the title is not in the catalog.
+        """
+        if self._index is None:
+            # Concurrent lookups wait for one build instead of each starting their own
+            _catalog_builds.do(normalize_key(self.artist_name), self._load)
+        return self._index.get(normalize_title(song_name))
+
+    def _load(self):
+        """Build the index unless another lookup already did"""
+        if self._index is not None:
+            return
+        try:
+            self._index = self._build()
+            logging.info(f"Indexed {len(self._index)} tracks for {self.artist_name} in {self.api_calls} API calls")
+        except Exception as e:
+            logging.error(f"Error building catalog for {self.artist_name}: {str(e)}")
+            self.failed_at = time.monotonic()
+            self._index = {}
+        # The client belongs to whichever session built the index
+        self._sp = None
+
+_catalogs = TTLCache(CATALOG_TTL, CATALOG_MAX_ARTISTS)
+_catalogs_lock = threading.Lock()
+_catalog_builds = SingleFlight("artist_catalog")
+
+def get_artist_catalog(sp, artist_name):
+    """
+    Get the shared catalog for an artist, creating it if needed.
+
+    A catalog whose build failed is kept for CATALOG_FAILURE_TTL seconds,
+    matching nothing, so a failing artist search is not retried for every
+    song; the first lookup after that replaces it with a fresh catalog.
+    """
+    key = normalize_key(artist_name)
+    with _catalogs_lock:
+        hit, catalog = _catalogs.get(key)
+        if not hit or catalog.retry_due():
+            catalog = ArtistCatalog(sp, artist_name)
+            _catalogs.set(key, catalog)
+        return catalog
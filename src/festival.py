@@ -0,0 +1,150 @@
+"""
+Festival mode: one playlist from the latest setlists of a whole lineup
+"""
+
+import os
+import logging
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+from .cache import normalize_key
+from .pipeline import create_playlist_from_songs, find_latest_songs, resolve_setlist_songs
+
+# Lineup artists looked up at once; each also prefetches setlist pages, so keep this
+# well below SETLISTFM_POOL_SIZE. The Setlist.fm token bucket still paces the requests
+FESTIVAL_WORKERS = int(os.getenv("FESTIVAL_WORKERS", 4))
+
+def fetch_lineup(entries, max_workers=FESTIVAL_WORKERS):
+    """
+    Find the latest setlist of every lineup artist concurrently.
+
+    Args:
+        entries (list): Artist names or MusicBrainz IDs.
+        max_workers (int, optional): Artists looked up at once.
+
+    Returns:
+        list: One dict per entry, in lineup order, with the `input`,
+            `status` (None if songs were found), `artist`, `setlist`,
+            `songs` and `setlist_seconds` spent finding them.
+    """
+    def fetch(entry):
+        started = time.monotonic()
+        try:
+            status, artist_name, setlist, songs = find_latest_songs(entry)
+        except Exception as e:
+            logging.error(f"Error fetching the latest setlist for {entry}: {str(e)}")
+            status, artist_name, setlist, songs = "error", None, None, []
+        return {
+            "input": entry,
+            "status": status,
+            "artist": artist_name,
+            "setlist": setlist,
+            "songs": songs,
+            "setlist_seconds": time.monotonic() - started
+        }
+
+    if not entries:
+        return []
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(entries))),
+                            thread_name_prefix="festival") as executor:
+        return list(executor.map(fetch, entries))
+
+def merge_lineup_songs(lineup):
+    """
+    Combine the lineup's songs into one list with each song once.
+
+    A song played by several artists, e.g. one act covering another on the
+    same bill, is kept where it first appears in lineup order.
+
+    Returns:
+        tuple: (songs, owners) where owners[i] is the index into `lineup`
+            of the artist songs[i] was taken from.
+    """
+    songs = []
+    owners = []
+    seen = set()
+    for owner, artist in enumerate(lineup):
+        for song in artist["songs"]:
+            key = normalize_key(song["name"], song["original_artist"])
+            if key in seen:
+                continue
+            seen.add(key)
+            songs.append(song)
+            owners.append(owner)
+    return songs, owners
+
+def create_festival_playlist(sp, entries, name, description, public=True, max_workers=None,
+                             progress_callback=None, dry_run=False):
+    """
+    Create one playlist from the latest setlists of a festival lineup.
+
+    Every artist's setlist is fetched concurrently, the songs are merged
+    without duplicates and resolved together, and the tracks are written
+    to a single playlist in batches as they are found.
+
+    Args:
+        sp (spotipy.Spotify): An authenticated Spotify client.
+        entries (list): Artist names or MusicBrainz IDs, in lineup order.
+        name (str): The playlist name.
+        description (str): The playlist description.
+        public (bool, optional): Whether the playlist is public.
+        max_workers (int, optional): Maximum number of concurrent track lookups.
+        progress_callback (callable, optional): Passed on to resolve_tracks.
+        dry_run (bool, optional): Resolve tracks but don't create a playlist.
+
+    Returns:
+        dict: Like create_playlist_from_songs (with no playlist ID for a dry
+            run), plus `duplicates` skipped and `artists`, a summary per
+            lineup entry with its songs, tracks found and timings.
+
+    Raises:
+        ValueError: If no lineup artist has a recent setlist with songs.
+    """
+    lineup = fetch_lineup(entries)
+    songs, owners = merge_lineup_songs(lineup)
+    if not songs:
+        raise ValueError("None of the lineup artists has a recent setlist with songs")
+
+    # Songs are separate objects, so progress updates map back to their artist by identity
+    owner_of = {id(song): owner for song, owner in zip(songs, owners)}
+    found = [0] * len(lineup)
+    resolve_seconds = [0.0] * len(lineup)
+    started = time.monotonic()
+
+    def record_progress(completed, total, song, track_uri):
+        owner = owner_of[id(song)]
+        if track_uri:
+            found[owner] += 1
+        resolve_seconds[owner] = time.monotonic() - started
+        if progress_callback:
+            progress_callback(completed, total, song, track_uri)
+
+    if dry_run:
+        track_uris, not_found = resolve_setlist_songs(sp, songs, max_workers=max_workers,
+                                                      progress_callback=record_progress)
+        result = {"playlist_id": None, "snapshot_id": None, "track_uris": track_uris, "not_found": not_found}
+    else:
+        result = create_playlist_from_songs(
+            sp, songs, name=name, description=description, public=public,
+            max_workers=max_workers, progress_callback=record_progress
+        )
+
+    unique_songs = Counter(owners)
+    result["duplicates"] = sum(len(artist["songs"]) for artist in lineup) - len(songs)
+    result["artists"] = [
+        {
+            "input": artist["input"],
+            "artist": artist["artist"],
+            "status": artist["status"] or "found",
+            "setlist_id": artist["setlist"].get("id") if artist["setlist"] else None,
+            "songs": len(artist["songs"]),
+            "unique_songs": unique_songs[owner],
+            "tracks": found[owner],
+            "setlist_seconds": round(artist["setlist_seconds"], 2),
+            "resolve_seconds": round(resolve_seconds[owner], 2)
+        }
+        for owner, artist in enumerate(lineup)
+    ]
+    logging.info(f"Festival playlist {name}: {len(result['track_uris'])} tracks from {len(lineup)} artists")
+    return result
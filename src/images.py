@@ -0,0 +1,214 @@
+"""
+Playlist cover image processing with a disk cache
+"""
+
+import os
+import hashlib
+import io
+import logging
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+
+# PIL and requests are imported where they are used, like in spotify.py
+
+from .cache import SingleFlight
+from .metrics import COVER_IMAGES
+from .retry import TIMEOUTS, call_with_retry
+
+IMAGE_CACHE_DIR = os.getenv("IMAGE_CACHE_DIR", ".image_cache")
+IMAGE_CACHE_MAX_FILES = int(os.getenv("IMAGE_CACHE_MAX_FILES", 500))
+# Spotify shows covers at up to 640x640
+COVER_IMAGE_SIZE = int(os.getenv("COVER_IMAGE_SIZE", 640))
+# Spotify rejects covers whose base64-encoded JPEG is larger than 256 KB
+COVER_UPLOAD_MAX_BYTES = 256 * 1024
+COVER_IMAGE_MAX_BYTES = COVER_UPLOAD_MAX_BYTES * 3 // 4
+COVER_MAX_QUALITY = 85
+COVER_MIN_QUALITY = 30
+# Stop searching once the best fitting quality is this close to the smallest failing one,
+# or once it uses at least QUALITY_GOOD_ENOUGH_RATIO of the budget
+QUALITY_TOLERANCE = 3
+QUALITY_GOOD_ENOUGH_RATIO = 0.9
+# Aim a little under the budget, so one interpolation step usually lands inside it
+QUALITY_TARGET_RATIO = 0.95
+# Shrink the image by this factor when even COVER_MIN_QUALITY is too large
+DOWNSCALE_FACTOR = 0.75
+IMAGE_WORKERS = int(os.getenv("IMAGE_WORKERS", 2))
+
+_cover_flight = SingleFlight("cover_image")
+_image_executor = ThreadPoolExecutor(max_workers=IMAGE_WORKERS, thread_name_prefix="cover-image")
+
+def cover_cache_path(image_url, cache_dir=None):
+    """Get where the processed cover for an image URL is cached"""
+    # Processing settings are part of the key, so changing them invalidates old files
+    key = f"{image_url}\x1f{COVER_IMAGE_SIZE}\x1f{COVER_IMAGE_MAX_BYTES}"
+    digest = hashlib.sha256(key.encode("utf-8")).hexdigest()
+    return os.path.join(cache_dir or IMAGE_CACHE_DIR, f"{digest}.jpg")
+
+def decode_image(data, size=COVER_IMAGE_SIZE):
+    """
+    Decode an image and scale it down to fit within size x size.
+
+    JPEGs are decoded in draft mode, which lets libjpeg downscale by a
+    power of two while decoding, so a large photo is never decoded at full
+    resolution; LANCZOS then takes it the rest of the way.
+    """
+    from PIL import Image
+
+    img = Image.open(io.BytesIO(data))
+    img.draft("RGB", (size, size))
+    if img.mode != "RGB":
+        img = img.convert("RGB")
+    img.thumbnail((size, size), Image.Resampling.LANCZOS)
+    return img
+
+def _save_jpeg(img, quality):
+    buffer = io.BytesIO()
+    img.save(buffer, format="JPEG", quality=quality, optimize=True)
+    return buffer.getvalue()
+
+def encode_jpeg(img, max_bytes=COVER_IMAGE_MAX_BYTES):
+    """
+    Encode an image as the best quality JPEG that fits in `max_bytes`.
+
+    Tries COVER_MAX_QUALITY first, which fits for most photos. Otherwise the
+    quality is searched between COVER_MIN_QUALITY and the failing one by
+    interpolating between the sizes already seen, which converges in far
+    fewer encodes than bisection. If even the minimum quality is too large,
+    the image is shrunk and the search repeated.
+
+    Returns:
+        tuple: (jpeg_bytes, quality, encodes)
+    """
+    from PIL import Image
+
+    encodes = 0
+    while True:
+        data = _save_jpeg(img, COVER_MAX_QUALITY)
+        encodes += 1
+        if len(data) <= max_bytes:
+            return data, COVER_MAX_QUALITY, encodes
+
+        best = _save_jpeg(img, COVER_MIN_QUALITY)
+        encodes += 1
+        if len(best) <= max_bytes:
+            break
+        img = img.resize(
+            (max(1, int(img.width * DOWNSCALE_FACTOR)), max(1, int(img.height * DOWNSCALE_FACTOR))),
+            Image.Resampling.LANCZOS
+        )
+
+    # Invariant: `low` fits with size `low_size`, `high` does not with `high_size`.
+    # Sizes are interpolated with the Illinois rule: when the same end moves
+    # twice in a row, the other end's weight is halved so it moves too.
+    low, low_size, high, high_size = COVER_MIN_QUALITY, len(best), COVER_MAX_QUALITY, len(data)
+    target = max_bytes * QUALITY_TARGET_RATIO
+    low_weight = high_weight = 1.0
+    last_side = None
+    while high - low > QUALITY_TOLERANCE and low_size < max_bytes * QUALITY_GOOD_ENOUGH_RATIO:
+        low_error = (target - low_size) * low_weight
+        high_error = (high_size - target) * high_weight
+        guess = low + low_error * (high - low) / (low_error + high_error)
+        quality = min(high - 1, max(low + 1, round(guess)))
+        data = _save_jpeg(img, quality)
+        encodes += 1
+        if len(data) <= max_bytes:
+            low, low_size, best = quality, len(data), data
+            side = "low"
+        else:
+            high, high_size = quality, len(data)
+            side = "high"
+        low_weight = high_weight = 1.0
+        if side == last_side:
+            if side == "low":
+                high_weight = 0.5
+            else:
+                low_weight = 0.5
+        last_side = side
+    return best, low, encodes
+
+def get_cover_image(image_url, session=None):
+    """
+    Get an image as a cover-ready JPEG that fits Spotify's upload limit.
+
+    Processed images are cached on disk by source URL; concurrent requests
+    for the same URL share one download and encode.
+
+    Args:
+        image_url (str): The source image.
+        session (requests.Session, optional): Session to download with.
+
+    Returns:
+        bytes: The JPEG, at most COVER_IMAGE_MAX_BYTES long.
+    """
+    path = cover_cache_path(image_url)
+    try:
+        with open(path, "rb") as f:
+            data = f.read()
+        # Keep recently used files when pruning
+        os.utime(path)
+        COVER_IMAGES.inc(source="cache")
+        return data
+    except FileNotFoundError:
+        pass
+    except OSError as e:
+        logging.warning(f"Error reading cached cover image {path}: {str(e)}")
+
+    return _cover_flight.do(path, _process_cover_image, image_url, path, session)
+
+def _process_cover_image(image_url, path, session):
+    """Download, resize and encode a cover image, then cache it"""
+    if session is None:
+        import requests
+        session = requests
+
+    def fetch():
+        response = session.get(image_url, timeout=TIMEOUTS)
+        response.raise_for_status()
+        return response.content
+
+    source = call_with_retry("image", "download", fetch)
+    data, quality, encodes = encode_jpeg(decode_image(source))
+    COVER_IMAGES.inc(source="processed")
+    logging.debug(f"Encoded cover for {image_url}: {len(data)} bytes at quality {quality} after {encodes} encodes")
+
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Write to a temporary file first, so readers never see a partial image
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+        prune_image_cache(os.path.dirname(path))
+    except OSError as e:
+        logging.warning(f"Error caching cover image {path}: {str(e)}")
+    return data
+
+def prune_image_cache(cache_dir=None, max_files=IMAGE_CACHE_MAX_FILES):
+    """Delete the least recently used cached covers beyond max_files"""
+    entries = [entry for entry in os.scandir(cache_dir or IMAGE_CACHE_DIR) if entry.name.endswith(".jpg")]
+    if len(entries) <= max_files:
+        return
+    entries.sort(key=lambda entry: entry.stat().st_mtime)
+    for entry in entries[:len(entries) - max_files]:
+        try:
+            os.remove(entry.path)
+        except OSError:
+            pass
+
+def _prefetch(image_url, session):
+    try:
+        get_cover_image(image_url, session)
+    except Exception as e:
+        logging.error(f"Error preparing cover image: {str(e)}")
+
+def prefetch_cover_image(image_url, session=None):
+    """
+    Start preparing a cover image on a worker thread.
+
+    Lets the download and encode overlap with track resolution; the upload
+    then finds the image cached, or waits for the work already in flight.
+
+    Returns:
+        concurrent.futures.Future: Completes when the image is ready or failed.
+    """
+    return _image_executor.submit(_prefetch, image_url, session)
@@ -0,0 +1,257 @@
+"""
+In-process job queue for building playlists off the request path
+"""
+
+import os
+import logging
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from .festival import create_festival_playlist
+from .pipeline import create_playlist_from_songs, sync_playlist_from_songs
+from .images import prefetch_cover_image
+from .spotify import get_http_session, get_spotify_artist_image, upload_playlist_image
+
+# Playlist builds running at once across all sessions; further jobs queue up
+MAX_CONCURRENT_BUILDS = int(os.getenv("MAX_CONCURRENT_BUILDS", 4))
+# How long finished jobs stay visible to their session
+JOB_RETENTION_SECONDS = int(os.getenv("JOB_RETENTION_SECONDS", 3600))
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+
+class PlaylistJob:
+    """A playlist build and its progress, updated by the worker thread"""
+
+    def __init__(self, session_id, name, total):
+        self.id = uuid.uuid4().hex
+        self.session_id = session_id
+        self.name = name
+        self.status = QUEUED
+        self.stage = "Waiting for a free worker..."
+        self.completed = 0
+        self.total = total
+        self.not_found = []
+        self.track_uris = []
+        self.playlist_id = None
+        self.cover_uploaded = False
+        self.changes = None
+        self.artists = None
+        self.error = None
+        self.created_at = time.time()
+        self.finished_at = None
+        self._lock = threading.Lock()
+
+    @property
+    def active(self):
+        return self.status in (QUEUED, RUNNING)
+
+    def update(self, **fields):
+        with self._lock:
+            for name, value in fields.items():
+                setattr(self, name, value)
+
+    def record_progress(self, completed, total, song, track_uri):
+        """Progress callback for resolve_tracks"""
+        with self._lock:
+            self.completed = completed
+            self.total = total
+            self.stage = f"{'✓' if track_uri else '✗'} {song['name']}"
+            if not track_uri:
+                self.not_found.append(song["name"])
+
+    def snapshot(self):
+        """Get a consistent copy of the job's state for display"""
+        with self._lock:
+            return {
+                "id": self.id,
+                "name": self.name,
+                "status": self.status,
+                "stage": self.stage,
+                "completed": self.completed,
+                "total": self.total,
+                "not_found": list(self.not_found),
+                "tracks": len(self.track_uris),
+                "playlist_id": self.playlist_id,
+                "cover_uploaded": self.cover_uploaded,
+                "changes": self.changes,
+                "artists": self.artists,
+                "error": self.error,
+                "created_at": self.created_at,
+                "finished_at": self.finished_at
+            }
+
+class JobExecutor:
+    """
+    Thread pool plus a job table keyed by session.
+
+    The pool size caps concurrent builds across all sessions. Jobs keep
+    running when the script run that submitted them ends, and each session
+    polls its own jobs for progress.
+    """
+
+    def __init__(self, max_workers=MAX_CONCURRENT_BUILDS, retention=JOB_RETENTION_SECONDS):
+        self.retention = retention
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="playlist-job")
+        # One cover lookup per running build, so covers never wait behind other builds
+        self._cover_executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="playlist-cover")
+        self._jobs = {}
+        self._lock = threading.Lock()
+
+    def submit(self, session_id, sp, songs, name, description, public=True,
+               access_token=None, cover_artist=None, resolved=None, sync_artist=None, kind="show"):
+        """
+        Queue a playlist build.
+
+        Args:
+            session_id (str): The session the job belongs to.
+            sp (spotipy.Spotify): An authenticated Spotify client.
+            songs (list): Songs as returned by extract_songs_from_setlist.
+            name (str): The playlist name.
+            description (str): The playlist description.
+            public (bool, optional): Whether the playlist is public.
+            access_token (str, optional): Token used to upload the cover image.
+            cover_artist (str, optional): Artist whose Spotify image becomes
+                the playlist cover; it is looked up while the tracks resolve.
+            resolved (dict, optional): Song index to URI for songs already
+                resolved by a prefetch.
+            sync_artist (str, optional): Update the app's previous playlist
+                for this artist instead of creating a new one.
+            kind (str, optional): "show" or "tour"; a sync only updates a
+                previous playlist of the same kind.
+
+        Returns:
+            PlaylistJob: The queued job.
+        """
+        job = PlaylistJob(session_id, name, len(songs))
+        with self._lock:
+            self._prune()
+            self._jobs[job.id] = job
+        self._executor.submit(
+            self._run, job, sp, songs, name, description, public, access_token, cover_artist, resolved,
+            sync_artist, kind
+        )
+        return job
+
+    def submit_festival(self, session_id, sp, entries, name, description, public=True):
+        """
+        Queue a festival playlist: one playlist from many artists' latest setlists.
+
+        Args:
+            session_id (str): The session the job belongs to.
+            sp (spotipy.Spotify): An authenticated Spotify client.
+            entries (list): Artist names or MusicBrainz IDs, in lineup order.
+            name (str): The playlist name.
+            description (str): The playlist description.
+            public (bool, optional): Whether the playlist is public.
+
+        Returns:
+            PlaylistJob: The queued job.
+        """
+        # The song count is only known once the setlists are in
+        job = PlaylistJob(session_id, name, 0)
+        with self._lock:
+            self._prune()
+            self._jobs[job.id] = job
+        self._executor.submit(self._run_festival, job, sp, entries, name, description, public)
+        return job
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def session_jobs(self, session_id):
+        """Get a session's jobs, newest first"""
+        with self._lock:
+            self._prune()
+            jobs = [job for job in self._jobs.values() if job.session_id == session_id]
+        return sorted(jobs, key=lambda job: job.created_at, reverse=True)
+
+    def active_count(self):
+        with self._lock:
+            return sum(1 for job in self._jobs.values() if job.active)
+
+    def _prune(self):
+        """Forget finished jobs past the retention period; caller holds the lock"""
+        cutoff = time.time() - self.retention
+        for job_id in [job_id for job_id, job in self._jobs.items()
+                       if job.finished_at and job.finished_at < cutoff]:
+            del self._jobs[job_id]
+
+    def _run(self, job, sp, songs, name, description, public, access_token, cover_artist, resolved,
+             sync_artist, kind):
+        job.update(status=RUNNING, stage="Creating playlist...")
+        try:
+            cover_future = None
+            if cover_artist and access_token:
+                # Find, download and encode the cover while the tracks resolve
+                cover_future = self._cover_executor.submit(prefetch_artist_cover, cover_artist)
+            if sync_artist:
+                result = sync_playlist_from_songs(
+                    sp, songs, name=name, description=description, artist_name=sync_artist, public=public,
+                    progress_callback=job.record_progress, resolved=resolved, kind=kind
+                )
+                # An updated playlist keeps its cover
+                if not result["created"]:
+                    cover_future = None
+                    job.update(changes=result["changes"])
+            else:
+                result = create_playlist_from_songs(
+                    sp, songs, name=name, description=description, public=public,
+                    progress_callback=job.record_progress, resolved=resolved
+                )
+            job.update(playlist_id=result["playlist_id"], track_uris=result["track_uris"],
+                       not_found=result["not_found"])
+
+            cover_image_url = cover_future.result() if cover_future else None
+            if cover_image_url:
+                job.update(stage="Uploading cover image...")
+                job.update(cover_uploaded=upload_playlist_image(result["playlist_id"], cover_image_url, access_token))
+
+            job.update(status=DONE, stage="Done", finished_at=time.time())
+            logging.info(f"Playlist job {job.id} finished: {len(result['track_uris'])} tracks")
+        except Exception as e:
+            logging.error(f"Error in playlist job {job.id}: {str(e)}")
+            job.update(status=FAILED, stage="Failed", error=str(e), finished_at=time.time())
+
+    def _run_festival(self, job, sp, entries, name, description, public):
+        job.update(status=RUNNING, stage=f"Fetching setlists for {len(entries)} artists...")
+        try:
+            result = create_festival_playlist(
+                sp, entries, name=name, description=description, public=public,
+                progress_callback=job.record_progress
+            )
+            job.update(playlist_id=result["playlist_id"], track_uris=result["track_uris"],
+                       not_found=result["not_found"], artists=result["artists"])
+            job.update(status=DONE, stage="Done", finished_at=time.time())
+            logging.info(f"Festival job {job.id} finished: {len(result['track_uris'])} tracks")
+        except Exception as e:
+            logging.error(f"Error in festival job {job.id}: {str(e)}")
+            job.update(status=FAILED, stage="Failed", error=str(e), finished_at=time.time())
+
+def prefetch_artist_cover(artist_name):
+    """
+    Find an artist's Spotify image and start preparing it as a playlist cover.
+
+    Returns:
+        str: The image URL, or None if the artist has no image.
+    """
+    image_url = get_spotify_artist_image(artist_name)
+    if image_url:
+        prefetch_cover_image(image_url, get_http_session())
+    return image_url
+
+_executor = None
+_executor_lock = threading.Lock()
+
+def get_job_executor():
+    """Get the process-wide job executor"""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = JobExecutor()
+        return _executor
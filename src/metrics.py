@@ -0,0 +1,302 @@
+"""
+Lightweight metrics and profiling for the hot paths
+
+Counters and latency histograms are kept in process memory and rendered in
+the Prometheus text exposition format, either from a small HTTP endpoint
+(METRICS_PORT) or by writing a file (METRICS_FILE).
+"""
+
+import os
+import logging
+import threading
+import time
+from contextlib import contextmanager
+
+# http.server and cProfile are only imported once the metrics server or the
+# profiler is switched on
+
+METRICS_PORT = os.getenv("METRICS_PORT")
+METRICS_FILE = os.getenv("METRICS_FILE")
+# Directory for cProfile dumps of playlist builds; profiling is off when unset
+PROFILE_DIR = os.getenv("PROFILE_DIR")
+# How many playlist builds to profile once PROFILE_DIR is set; later ones run unprofiled
+PROFILE_BUILDS = int(os.getenv("PROFILE_BUILDS", 1))
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+def _format_labels(labelnames, values, extra=None):
+    pairs = list(zip(labelnames, values))
+    if extra:
+        pairs.append(extra)
+    if not pairs:
+        return ""
+    escaped = (str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, value in pairs)
+    return "{" + ",".join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + "}"
+
+class Counter:
+    """Monotonically increasing count, optionally split by labels"""
+
+    type = "counter"
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(str(labels.get(name, "")) for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        key = tuple(str(labels.get(name, "")) for name in self.labelnames)
+        return self._values.get(key, 0)
+
+    def collect(self):
+        with self._lock:
+            return [
+                f"{self.name}_total{_format_labels(self.labelnames, key)} {value}"
+                for key, value in sorted(self._values.items())
+            ]
+
+class Histogram:
+    """Distribution of observed values in cumulative buckets, optionally split by labels"""
+
+    type = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(str(labels.get(name, "")) for name in self.labelnames)
+        with self._lock:
+            counts, total, count = self._values.get(key, ([0] * len(self.buckets), 0.0, 0))
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+            self._values[key] = (counts, total + value, count + 1)
+
+    @contextmanager
+    def time(self, **labels):
+        """Observe how long the wrapped block takes"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def collect(self):
+        lines = []
+        with self._lock:
+            for key, (counts, total, count) in sorted(self._values.items()):
+                for bound, bucket_count in zip(self.buckets, counts):
+                    lines.append(
+                        f"{self.name}_bucket{_format_labels(self.labelnames, key, ('le', repr(bound)))} {bucket_count}"
+                    )
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, ('le', '+Inf'))} {count}")
+                lines.append(f"{self.name}_sum{_format_labels(self.labelnames, key)} {total}")
+                lines.append(f"{self.name}_count{_format_labels(self.labelnames, key)} {count}")
+        return lines
+
+class Registry:
+    """Collection of metrics rendered together"""
+
+    def __init__(self):
+        self._metrics = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def render(self):
+        """Render every metric in the Prometheus text exposition format"""
+        lines = []
+        for metric in self._metrics:
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.type}")
+            lines.extend(metric.collect())
+        return "\n".join(lines) + "\n"
+
+REGISTRY = Registry()
+
+UPSTREAM_REQUEST_SECONDS = REGISTRY.register(Histogram(
+    "setlist_to_spotify_upstream_request_seconds",
+    "Latency of upstream API calls",
+    labelnames=("api", "endpoint")
+))
+UPSTREAM_ERRORS = REGISTRY.register(Counter(
+    "setlist_to_spotify_upstream_errors",
+    "Upstream API calls that raised or returned an error status",
+    labelnames=("api", "endpoint")
+))
+RATE_LIMIT_SLEEP_SECONDS = REGISTRY.register(Histogram(
+    "setlist_to_spotify_rate_limit_sleep_seconds",
+    "Time spent waiting for rate limits, by upstream and reason",
+    labelnames=("api", "reason")
+))
+TRACK_RESOLUTIONS = REGISTRY.register(Counter(
+    "setlist_to_spotify_track_resolutions",
+    "Track lookups by where the answer came from",
+    labelnames=("source",)
+))
+CIRCUIT_BREAKER_REJECTIONS = REGISTRY.register(Counter(
+    "setlist_to_spotify_circuit_breaker_rejections",
+    "Calls failed fast because the upstream's circuit breaker was open",
+    labelnames=("api",)
+))
+COALESCED_CALLS = REGISTRY.register(Counter(
+    "setlist_to_spotify_coalesced_calls",
+    "Calls that shared an identical in-flight upstream request instead of making their own",
+    labelnames=("operation",)
+))
+COVER_IMAGES = REGISTRY.register(Counter(
+    "setlist_to_spotify_cover_images",
+    "Cover images prepared for upload, by whether they came from the disk cache",
+    labelnames=("source",)
+))
+PREFETCHED_SONGS = REGISTRY.register(Counter(
+    "setlist_to_spotify_prefetched_songs",
+    "Songs of playlist builds by whether a speculative prefetch had resolved them, and cancelled prefetch lookups",
+    labelnames=("outcome",)
+))
+PLAYLIST_BUILD_SECONDS = REGISTRY.register(Histogram(
+    "setlist_to_spotify_playlist_build_seconds",
+    "End-to-end time to create and fill a playlist"
+))
+
+@contextmanager
+def track_upstream(api, endpoint):
+    """Time an upstream call and count it as an error if it raises"""
+    started = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        UPSTREAM_ERRORS.inc(api=api, endpoint=endpoint)
+        raise
+    finally:
+        UPSTREAM_REQUEST_SECONDS.observe(time.perf_counter() - started, api=api, endpoint=endpoint)
+
+def render_metrics():
+    """Get all metrics in the Prometheus text exposition format"""
+    return REGISTRY.render()
+
+def write_metrics_file(path=None):
+    """Write all metrics to a file, e.g. for the node_exporter textfile collector"""
+    path = path or METRICS_FILE
+    if not path:
+        return
+    # Write then rename, so scrapers never read a partial file
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as f:
+        f.write(render_metrics())
+    os.replace(tmp_path, path)
+
+_server = None
+_server_lock = threading.Lock()
+
+def start_metrics_server(port=None, host="127.0.0.1"):
+    """
+    Serve /metrics from a background thread, once per process.
+
+    Args:
+        port (int, optional): Port to listen on. Defaults to METRICS_PORT;
+            nothing is started if neither is set.
+        host (str, optional): Interface to bind, local only by default.
+    """
+    global _server
+    port = port or METRICS_PORT
+    if not port:
+        return None
+    with _server_lock:
+        if _server is None:
+            from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+            class MetricsHandler(BaseHTTPRequestHandler):
+                def do_GET(self):
+                    if self.path.split("?")[0] != "/metrics":
+                        self.send_error(404)
+                        return
+                    body = render_metrics().encode()
+                    self.send_response(200)
+                    self.send_header("Content-Type", "text/plain; version=0.0.4")
+                    self.send_header("Content-Length", str(len(body)))
+                    self.end_headers()
+                    self.wfile.write(body)
+
+                def log_message(self, format, *args):
+                    pass
+
+            try:
+                _server = ThreadingHTTPServer((host, int(port)), MetricsHandler)
+            except OSError as e:
+                logging.error(f"Error starting metrics server on port {port}: {str(e)}")
+                return None
+            threading.Thread(target=_server.serve_forever, daemon=True, name="metrics").start()
+            logging.info(f"Serving metrics on http://{host}:{port}/metrics")
+        return _server
+
+# Python 3.12+ allows one active profiler per process, so concurrent builds
+# (app sessions, batch workers) are not profiled while another one is
+_profile_lock = threading.Lock()
+# Profiles still to take; only changed while holding _profile_lock
+_profiles_left = PROFILE_BUILDS
+
+@contextmanager
+def profile_playlist_build(label="playlist"):
+    """
+    Profile the wrapped block with cProfile when PROFILE_DIR is set.
+
+    Only the first PROFILE_BUILDS builds of the process are profiled, so
+    setting PROFILE_DIR on a running service captures a sample rather than
+    every build. Each profile is a .prof file (viewable with snakeviz, or
+    as a flamegraph with flameprof) and a plain-text summary of the top
+    functions. Only the calling thread is profiled; time spent in resolver
+    worker threads shows up as waiting inside resolve_tracks. Builds that
+    start while another one is being profiled run unprofiled.
+    """
+    global _profiles_left
+    if not PROFILE_DIR or _profiles_left <= 0:
+        yield
+        return
+    if not _profile_lock.acquire(blocking=False):
+        logging.info(f"Another playlist build is being profiled, not profiling {label}")
+        yield
+        return
+    if _profiles_left <= 0:
+        # Another build took the last profile between the check above and the lock
+        _profile_lock.release()
+        yield
+        return
+    _profiles_left -= 1
+
+    import cProfile
+    import pstats
+
+    profiler = cProfile.Profile()
+    try:
+        try:
+            profiler.enable()
+        except ValueError as e:
+            # Another profiler is already active, e.g. the app runs under python -m cProfile
+            logging.warning(f"Not profiling {label}: {str(e)}")
+            profiler = None
+        yield
+    finally:
+        if profiler is not None:
+            profiler.disable()
+        _profile_lock.release()
+        if profiler is not None:
+            os.makedirs(PROFILE_DIR, exist_ok=True)
+            safe_label = "".join(c if c.isalnum() else "_" for c in label)[:50]
+            base = os.path.join(PROFILE_DIR, f"{time.strftime('%Y%m%d-%H%M%S')}-{safe_label}")
+            profiler.dump_stats(f"{base}.prof")
+            with open(f"{base}.txt", "w") as f:
+                pstats.Stats(profiler, stream=f).sort_stats("cumulative").print_stats(40)
+            logging.info(f"Wrote playlist build profile to {base}.prof")
@@ -0,0 +1,213 @@
+"""
+Playlist creation pipeline shared by the app and the batch CLI
+"""
+
+import html
+import re
+from concurrent.futures import ThreadPoolExecutor
+
+from .metrics import PLAYLIST_BUILD_SECONDS, profile_playlist_build
+from .resolver import resolve_tracks
+from .spotify import call_spotify
+from .sync import apply_sync_plan, find_app_playlist, get_playlist_uris, mark_description, plan_playlist_sync
+from .utils import parse_setlist
+from .writer import PlaylistWriter
+
+MBID_PATTERN = re.compile(r"^[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}$", re.IGNORECASE)
+
+def find_latest_songs(entry):
+    """
+    Find an artist by name or MusicBrainz ID and the songs of their latest setlist.
+
+    Returns:
+        tuple: (status, artist_name, setlist, songs). `status` is None if
+            songs were found, otherwise "no_artist", "no_setlist" or
+            "no_songs"; the other fields are filled in as far as the lookup got.
+
+    Raises:
+        Exception: If Setlist.fm could not be reached.
+    """
+    # setlistfm loads requests, which Spotify-only callers of the pipeline don't need
+    from .setlistfm import search_artist, get_latest_setlist
+
+    if MBID_PATTERN.match(entry):
+        mbid = entry
+        artist_name = None
+    else:
+        artist = search_artist(entry)
+        if not artist:
+            return "no_artist", None, None, []
+        mbid = artist["mbid"]
+        artist_name = artist["name"]
+
+    setlist = get_latest_setlist(mbid)
+    if not setlist:
+        return "no_setlist", artist_name, None, []
+
+    artist_name = artist_name or setlist["artist"]["name"]
+    songs = list(parse_setlist(setlist, artist_name).songs)
+    return (None if songs else "no_songs"), artist_name, setlist, songs
+
+def resolve_setlist_songs(sp, songs, max_workers=None, progress_callback=None, result_callback=None,
+                          resolved=None):
+    """
+    Resolve setlist songs to Spotify URIs.
+
+    Returns:
+        tuple: (track_uris, not_found) where `track_uris` keeps setlist order
+            and `not_found` lists the names of songs with no match.
+    """
+    resolved_uris = resolve_tracks(
+        sp, songs, max_workers=max_workers, progress_callback=progress_callback,
+        result_callback=result_callback, resolved=resolved
+    )
+
+    track_uris = []
+    not_found = []
+    for song, track_uri in zip(songs, resolved_uris):
+        if track_uri:
+            track_uris.append(track_uri)
+        else:
+            not_found.append(song["name"])
+    return track_uris, not_found
+
+def create_empty_playlist(sp, name, description, public=True, user_id=None):
+    """Create a playlist for the current user"""
+    if user_id is None:
+        user_id = call_spotify("current_user", sp.current_user)["id"]
+    return call_spotify(
+        "playlist_create",
+        sp.user_playlist_create,
+        user=user_id,
+        name=name,
+        public=public,
+        description=description
+    )
+
+def create_playlist_from_songs(sp, songs, name, description, public=True,
+                               max_workers=None, progress_callback=None, resolved=None):
+    """
+    Create a Spotify playlist for the current user from setlist songs.
+
+    The playlist is created while the first songs are being resolved, and
+    tracks are streamed into it in batches as soon as they are found.
+
+    Args:
+        sp (spotipy.Spotify): An authenticated Spotify client.
+        songs (list): Songs as returned by extract_songs_from_setlist.
+        name (str): The playlist name.
+        description (str): The playlist description.
+        public (bool, optional): Whether the playlist is public.
+        max_workers (int, optional): Maximum number of concurrent track lookups.
+        progress_callback (callable, optional): Passed on to resolve_tracks.
+        resolved (dict, optional): Song index to URI for songs resolved
+            ahead of time, e.g. by TrackPrefetcher.take.
+
+    Returns:
+        dict: The playlist ID and snapshot ID, the added track URIs and the
+            songs not found.
+    """
+    with PLAYLIST_BUILD_SECONDS.time(), profile_playlist_build(name):
+        with ThreadPoolExecutor(max_workers=1, thread_name_prefix="playlist") as executor:
+            playlist_future = executor.submit(create_empty_playlist, sp, name, description, public)
+
+            with PlaylistWriter(sp, playlist_future) as writer:
+                track_uris, not_found = resolve_setlist_songs(
+                    sp, songs, max_workers=max_workers, progress_callback=progress_callback,
+                    result_callback=writer.add, resolved=resolved
+                )
+
+            playlist = playlist_future.result()
+
+    return {
+        "playlist_id": playlist["id"],
+        "snapshot_id": writer.snapshot_id or playlist.get("snapshot_id"),
+        "track_uris": track_uris,
+        "not_found": not_found
+    }
+
+def find_previous_playlist(sp, artist_name, kind="show"):
+    """
+    Find the app's previous playlist of a kind for an artist, with its tracks.
+
+    Returns:
+        tuple: (user_id, playlist, track_uris, snapshot_id); the last three
+            are None if there is no previous playlist.
+    """
+    user_id = call_spotify("current_user", sp.current_user)["id"]
+    playlist = find_app_playlist(sp, artist_name, user_id, kind)
+    if playlist is None:
+        return user_id, None, None, None
+    track_uris, snapshot_id = get_playlist_uris(sp, playlist["id"])
+    return user_id, playlist, track_uris, snapshot_id
+
+def sync_playlist_from_songs(sp, songs, name, description, artist_name, public=True,
+                             max_workers=None, progress_callback=None, resolved=None, kind="show"):
+    """
+    Update the app's previous playlist for an artist to match a setlist.
+
+    Instead of creating another near-identical playlist after every show,
+    the newest playlist the app made for the artist is diffed against the
+    resolved setlist, and only the tracks that changed are added, removed
+    or moved; an unchanged setlist costs no track writes at all. If there
+    is no previous playlist, a new one is created.
+
+    Args:
+        sp (spotipy.Spotify): An authenticated Spotify client.
+        songs (list): Songs as returned by extract_songs_from_setlist.
+        name (str): The playlist name.
+        description (str): The playlist description; the app's marker for
+            `kind` is added if missing, so the next sync can find the playlist.
+        artist_name (str): The artist whose previous playlist to update.
+        public (bool, optional): Whether the playlist is public.
+        max_workers (int, optional): Maximum number of concurrent track lookups.
+        progress_callback (callable, optional): Passed on to resolve_tracks.
+        resolved (dict, optional): Song index to URI for songs resolved
+            ahead of time, e.g. by TrackPrefetcher.take.
+        kind (str, optional): "show" for a latest-show playlist or "tour";
+            only a previous playlist of the same kind is updated.
+
+    Returns:
+        dict: Like create_playlist_from_songs, plus `created` and `changes`
+            (tracks added, removed and moved, and the write requests made).
+    """
+    description = mark_description(description, kind)
+
+    with PLAYLIST_BUILD_SECONDS.time(), profile_playlist_build(name):
+        with ThreadPoolExecutor(max_workers=1, thread_name_prefix="playlist") as executor:
+            # Look up the previous playlist while the songs are being resolved
+            previous_future = executor.submit(find_previous_playlist, sp, artist_name, kind)
+            track_uris, not_found = resolve_setlist_songs(
+                sp, songs, max_workers=max_workers, progress_callback=progress_callback, resolved=resolved
+            )
+            user_id, playlist, current_uris, snapshot_id = previous_future.result()
+
+        created = playlist is None
+        if created:
+            playlist = create_empty_playlist(sp, name, description, public, user_id=user_id)
+            current_uris, snapshot_id = [], playlist.get("snapshot_id")
+        # Spotify returns descriptions HTML-escaped, e.g. "&amp;" for "&"
+        elif (playlist["name"], html.unescape(playlist.get("description") or ""),
+              playlist.get("public")) != (name, description, public):
+            call_spotify(
+                "playlist_change_details", sp.playlist_change_details, playlist["id"],
+                name=name, description=description, public=public
+            )
+
+        operations = plan_playlist_sync(current_uris, track_uris)
+        snapshot_id = apply_sync_plan(sp, playlist["id"], operations, snapshot_id)
+
+    added = sum(len(operation[-1]) for operation in operations if operation[0] in ("add", "replace"))
+    return {
+        "playlist_id": playlist["id"],
+        "snapshot_id": snapshot_id,
+        "track_uris": track_uris,
+        "not_found": not_found,
+        "created": created,
+        "changes": {
+            "added": added,
+            "removed": len(current_uris) + added - len(track_uris),
+            "moved": sum(1 for operation in operations if operation[0] == "reorder"),
+            "requests": len(operations)
+        }
+    }
@@ -0,0 +1,194 @@
+"""
+Speculative track resolution for the setlist a user is looking at
+"""
+
+import os
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from .metrics import PREFETCHED_SONGS
+from .resolver import lookup_song
+
+# Song lookups running at once for prefetches across all sessions
+PREFETCH_WORKERS = int(os.getenv("PREFETCH_WORKERS", 4))
+# Setlists whose prefetched results are kept, and for how long after last use
+PREFETCH_MAX_ENTRIES = int(os.getenv("PREFETCH_MAX_ENTRIES", 256))
+PREFETCH_TTL = int(os.getenv("PREFETCH_TTL", 900))
+
+class SetlistPrefetch:
+    """Track lookups for one setlist, started before anyone asked for a playlist"""
+
+    def __init__(self, key, songs):
+        self.key = key
+        self.songs = songs
+        self.sessions = set()
+        self.cancelled = False
+        self.last_used = time.monotonic()
+        self._results = {}
+        self._futures = []
+        self._lock = threading.Lock()
+
+    @property
+    def done(self):
+        return all(future.done() for future in self._futures)
+
+    def start(self, executor, sp):
+        self._futures = [
+            executor.submit(self._resolve, sp, index, song)
+            for index, song in enumerate(self.songs)
+        ]
+
+    def _resolve(self, sp, index, song):
+        if self.cancelled:
+            return
+        try:
+            uri = lookup_song(sp, song)
+        except Exception as e:
+            # Leave the song to the playlist build, which retries it
+            logging.debug(f"Prefetch of {song['name']} failed: {str(e)}")
+            return
+        with self._lock:
+            self._results[index] = uri
+
+    def cancel(self):
+        """Drop lookups that have not started yet"""
+        self.cancelled = True
+        cancelled = sum(1 for future in self._futures if future.cancel())
+        if cancelled:
+            PREFETCHED_SONGS.inc(cancelled, outcome="cancelled")
+
+    def results_for(self, songs):
+        """
+        Get the prefetched URIs that apply to `songs`.
+
+        Returns:
+            dict: Song index to URI (or None if not found on Spotify), for
+                the songs resolved so far.
+        """
+        with self._lock:
+            results = dict(self._results)
+        return {
+            index: uri for index, uri in results.items()
+            if index < len(songs) and songs[index]["name"] == self.songs[index]["name"]
+            and songs[index].get("original_artist") == self.songs[index].get("original_artist")
+        }
+
+class TrackPrefetcher:
+    """
+    Resolve the songs of displayed setlists in the background.
+
+    Prefetches are keyed by setlist and shared by every session showing it.
+    Once no session shows a setlist any more, its pending lookups are
+    cancelled; results already resolved are kept for PREFETCH_TTL so a
+    returning user still finds them.
+    """
+
+    def __init__(self, max_workers=PREFETCH_WORKERS, max_entries=PREFETCH_MAX_ENTRIES, ttl=PREFETCH_TTL):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="prefetch")
+        self._prefetches = {}
+        self._session_keys = {}
+        self._lock = threading.Lock()
+
+    def start(self, session_id, key, sp, songs):
+        """
+        Start (or keep) prefetching a setlist for a session.
+
+        Called on every render of the setlist; the session's previous
+        setlist is released if it showed a different one.
+
+        Args:
+            session_id (str): The session showing the setlist.
+            key (str): Identifies the setlist, e.g. its Setlist.fm ID.
+            sp (spotipy.Spotify): An authenticated Spotify client.
+            songs (list): Songs as returned by extract_songs_from_setlist.
+
+        Returns:
+            SetlistPrefetch: The setlist's prefetch.
+        """
+        with self._lock:
+            self._prune()
+            previous = self._session_keys.get(session_id)
+            if previous is not None and previous != key:
+                self._release(session_id, previous)
+            self._session_keys[session_id] = key
+
+            prefetch = self._prefetches.get(key)
+            if prefetch is None:
+                prefetch = self._prefetches[key] = SetlistPrefetch(key, songs)
+                prefetch.start(self._executor, sp)
+                logging.info(f"Prefetching {len(songs)} tracks for setlist {key}")
+            prefetch.sessions.add(session_id)
+            prefetch.last_used = time.monotonic()
+            return prefetch
+
+    def get(self, key):
+        """Get the prefetch for a setlist, if there is one"""
+        with self._lock:
+            prefetch = self._prefetches.get(key)
+            if prefetch is not None:
+                prefetch.last_used = time.monotonic()
+            return prefetch
+
+    def take(self, key, songs):
+        """
+        Get the prefetched results a playlist build can use.
+
+        Returns:
+            dict: Song index to URI for the songs already resolved.
+        """
+        prefetch = self.get(key)
+        results = prefetch.results_for(songs) if prefetch is not None else {}
+        if results:
+            PREFETCHED_SONGS.inc(len(results), outcome="used")
+        if len(songs) > len(results):
+            PREFETCHED_SONGS.inc(len(songs) - len(results), outcome="missed")
+        return results
+
+    def release(self, session_id):
+        """Note that a session no longer shows a setlist"""
+        with self._lock:
+            key = self._session_keys.pop(session_id, None)
+            if key is not None:
+                self._release(session_id, key)
+
+    def _release(self, session_id, key):
+        """Remove a session from a prefetch, cancelling it if it was the last; caller holds the lock"""
+        prefetch = self._prefetches.get(key)
+        if prefetch is None:
+            return
+        prefetch.sessions.discard(session_id)
+        if not prefetch.sessions and not prefetch.done:
+            prefetch.cancel()
+            # Songs it resolved stay in the track cache
+            del self._prefetches[key]
+
+    def _prune(self):
+        """Cancel and forget prefetches unused for ttl, then the oldest beyond max_entries; caller holds the lock"""
+        cutoff = time.monotonic() - self.ttl
+        expired = [key for key, prefetch in self._prefetches.items() if prefetch.last_used < cutoff]
+        by_age = sorted(self._prefetches.items(), key=lambda item: item[1].last_used)
+        expired.extend(key for key, _ in by_age[:max(0, len(self._prefetches) - self.max_entries)])
+        for key in set(expired):
+            prefetch = self._prefetches.pop(key)
+            prefetch.cancel()
+            for session_id in prefetch.sessions:
+                if self._session_keys.get(session_id) == key:
+                    del self._session_keys[session_id]
+
+    def __len__(self):
+        return len(self._prefetches)
+
+_prefetcher = None
+_prefetcher_lock = threading.Lock()
+
+def get_track_prefetcher():
+    """Get the process-wide track prefetcher"""
+    global _prefetcher
+    with _prefetcher_lock:
+        if _prefetcher is None:
+            _prefetcher = TrackPrefetcher()
+        return _prefetcher
@@ -0,0 +1,152 @@
+"""
+Proactive rate limiting for upstream APIs
+"""
+
+import os
+import logging
+import hashlib
+import sqlite3
+import threading
+import time
+
+from .metrics import RATE_LIMIT_SLEEP_SECONDS
+
+# Requests per second and burst size for each upstream API
+RATE_LIMITS = {
+    "setlistfm": (
+        float(os.getenv("SETLISTFM_RATE_LIMIT", 2)),
+        float(os.getenv("SETLISTFM_RATE_BURST", 2))
+    ),
+    "spotify": (
+        float(os.getenv("SPOTIFY_RATE_LIMIT", 10)),
+        float(os.getenv("SPOTIFY_RATE_BURST", 20))
+    )
+}
+
+# Optional SQLite file used to share buckets between processes
+RATE_LIMIT_DB = os.getenv("RATE_LIMIT_DB")
+
+class TokenBucket:
+    """
+    Thread-safe token bucket shared by every caller in the process.
+
+    Callers that find the bucket empty reserve the next free token and sleep
+    until it is due, so waiters are served in the order they arrived instead
+    of all retrying at once.
+    """
+
+    def __init__(self, rate, capacity, api=None):
+        self.api = api
+        self.rate = rate
+        self.capacity = capacity
+        self.acquired = 0
+        self.waited = 0.0
+        self._tokens = capacity
+        self._updated_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _reserve(self):
+        """Take a token and return how long the caller must wait for it"""
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated_at) * self.rate)
+            self._updated_at = now
+            self._tokens -= 1
+            return max(0.0, -self._tokens / self.rate)
+
+    def acquire(self):
+        """
+        Block until a request may be sent.
+
+        Returns:
+            float: The number of seconds spent waiting.
+        """
+        wait = self._reserve()
+        if wait > 0:
+            RATE_LIMIT_SLEEP_SECONDS.observe(wait, api=self.api, reason="token_bucket")
+            time.sleep(wait)
+        with self._lock:
+            self.acquired += 1
+            self.waited += wait
+        return wait
+
+class SqliteTokenBucket(TokenBucket):
+    """Token bucket whose state lives in SQLite so several processes can share it"""
+
+    def __init__(self, name, rate, capacity, path, api=None):
+        super().__init__(rate, capacity, api=api)
+        self.name = name
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS rate_limits (
+                name TEXT PRIMARY KEY,
+                tokens REAL NOT NULL,
+                updated_at REAL NOT NULL
+            )
+        """)
+
+    def _reserve(self):
+        # Wall-clock time, since monotonic clocks are not comparable across processes
+        with self._lock:
+            try:
+                self._conn.execute("BEGIN IMMEDIATE")
+                now = time.time()
+                row = self._conn.execute(
+                    "SELECT tokens, updated_at FROM rate_limits WHERE name = ?", (self.name,)
+                ).fetchone()
+                tokens, updated_at = row if row else (self.capacity, now)
+                tokens = min(self.capacity, tokens + max(0.0, now - updated_at) * self.rate) - 1
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO rate_limits (name, tokens, updated_at) VALUES (?, ?, ?)",
+                    (self.name, tokens, now)
+                )
+                self._conn.execute("COMMIT")
+                return max(0.0, -tokens / self.rate)
+            except sqlite3.Error as e:
+                try:
+                    if self._conn.in_transaction:
+                        self._conn.execute("ROLLBACK")
+                except sqlite3.Error:
+                    pass  # The connection itself is broken; the fallback below still applies
+                logging.error(f"Error updating shared rate limit, using local bucket: {str(e)}")
+        # Outside the lock: TokenBucket._reserve takes the same non-reentrant lock
+        return super()._reserve()
+
+_limiters = {}
+_limiters_lock = threading.Lock()
+
+def get_limiter(api, credential=None):
+    """
+    Get the shared token bucket for an upstream API and credential.
+
+    Args:
+        api (str): The upstream API name, a key of RATE_LIMITS.
+        credential (str, optional): The API key or client ID the limit applies to.
+
+    Returns:
+        TokenBucket: The bucket shared by all callers using that credential.
+    """
+    # Never keep raw credentials around as dictionary keys or database rows
+    credential_id = hashlib.sha256((credential or "").encode()).hexdigest()[:16]
+    name = f"{api}:{credential_id}"
+
+    with _limiters_lock:
+        if name not in _limiters:
+            rate, capacity = RATE_LIMITS[api]
+            if RATE_LIMIT_DB:
+                _limiters[name] = SqliteTokenBucket(name, rate, capacity, RATE_LIMIT_DB, api=api)
+            else:
+                _limiters[name] = TokenBucket(rate, capacity, api=api)
+        return _limiters[name]
+
+def get_limiter_stats():
+    """Get how many calls each upstream API was granted and how long callers waited"""
+    stats = {}
+    with _limiters_lock:
+        for name, limiter in _limiters.items():
+            api = name.split(":", 1)[0]
+            api_stats = stats.setdefault(api, {"acquired": 0, "waited": 0.0})
+            api_stats["acquired"] += limiter.acquired
+            api_stats["waited"] += limiter.waited
+    return stats
@@ -0,0 +1,103 @@
+"""
+Concurrent track resolution module
+"""
+
+import os
+import logging
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from .cache import normalize_key
+from .catalog import get_artist_catalog
+from .spotify import find_track_uri
+
+DEFAULT_MAX_WORKERS = int(os.getenv("RESOLVER_MAX_WORKERS", 8))
+USE_CATALOG = os.getenv("RESOLVER_USE_CATALOG", "true").lower() in ("1", "true", "yes")
+
+def lookup_song(sp, song, use_catalog=USE_CATALOG):
+    """
+    Look up a single song's Spotify URI, raising on API errors.
+    
+    The artist's own songs are matched against their catalog index first;
+    covers and catalog misses fall back to search queries.
+    """
+    catalog = None
+    if use_catalog and not song.get("is_cover") and song.get("original_artist"):
+        catalog = get_artist_catalog(sp, song["original_artist"])
+    return find_track_uri(sp, song["name"], song["original_artist"], catalog=catalog)
+
+def resolve_song(sp, song, use_catalog=USE_CATALOG):
+    """Resolve a single song to a Spotify URI, or None if it was not found or the lookup failed"""
+    try:
+        return lookup_song(sp, song, use_catalog)
+    except Exception as e:
+        # Transient errors have already been retried by call_spotify
+        logging.error(f"Error searching for track {song['name']}: {str(e)}")
+        return None
+
+def resolve_tracks(sp, songs, max_workers=None, progress_callback=None, use_catalog=USE_CATALOG,
+                   result_callback=None, resolved=None):
+    """
+    Resolve a list of songs to Spotify URIs concurrently.
+
+    Lookups run on a bounded thread pool, but results are returned in
+    setlist order. Repeated songs are looked up once. The callbacks are
+    invoked from the calling thread, so it is safe to update Streamlit
+    elements from them.
+
+    Args:
+        sp (spotipy.Spotify): An authenticated Spotify client.
+        songs (list): Songs as returned by extract_songs_from_setlist.
+        max_workers (int, optional): Maximum number of concurrent lookups.
+        progress_callback (callable, optional): Called as
+            progress_callback(completed, total, song, uri) after each lookup.
+        use_catalog (bool, optional): Match the artist's own songs against
+            their Spotify catalog before searching.
+        result_callback (callable, optional): Called as
+            result_callback(index, uri) as soon as each song is resolved,
+            e.g. PlaylistWriter.add.
+        resolved (dict, optional): Song index to URI for songs resolved
+            ahead of time, e.g. by a prefetch; these are not looked up again.
+
+    Returns:
+        list: The Spotify URI (or None if not found) for each song, in order.
+    """
+    results = [None] * len(songs)
+    resolved = resolved or {}
+    completed = 0
+
+    def record(index, uri):
+        nonlocal completed
+        completed += 1
+        results[index] = uri
+        if result_callback:
+            result_callback(index, uri)
+        if progress_callback:
+            progress_callback(completed, len(songs), songs[index], uri)
+
+    for index, uri in sorted(resolved.items()):
+        record(index, uri)
+
+    # Songs that appear more than once, e.g. across the shows of a tour, are looked up once
+    pending = {}
+    for index in range(len(songs)):
+        if index not in resolved:
+            song = songs[index]
+            key = (normalize_key(song["name"], song.get("original_artist")), bool(song.get("is_cover")))
+            pending.setdefault(key, []).append(index)
+    if not pending:
+        return results
+
+    max_workers = max(1, min(max_workers or DEFAULT_MAX_WORKERS, len(pending)))
+
+    with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="resolver") as executor:
+        futures = {
+            executor.submit(resolve_song, sp, songs[indices[0]], use_catalog): indices
+            for indices in pending.values()
+        }
+
+        for future in as_completed(futures):
+            uri = future.result()
+            for index in futures[future]:
+                record(index, uri)
+
+    return results
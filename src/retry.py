@@ -0,0 +1,218 @@
+"""
+Shared retry policy and circuit breakers for upstream API calls
+"""
+
+import os
+import logging
+import random
+import threading
+import time
+
+from .metrics import CIRCUIT_BREAKER_REJECTIONS, RATE_LIMIT_SLEEP_SECONDS
+
+# Attempts per call, including the first one
+RETRY_MAX_ATTEMPTS = int(os.getenv("RETRY_MAX_ATTEMPTS", 4))
+# Backoff before retry n is a random delay up to min(RETRY_MAX_DELAY, RETRY_BASE_DELAY * 2 ** n)
+RETRY_BASE_DELAY = float(os.getenv("RETRY_BASE_DELAY", 0.5))
+RETRY_MAX_DELAY = float(os.getenv("RETRY_MAX_DELAY", 8))
+# Total time a call may spend including retries; a Retry-After past it fails the call
+RETRY_DEADLINE = float(os.getenv("RETRY_DEADLINE", 30))
+CONNECT_TIMEOUT = float(os.getenv("UPSTREAM_CONNECT_TIMEOUT", 3.05))
+READ_TIMEOUT = float(os.getenv("UPSTREAM_READ_TIMEOUT", 10))
+# Consecutive failures that open the circuit, and how long it stays open
+BREAKER_FAILURE_THRESHOLD = int(os.getenv("BREAKER_FAILURE_THRESHOLD", 5))
+BREAKER_RESET_TIMEOUT = float(os.getenv("BREAKER_RESET_TIMEOUT", 30))
+
+RETRYABLE_STATUSES = (429, 500, 502, 503, 504)
+
+# (connect, read) timeouts for requests and spotipy
+TIMEOUTS = (CONNECT_TIMEOUT, READ_TIMEOUT)
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling an upstream whose circuit breaker is open"""
+
+class RetryPolicy:
+    """Capped exponential backoff with full jitter and a per-call deadline"""
+
+    def __init__(self, max_attempts=RETRY_MAX_ATTEMPTS, base_delay=RETRY_BASE_DELAY,
+                 max_delay=RETRY_MAX_DELAY, deadline=RETRY_DEADLINE):
+        self.max_attempts = max(1, max_attempts)
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.deadline = deadline
+
+    def backoff(self, attempt):
+        """Get a jittered delay before retry number `attempt` (0-based)"""
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+
+    def delay(self, error, attempt):
+        """Get how long to wait before retrying after `error`, honouring Retry-After"""
+        retry_after = get_retry_after(error)
+        if retry_after is not None:
+            # Spread out clients that were all told to come back at the same moment
+            return retry_after + random.uniform(0, self.base_delay)
+        return self.backoff(attempt)
+
+DEFAULT_POLICY = RetryPolicy()
+
+class CircuitBreaker:
+    """
+    Fail fast while an upstream is unhealthy.
+
+    After `failure_threshold` consecutive failures (timeouts, connection
+    errors, 5xx) the circuit opens and calls are rejected with
+    CircuitOpenError for `reset_timeout` seconds. Then a single trial call
+    is let through: success closes the circuit, failure opens it again.
+    Rate limiting (429) is not a health failure and never opens it.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, name, failure_threshold=BREAKER_FAILURE_THRESHOLD, reset_timeout=BREAKER_RESET_TIMEOUT):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.failures = 0
+        self._opened_at = 0.0
+        self._trial_running = False
+        self._lock = threading.Lock()
+
+    def before_call(self):
+        """Check that a call may go ahead, or raise CircuitOpenError"""
+        with self._lock:
+            if self.state == self.CLOSED:
+                return
+            if self.state == self.OPEN and time.monotonic() - self._opened_at >= self.reset_timeout:
+                self.state = self.HALF_OPEN
+            if self.state == self.HALF_OPEN and not self._trial_running:
+                self._trial_running = True
+                return
+            retry_in = max(0.0, self.reset_timeout - (time.monotonic() - self._opened_at))
+        CIRCUIT_BREAKER_REJECTIONS.inc(api=self.name)
+        raise CircuitOpenError(f"{self.name} is unavailable, not retrying for another {retry_in:.0f} seconds")
+
+    def record_success(self):
+        with self._lock:
+            if self.state != self.CLOSED:
+                logging.info(f"Circuit for {self.name} closed")
+            self.state = self.CLOSED
+            self.failures = 0
+            self._trial_running = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            self._trial_running = False
+            if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+                if self.state != self.OPEN:
+                    logging.warning(f"Circuit for {self.name} opened after {self.failures} failures")
+                self.state = self.OPEN
+                self._opened_at = time.monotonic()
+
+    def record_neutral(self):
+        """Finish a call whose outcome says nothing about upstream health"""
+        with self._lock:
+            self._trial_running = False
+
+_breakers = {}
+_breakers_lock = threading.Lock()
+
+def get_circuit_breaker(api):
+    """Get the shared circuit breaker for an upstream API"""
+    with _breakers_lock:
+        if api not in _breakers:
+            _breakers[api] = CircuitBreaker(api)
+        return _breakers[api]
+
+def get_status(error):
+    """Get the HTTP status of a requests or spotipy error, if it has one"""
+    status = getattr(error, "http_status", None)
+    if status is None:
+        status = getattr(getattr(error, "response", None), "status_code", None)
+    return status
+
+def get_retry_after(error):
+    """Get the Retry-After seconds sent with an error response, if any"""
+    headers = getattr(error, "headers", None)
+    if headers is None:
+        headers = getattr(getattr(error, "response", None), "headers", None)
+    try:
+        return max(0, int((headers or {}).get("Retry-After")))
+    except (TypeError, ValueError):
+        return None
+
+def is_rate_limited(error):
+    """Check if an exception is a 429 response"""
+    return get_status(error) == 429
+
+def is_connect_error(error):
+    """Check if a request failed before it reached the server"""
+    import requests
+
+    return isinstance(error, (requests.ConnectionError, requests.ConnectTimeout)) \
+        and not isinstance(error, requests.ReadTimeout)
+
+def is_transient(error):
+    """Check if an error is worth retrying: rate limits, 5xx, timeouts and connection errors"""
+    import requests
+
+    status = get_status(error)
+    if status is not None:
+        return status in RETRYABLE_STATUSES
+    return isinstance(error, (requests.ConnectionError, requests.Timeout))
+
+def call_with_retry(api, endpoint, func, idempotent=True, policy=None):
+    """
+    Call func() with retries, backoff and the API's circuit breaker.
+
+    Args:
+        api (str): The upstream, e.g. "setlistfm" or "spotify".
+        endpoint (str): Name of the call, for logs and metrics.
+        func (callable): Makes one attempt; raises on failure.
+        idempotent (bool, optional): Whether the call is safe to repeat.
+            Non-idempotent calls are only retried when the request cannot
+            have been processed (429, connection errors).
+        policy (RetryPolicy, optional): Defaults to DEFAULT_POLICY.
+
+    Returns:
+        The result of func().
+
+    Raises:
+        CircuitOpenError: If the upstream's circuit is open.
+        Exception: The last error, once retries or the deadline run out.
+    """
+    policy = policy or DEFAULT_POLICY
+    breaker = get_circuit_breaker(api)
+    deadline = time.monotonic() + policy.deadline
+
+    for attempt in range(policy.max_attempts):
+        breaker.before_call()
+        try:
+            result = func()
+        except Exception as e:
+            if is_transient(e) and not is_rate_limited(e):
+                breaker.record_failure()
+            elif get_status(e) is not None:
+                # Any other answer from the upstream shows it is up
+                breaker.record_success()
+            else:
+                breaker.record_neutral()
+
+            retryable = is_transient(e) and (idempotent or is_rate_limited(e) or is_connect_error(e))
+            delay = policy.delay(e, attempt)
+            if not retryable or attempt + 1 >= policy.max_attempts or time.monotonic() + delay > deadline:
+                raise
+
+            reason = "retry_after" if is_rate_limited(e) else "backoff"
+            # Some errors, e.g. requests.ReadTimeout(), have an empty message
+            message = (str(e).splitlines() or [type(e).__name__])[0]
+            logging.warning(f"{api} {endpoint} failed ({message}), retrying in {delay:.1f} seconds")
+            RATE_LIMIT_SLEEP_SECONDS.observe(delay, api=api, reason=reason)
+            time.sleep(delay)
+            continue
+
+        breaker.record_success()
+        return result
@@ -3,19 +3,38 @@ Setlist.fm API integration module
 """
 
 import os
-import logging
 import requests
+import threading
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import closing
 from datetime import datetime, timedelta
-import time
-
-def handle_rate_limit(response):
-    """Handle rate limiting by waiting and retrying"""
-    if response.status_code == 429:
-        retry_after = int(response.headers.get('Retry-After', 60))
-        logging.warning(f"Rate limit reached. Waiting {retry_after} seconds...")
-        time.sleep(retry_after)
-        return True
-    return False
+from requests.adapters import HTTPAdapter
+
+from .cache import TTLCache, memoize, normalize_key
+from .metrics import track_upstream
+from .ratelimit import get_limiter
+from .retry import TIMEOUTS, call_with_retry
+
+SETLISTFM_API_URL = os.getenv("SETLISTFM_API_URL", "https://api.setlist.fm/rest/1.0")
+SETLISTFM_POOL_SIZE = int(os.getenv("SETLISTFM_POOL_SIZE", 10))
+SETLISTFM_PREFETCH_PAGES = int(os.getenv("SETLISTFM_PREFETCH_PAGES", 2))
+MAX_SETLIST_PAGES = 5
+SETLISTFM_CACHE_TTL = int(os.getenv("SETLISTFM_CACHE_TTL", 600))
+SETLISTFM_CACHE_NEGATIVE_TTL = int(os.getenv("SETLISTFM_CACHE_NEGATIVE_TTL", 60))
+SETLISTFM_CACHE_MAX_ENTRIES = int(os.getenv("SETLISTFM_CACHE_MAX_ENTRIES", 256))
+# Artists and setlists by ID, so sessions only need to keep the IDs
+SETLISTFM_OBJECT_TTL = int(os.getenv("SETLISTFM_OBJECT_TTL", 3600))
+SETLISTFM_OBJECT_MAX_ENTRIES = int(os.getenv("SETLISTFM_OBJECT_MAX_ENTRIES", 1024))
+
+# Results shared by every session, so Streamlit reruns don't refetch them
+_artist_cache = TTLCache(SETLISTFM_CACHE_TTL, SETLISTFM_CACHE_MAX_ENTRIES, SETLISTFM_CACHE_NEGATIVE_TTL)
+_setlist_cache = TTLCache(SETLISTFM_CACHE_TTL, SETLISTFM_CACHE_MAX_ENTRIES, SETLISTFM_CACHE_NEGATIVE_TTL)
+_artist_objects = TTLCache(SETLISTFM_OBJECT_TTL, SETLISTFM_OBJECT_MAX_ENTRIES, SETLISTFM_CACHE_NEGATIVE_TTL)
+_setlist_objects = TTLCache(SETLISTFM_OBJECT_TTL, SETLISTFM_OBJECT_MAX_ENTRIES, SETLISTFM_CACHE_NEGATIVE_TTL)
+
+# Shared by all sessions; the token bucket still paces the actual requests
+_prefetch_executor = ThreadPoolExecutor(max_workers=SETLISTFM_POOL_SIZE, thread_name_prefix="setlistfm")
 
 def get_setlistfm_headers():
     """Get headers for Setlist.fm API requests"""
@@ -31,6 +50,109 @@ def get_setlistfm_headers():
         "Accept": "application/json"
     }
 
+class SetlistFmClient:
+    """
+    Setlist.fm API client sharing one keep-alive connection pool.
+    
+    Requests are paced by the shared token bucket for the API key, so
+    concurrent sessions queue for their turn instead of running into 429s.
+    Responses carrying an ETag or Last-Modified header are remembered, and
+    repeat requests for the same URL are sent as conditional requests so the
+    API can answer with a cheap 304 instead of the full JSON payload.
+    """
+    
+    def __init__(self, headers=None, base_url=SETLISTFM_API_URL,
+                 pool_size=SETLISTFM_POOL_SIZE, max_validators=512):
+        self.base_url = base_url.rstrip("/")
+        self.max_validators = max_validators
+        self.session = requests.Session()
+        self.session.headers.update(headers or get_setlistfm_headers())
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self.limiter = get_limiter("setlistfm", self.session.headers.get("x-api-key"))
+        self._validators = OrderedDict()
+        self._lock = threading.Lock()
+    
+    def get_json(self, path, params=None, endpoint=None):
+        """
+        Get a JSON resource from the API.
+        
+        Args:
+            path (str): Path relative to the API root, e.g. "/search/artists".
+            params (dict, optional): Query string parameters.
+            endpoint (str, optional): Name to report metrics under.
+                Defaults to the path.
+        
+        Returns:
+            dict: The decoded JSON payload, or None if the API answers 404,
+                which Setlist.fm uses for empty search results and pages past
+                the end as well as unknown IDs.
+        
+        Raises:
+            requests.HTTPError: If the API returns any other error status.
+            CircuitOpenError: If Setlist.fm has been failing and is not
+                being called for now.
+        """
+        url = f"{self.base_url}{path}"
+        cache_key = (url, tuple(sorted((params or {}).items())))
+        
+        with self._lock:
+            cached = self._validators.get(cache_key)
+        
+        headers = {}
+        if cached:
+            etag, last_modified, _ = cached
+            if etag:
+                headers["If-None-Match"] = etag
+            if last_modified:
+                headers["If-Modified-Since"] = last_modified
+        
+        endpoint = endpoint or path
+        
+        def fetch():
+            self.limiter.acquire()
+            with track_upstream("setlistfm", endpoint):
+                response = self.session.get(url, params=params, headers=headers, timeout=TIMEOUTS)
+                if response.status_code not in (200, 404) and not (response.status_code == 304 and cached):
+                    raise requests.HTTPError(
+                        f"{response.status_code} - {response.text}", response=response
+                    )
+            return response
+        
+        # Rate limits, 5xx and timeouts are retried with backoff, within a deadline
+        response = call_with_retry("setlistfm", endpoint, fetch)
+        
+        if response.status_code == 404:
+            return None
+        if response.status_code == 304:
+            with self._lock:
+                self._validators.move_to_end(cache_key)
+            return cached[2]
+        
+        data = response.json()
+        etag = response.headers.get("ETag")
+        last_modified = response.headers.get("Last-Modified")
+        if etag or last_modified:
+            with self._lock:
+                self._validators[cache_key] = (etag, last_modified, data)
+                self._validators.move_to_end(cache_key)
+                while len(self._validators) > self.max_validators:
+                    self._validators.popitem(last=False)
+        return data
+
+_clients = {}
+_clients_lock = threading.Lock()
+
+def get_setlistfm_client():
+    """Get the shared Setlist.fm client for the configured API key"""
+    headers = get_setlistfm_headers()
+    api_key = headers["x-api-key"]
+    with _clients_lock:
+        if api_key not in _clients:
+            _clients[api_key] = SetlistFmClient(headers=headers)
+        return _clients[api_key]
+
 def is_recent_tour(setlist):
     """Check if the setlist is from the last 12 months"""
     try:
@@ -40,79 +162,225 @@ def is_recent_tour(setlist):
     except ValueError:
         return False
 
+@memoize(_artist_cache, key=lambda artist_name: normalize_key(artist_name))
 def search_artist(artist_name):
-    """Search for an artist on Setlist.fm"""
-    url = "https://api.setlist.fm/rest/1.0/search/artists"
-    headers = get_setlistfm_headers()
+    """
+    Search for an artist on Setlist.fm.
+    
+    Fetch errors are raised rather than returned as None, so a failed
+    request is never cached as "no such artist".
+    
+    Returns:
+        dict: The exact match, or None if there is none.
+    """
+    client = get_setlistfm_client()
     params = {
         "artistName": artist_name,
         "p": 1,
         "sort": "relevance"
     }
     
-    try:
-        response = requests.get(url, headers=headers, params=params)
-        
-        while handle_rate_limit(response):
-            response = requests.get(url, headers=headers, params=params)
-        
-        if response.status_code == 200:
-            data = response.json()
-            if "artist" in data:
-                # Filter for exact matches
-                exact_matches = [
-                    artist for artist in data["artist"]
-                    if artist["name"].lower() == artist_name.lower()
-                ]
-                return exact_matches[0] if exact_matches else None
-        else:
-            logging.error(f"Error searching for artist: {response.status_code} - {response.text}")
-    except Exception as e:
-        logging.error(f"Error searching for artist: {str(e)}")
+    data = client.get_json("/search/artists", params=params, endpoint="search_artists")
+    if data and "artist" in data:
+        # Filter for exact matches
+        exact_matches = [
+            artist for artist in data["artist"]
+            if artist["name"].lower() == artist_name.lower()
+        ]
+        if exact_matches:
+            _artist_objects.set(exact_matches[0]["mbid"], exact_matches[0])
+            return exact_matches[0]
     return None
 
-def get_latest_setlist(artist_mbid):
-    """Get the most recent setlist for an artist that contains songs"""
-    url = f"https://api.setlist.fm/rest/1.0/artist/{artist_mbid}/setlists"
-    headers = get_setlistfm_headers()
-    page = 1
-    max_pages = 5  # Limit how many pages we'll check
-    
-    while page <= max_pages:
-        params = {
-            "p": page,
-            "sort": "eventDate",
-            "order": "desc"
-        }
-        
-        try:
-            response = requests.get(url, headers=headers, params=params)
+def has_songs(setlist):
+    """Check if any set in the setlist lists at least one song"""
+    if "sets" in setlist and "set" in setlist["sets"]:
+        for set_data in setlist["sets"]["set"]:
+            if "song" in set_data and set_data["song"]:
+                return True
+    return False
+
+def _is_past_window(setlist):
+    """Check if a setlist is dated before the 12-month window; undated ones are not"""
+    if is_recent_tour(setlist):
+        return False
+    try:
+        datetime.strptime(setlist['eventDate'], '%d-%m-%Y')
+    except (KeyError, ValueError):
+        return False  # Unparseable date, not a sign that we're past the window
+    return True
+
+def scan_setlist_page(setlists):
+    """
+    Find the first recent setlist with songs on a page of results.
+    
+    Pages are sorted by event date, newest first, so once a setlist falls
+    outside the 12-month window no later setlist can qualify either.
+    
+    Returns:
+        tuple: (setlist, exhausted). `setlist` is the match or None, and
+            `exhausted` is True when no later page can contain a match.
+    """
+    for setlist in setlists:
+        if _is_past_window(setlist):
+            return None, True
+        if is_recent_tour(setlist) and has_songs(setlist):
+            return setlist, True
+    return None, False
+
+def _fetch_setlist_page(client, artist_mbid, page):
+    """Fetch one page of an artist's setlists, newest first"""
+    params = {
+        "p": page,
+        "sort": "eventDate",
+        "order": "desc"
+    }
+    return client.get_json(f"/artist/{artist_mbid}/setlists", params=params, endpoint="artist_setlists")
+
+def iter_setlist_pages(artist_mbid, max_pages=MAX_SETLIST_PAGES, prefetch_pages=None):
+    """
+    Stream an artist's setlists a page at a time, newest first.
+    
+    Page 1 is fetched on its own, since most artists' latest setlist is on
+    it and it tells how many pages there are. After that, up to
+    `prefetch_pages` pages are kept in flight, so the next pages are
+    already downloading while the caller works on the current one. Only
+    those pages are held in memory; closing the generator early cancels
+    the outstanding requests.
+    
+    Args:
+        artist_mbid (str): The artist's MusicBrainz ID.
+        max_pages (int, optional): Stop after this many pages.
+        prefetch_pages (int, optional): How many pages to fetch ahead.
+            Defaults to SETLISTFM_PREFETCH_PAGES; 1 fetches pages one by one.
+    
+    Yields:
+        list: The setlists on each page.
+    """
+    client = get_setlistfm_client()
+    prefetch_pages = max(1, prefetch_pages or SETLISTFM_PREFETCH_PAGES)
+    window = 1
+    last_page = max_pages
+    next_page = 1
+    in_flight = deque()
+    
+    def fill_window():
+        nonlocal next_page
+        while len(in_flight) < window and next_page <= last_page:
+            future = _prefetch_executor.submit(_fetch_setlist_page, client, artist_mbid, next_page)
+            in_flight.append((next_page, future))
+            next_page += 1
+    
+    try:
+        fill_window()
+        while in_flight:
+            _, future = in_flight.popleft()
+            data = future.result() or {}
+            setlists = data.get("setlist") or []
+            if not setlists:
+                return
             
-            while handle_rate_limit(response):
-                response = requests.get(url, headers=headers, params=params)
+            # Don't ask for pages past the end of the results, and drop any already asked for
+            if data.get("itemsPerPage") and "total" in data:
+                total_pages = -(-data["total"] // data["itemsPerPage"])
+                last_page = min(last_page, total_pages)
+                while in_flight and in_flight[-1][0] > last_page:
+                    in_flight.pop()[1].cancel()
             
-            if response.status_code == 200:
-                data = response.json()
-                if "setlist" in data and data["setlist"]:
-                    # Check each setlist for songs
-                    for setlist in data["setlist"]:
-                        if is_recent_tour(setlist):
-                            if "sets" in setlist and "set" in setlist["sets"]:
-                                for set_data in setlist["sets"]["set"]:
-                                    if "song" in set_data and set_data["song"]:
-                                        return setlist  # Found a setlist with songs
-                    page += 1
-                else:
-                    break
-            else:
-                logging.error(f"Error fetching setlists: {response.status_code} - {response.text}")
-                break
-        except Exception as e:
-            logging.error(f"Error fetching latest setlist: {str(e)}")
-            break
+            yield setlists
+            window = prefetch_pages
+            fill_window()
+    finally:
+        for _, future in in_flight:
+            future.cancel()
+
+def iter_recent_setlists(artist_mbid, max_pages=MAX_SETLIST_PAGES, prefetch_pages=None):
+    """
+    Stream an artist's setlists with songs from the last 12 months, newest first.
+    
+    Stops fetching as soon as the results move past the 12-month window.
+    """
+    with closing(iter_setlist_pages(artist_mbid, max_pages, prefetch_pages)) as pages:
+        for setlists in pages:
+            for setlist in setlists:
+                if _is_past_window(setlist):
+                    return
+                if is_recent_tour(setlist) and has_songs(setlist):
+                    yield setlist
+
+@memoize(_setlist_cache, key=lambda artist_mbid, prefetch_pages=None: artist_mbid)
+def get_latest_setlist(artist_mbid, prefetch_pages=None):
+    """
+    Get the most recent setlist for an artist that contains songs.
+    
+    After page 1, up to `prefetch_pages` pages are kept in flight, so the
+    next pages are already downloading while the current one is scanned.
+    Outstanding requests are cancelled as soon as a qualifying setlist is
+    found or the results move past the 12-month window.
+    
+    Args:
+        artist_mbid (str): The artist's MusicBrainz ID.
+        prefetch_pages (int, optional): How many pages to fetch ahead.
+            Defaults to SETLISTFM_PREFETCH_PAGES; 1 fetches pages one by one.
+    
+    Returns:
+        dict: The setlist, or None if no recent setlist with songs was found.
+    
+    Raises:
+        Exception: If a page could not be fetched; errors are not cached.
+    """
+    with closing(iter_setlist_pages(artist_mbid, prefetch_pages=prefetch_pages)) as pages:
+        for setlists in pages:
+            setlist, exhausted = scan_setlist_page(setlists)
+            if exhausted:
+                if setlist and setlist.get("id"):
+                    _setlist_objects.set(setlist["id"], setlist)
+                return setlist
     
     return None
 
+@memoize(_artist_objects, key=lambda artist_mbid: artist_mbid)
+def get_artist(artist_mbid):
+    """
+    Get an artist by MusicBrainz ID.
+    
+    Artists found by search_artist are served from memory; others are
+    fetched from Setlist.fm.
+    
+    Returns:
+        dict: The artist, or None if Setlist.fm has no artist with that ID.
+    
+    Raises:
+        Exception: If the artist could not be fetched; errors are not cached.
+    """
+    return get_setlistfm_client().get_json(f"/artist/{artist_mbid}", endpoint="artist")
+
+@memoize(_setlist_objects, key=lambda setlist_id: setlist_id)
+def get_setlist(setlist_id):
+    """
+    Get a setlist by its Setlist.fm ID.
+    
+    Setlists found by get_latest_setlist are served from memory; others
+    are fetched from Setlist.fm.
+    
+    Returns:
+        dict: The setlist, or None if Setlist.fm has no setlist with that ID.
+    
+    Raises:
+        Exception: If the setlist could not be fetched; errors are not cached.
+    """
+    return get_setlistfm_client().get_json(f"/setlist/{setlist_id}", endpoint="setlist")
+
+def get_cache_stats():
+    """Get how many Setlist.fm lookups were answered from the cache or shared in flight"""
+    artist_stats = dict(_artist_cache.stats(), coalesced=search_artist.flight.coalesced)
+    setlist_stats = dict(_setlist_cache.stats(), coalesced=get_latest_setlist.flight.coalesced)
+    return {
+        "search_artist": artist_stats,
+        "get_latest_setlist": setlist_stats,
+        "calls_saved": sum(stats["calls_saved"] + stats["coalesced"] for stats in (artist_stats, setlist_stats))
+    }
+
 def get_artist_image(artist):
     """Get the best quality image for an artist from setlist.fm"""
     if "image" in artist and artist["image"]:
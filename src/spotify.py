@@ -3,61 +3,148 @@ Spotify API integration module
 """
 
 import os
-import logging
-import spotipy
-from spotipy.oauth2 import SpotifyOAuth
-from PIL import Image
-import io
-import requests
 import base64
-import streamlit as st
+import logging
+import re
+import threading
+import time
+from collections import OrderedDict, namedtuple
+from difflib import SequenceMatcher
+
+# spotipy, requests and streamlit are imported where they are used (PIL in images.py), so
+# that importing this module (e.g. from the batch CLI) stays cheap
+
+from .cache import SingleFlight, get_track_cache, normalize_key
+from .images import get_cover_image
+from .metrics import TRACK_RESOLUTIONS, track_upstream
+from .ratelimit import get_limiter
+from .retry import TIMEOUTS, call_with_retry
+from .utils import normalize_title
+
+SPOTIFY_API_URL = os.getenv("SPOTIFY_API_URL", "https://api.spotify.com/v1/")
+
+# Keep-alive connections per host in the shared HTTP session; enough for
+# every resolver worker of MAX_CONCURRENT_BUILDS builds at once
+SPOTIFY_HTTP_POOL_SIZE = int(os.getenv("SPOTIFY_HTTP_POOL_SIZE", 32))
+# Pooled per-user clients, and how long an unused one is kept
+SPOTIFY_CLIENT_POOL_SIZE = int(os.getenv("SPOTIFY_CLIENT_POOL_SIZE", 1000))
+SPOTIFY_CLIENT_IDLE_TTL = int(os.getenv("SPOTIFY_CLIENT_IDLE_TTL", 1800))
+# Pooled clients refresh their token this many seconds before it expires
+CLIENT_TOKEN_REFRESH_MARGIN = 60
+
+# Ranked track matching
+RANKED_SEARCH_LIMIT = 10
+TRACK_MATCH_MIN_SCORE = float(os.getenv("TRACK_MATCH_MIN_SCORE", 0.7))
+TITLE_WEIGHT = 0.6
+VERSION_PENALTY = 0.25
+PENALTY_TERMS = [
+    re.compile(rf"\b{term}\b") for term in (
+        "live", "karaoke", "tribute", "instrumental", "in the style of",
+        "originally performed", "made famous", "backing track", "cover"
+    )
+]
+
+# Writes that must not be repeated once Spotify may have applied them
+NON_IDEMPOTENT_ENDPOINTS = {"playlist_create", "playlist_add", "playlist_reorder"}
+
+TrackMatch = namedtuple("TrackMatch", ["uri", "score", "name", "artists", "popularity"])
 
-def get_spotify_auth_manager(scope=None, cache_path=None):
+_track_flight = SingleFlight("search_track")
+
+CREDENTIALS_HELP = """
+    To set up your credentials, either set the SPOTIPY_CLIENT_ID and
+    SPOTIPY_CLIENT_SECRET environment variables, or add them to your
+    Streamlit secrets:
+    1. Go to your Streamlit Cloud dashboard
+    2. Select your app
+    3. Click on "Settings" → "Secrets"
+    4. Add your Spotify credentials in this format:
+    
+    [spotify]
+    client_id = "your_client_id"
+    client_secret = "your_client_secret"
+    
+    Make sure to:
+    1. Copy the exact credentials from your Spotify Developer Dashboard
+    2. Include the quotes around the values
+    3. Don't add any extra spaces or newlines
+"""
+
+def get_spotify_credentials():
     """
-    Get a Spotify authentication manager with the specified scope.
+    Get the Spotify client ID and secret.
     
-    Args:
-        scope (str, optional): The scope for Spotify authentication.
-        cache_path (str, optional): Path to the cache file for storing tokens.
+    The SPOTIPY_CLIENT_ID and SPOTIPY_CLIENT_SECRET environment variables
+    are used when set; otherwise the credentials are read from Streamlit
+    secrets, so streamlit is only imported when the app needs it.
     
     Returns:
-        spotipy.oauth2.SpotifyOAuth: The Spotify authentication manager.
+        tuple: (client_id, client_secret)
+    
+    Raises:
+        ValueError: If no credentials are configured.
     """
+    client_id = os.getenv("SPOTIPY_CLIENT_ID")
+    client_secret = os.getenv("SPOTIPY_CLIENT_SECRET")
+    
     try:
-        # Get credentials from Streamlit secrets
-        if "spotify" not in st.secrets:
-            raise ValueError("Spotify credentials not found in Streamlit secrets")
-        
-        client_id = st.secrets["spotify"]["client_id"]
-        client_secret = st.secrets["spotify"]["client_secret"]
-        
         if not client_id or not client_secret:
-            raise ValueError("Spotify credentials are empty")
+            import streamlit as st
             
-        logging.info("Successfully loaded Spotify credentials")
+            if "spotify" not in st.secrets:
+                raise ValueError("Spotify credentials not found in the environment or Streamlit secrets")
+            
+            client_id = st.secrets["spotify"]["client_id"]
+            client_secret = st.secrets["spotify"]["client_secret"]
         
+        if not client_id or not client_secret:
+            raise ValueError("Spotify credentials are empty")
     except Exception as e:
-        error_msg = f"""
-            Failed to load Spotify credentials: {str(e)}
-            
-            To set up your credentials:
-            1. Go to your Streamlit Cloud dashboard
-            2. Select your app
-            3. Click on "Settings" → "Secrets"
-            4. Add your Spotify credentials in this format:
-            
-            [spotify]
-            client_id = "your_client_id"
-            client_secret = "your_client_secret"
-            
-            Make sure to:
-            1. Copy the exact credentials from your Spotify Developer Dashboard
-            2. Include the quotes around the values
-            3. Don't add any extra spaces or newlines
-        """
-        st.error(error_msg)
         logging.error(f"Spotify credentials error: {str(e)}")
-        raise
+        raise ValueError(f"Failed to load Spotify credentials: {str(e)}\n{CREDENTIALS_HELP}") from e
+    
+    logging.info("Successfully loaded Spotify credentials")
+    return client_id, client_secret
+
+def get_redirect_uri(redirect_uri=None):
+    """Get the OAuth redirect URI, ending with a trailing slash"""
+    if not redirect_uri:
+        redirect_uri = os.getenv("SPOTIPY_REDIRECT_URI")
+    if not redirect_uri:
+        # Check if we're running on Streamlit Cloud
+        if os.getenv("STREAMLIT_SERVER_ADDRESS", "").startswith("https://"):
+            redirect_uri = f"https://{os.getenv('STREAMLIT_SERVER_ADDRESS', '')}"
+        else:
+            # Local development
+            redirect_uri = "http://localhost:8501"
+    
+    if not redirect_uri.endswith("/"):
+        redirect_uri += "/"
+    return redirect_uri
+
+def get_spotify_auth_manager(scope=None, cache_path=None, redirect_uri=None, cache_handler=None):
+    """
+    Get a Spotify authentication manager with the specified scope.
+    
+    Args:
+        scope (str, optional): The scope for Spotify authentication.
+        cache_path (str, optional): Path to the cache file for storing tokens.
+        redirect_uri (str, optional): The OAuth redirect URI. Defaults to
+            SPOTIPY_REDIRECT_URI, or the Streamlit server address.
+        cache_handler (spotipy.cache_handler.CacheHandler, optional): Where
+            to store tokens, e.g. a token store handler; takes precedence
+            over `cache_path`.
+    
+    Returns:
+        spotipy.oauth2.SpotifyOAuth: The Spotify authentication manager.
+    
+    Raises:
+        ValueError: If no credentials are configured; the message explains
+            how to set them up.
+    """
+    from spotipy.oauth2 import SpotifyOAuth
+    
+    client_id, client_secret = get_spotify_credentials()
     
     # Define scopes if not provided
     if scope is None:
@@ -65,35 +152,13 @@ def get_spotify_auth_manager(scope=None, cache_path=None):
             "playlist-modify-public",
             "playlist-modify-private",
             "user-read-private",
-            "user-read-email"
+            "user-read-email",
+            # Needed to upload playlist cover images
+            "ugc-image-upload"
         ])
     
-    # Get the current URL for the redirect URI
-    try:
-        # Try to get the current URL from Streamlit
-        current_url = st.query_params.get("redirect_uri", None)
-        
-        if current_url:
-            # If we have a redirect_uri in the query params, use it
-            redirect_uri = current_url
-        else:
-            # Check if we're running on Streamlit Cloud
-            if os.getenv("STREAMLIT_SERVER_ADDRESS", "").startswith("https://"):
-                # We're on Streamlit Cloud, use the current URL
-                redirect_uri = f"https://{os.getenv('STREAMLIT_SERVER_ADDRESS', '')}"
-            else:
-                # Local development
-                redirect_uri = "http://localhost:8501"
-        
-        # Ensure the redirect URI ends with a trailing slash
-        if not redirect_uri.endswith("/"):
-            redirect_uri += "/"
-            
-        logging.info(f"Using redirect URI: {redirect_uri}")
-        
-    except Exception as e:
-        logging.error(f"Error determining redirect URI: {str(e)}")
-        redirect_uri = "http://localhost:8501/"
+    redirect_uri = get_redirect_uri(redirect_uri)
+    logging.info(f"Using redirect URI: {redirect_uri}")
     
     # Create the auth manager with all necessary parameters
     auth_manager = SpotifyOAuth(
@@ -101,41 +166,358 @@ def get_spotify_auth_manager(scope=None, cache_path=None):
         client_secret=client_secret,
         redirect_uri=redirect_uri,
         scope=scope,
-        cache_path=cache_path,
-        show_dialog=True  # Force the consent screen to show
+        cache_path=None if cache_handler else cache_path,
+        cache_handler=cache_handler,
+        show_dialog=True,  # Force the consent screen to show
+        requests_session=get_http_session(),
+        requests_timeout=TIMEOUTS
     )
     
     return auth_manager
 
-def get_spotify_client(auth_token):
-    """Get an authenticated Spotify client"""
-    if isinstance(auth_token, dict):
-        auth_token = auth_token.get('access_token')
-    return spotipy.Spotify(auth=auth_token)
+def get_spotify_limiter():
+    """Get the shared rate limiter for Spotify Web API calls made by this app"""
+    return get_limiter("spotify", os.getenv("SPOTIPY_CLIENT_ID"))
+
+def call_spotify(endpoint, method, *args, **kwargs):
+    """
+    Call a Spotify client method through the shared rate limiter, recording its latency.
+    
+    Transient failures are retried with the shared backoff policy, and calls
+    fail fast while Spotify's circuit breaker is open. Playlist creation and
+    additions are only retried when they cannot have been applied.
+    """
+    limiter = get_spotify_limiter()
+    
+    def attempt():
+        limiter.acquire()
+        with track_upstream("spotify", endpoint):
+            return method(*args, **kwargs)
+    
+    return call_with_retry(
+        "spotify", endpoint, attempt, idempotent=endpoint not in NON_IDEMPOTENT_ENDPOINTS
+    )
+
+_http_session = None
+_http_session_lock = threading.Lock()
+
+def get_http_session():
+    """
+    Get the requests session shared by every Spotify client.
+    
+    Its connection pool holds SPOTIFY_HTTP_POOL_SIZE keep-alive connections
+    per host, so clients created for different users and actions reuse warm
+    connections instead of each opening their own. It has no retry adapter;
+    retries are left to call_spotify.
+    """
+    global _http_session
+    with _http_session_lock:
+        if _http_session is None:
+            import requests
+            from requests.adapters import HTTPAdapter
+            
+            class SharedSession(requests.Session):
+                def close(self):
+                    """Ignore close(); spotipy closes its session when a client is garbage collected"""
+            
+            session = SharedSession()
+            adapter = HTTPAdapter(pool_connections=8, pool_maxsize=SPOTIFY_HTTP_POOL_SIZE, max_retries=0)
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            _http_session = session
+        return _http_session
+
+def create_spotify_client(**kwargs):
+    """
+    Create a spotipy client that leaves retries to call_spotify.
+    
+    spotipy's own retry adapter sleeps for whatever Retry-After says and
+    hides the header from callers, so clients use the shared session, which
+    has none, with connect/read timeouts instead.
+    """
+    import spotipy
+    
+    sp = spotipy.Spotify(requests_session=get_http_session(), requests_timeout=TIMEOUTS, **kwargs)
+    sp.prefix = SPOTIFY_API_URL
+    return sp
+
+class PooledTokenAuth:
+    """
+    spotipy auth manager serving a user's token to a pooled client.
+    
+    The token is refreshed in place shortly before it expires, so the
+    client and its connections outlive the token.
+    """
+    
+    def __init__(self, token_info, auth_manager=None):
+        """
+        Args:
+            token_info (dict): Token info with at least an access_token.
+            auth_manager (spotipy.oauth2.SpotifyOAuth, optional): Used to
+                refresh the token; without one it is served until replaced.
+        """
+        self.token_info = token_info
+        self.auth_manager = auth_manager
+        self._lock = threading.Lock()
+    
+    def update(self, token_info, auth_manager=None):
+        """Replace the token, unless the one already held is fresher"""
+        with self._lock:
+            if token_info.get("expires_at", 0) >= self.token_info.get("expires_at", 0):
+                self.token_info = token_info
+            if auth_manager is not None:
+                self.auth_manager = auth_manager
+    
+    def get_access_token(self, as_dict=False):
+        with self._lock:
+            expires_at = self.token_info.get("expires_at")
+            if (self.auth_manager is not None and self.token_info.get("refresh_token")
+                    and expires_at is not None and expires_at - time.time() < CLIENT_TOKEN_REFRESH_MARGIN):
+                self.token_info = self.auth_manager.refresh_access_token(self.token_info["refresh_token"])
+            return self.token_info if as_dict else self.token_info["access_token"]
+
+class SpotifyClientPool:
+    """
+    Authenticated Spotify clients reused across a user's actions.
+    
+    All clients share one HTTP session. Clients unused for `idle_ttl`
+    seconds are evicted, as are the least recently used beyond `max_entries`.
+    """
+    
+    def __init__(self, max_entries=SPOTIFY_CLIENT_POOL_SIZE, idle_ttl=SPOTIFY_CLIENT_IDLE_TTL):
+        self.max_entries = max_entries
+        self.idle_ttl = idle_ttl
+        self.created = 0
+        self.reused = 0
+        self._clients = OrderedDict()
+        self._lock = threading.Lock()
+    
+    def get(self, key, token_info, auth_manager=None):
+        """
+        Get the client for `key`, creating it if needed.
+        
+        Args:
+            key (str): Identifies the user, e.g. their session's user ID.
+            token_info (dict): The user's current token info; replaces the
+                pooled client's token if it is fresher.
+            auth_manager (spotipy.oauth2.SpotifyOAuth, optional): Used to
+                refresh the token in place.
+        
+        Returns:
+            spotipy.Spotify: The pooled client.
+        """
+        now = time.monotonic()
+        with self._lock:
+            self._prune(now)
+            entry = self._clients.get(key)
+            if entry is None:
+                client = create_spotify_client(auth_manager=PooledTokenAuth(token_info, auth_manager))
+                self.created += 1
+            else:
+                client = entry[1]
+                client.auth_manager.update(token_info, auth_manager)
+                self.reused += 1
+            self._clients[key] = (now, client)
+            self._clients.move_to_end(key)
+            while len(self._clients) > self.max_entries:
+                self._clients.popitem(last=False)
+            return client
+    
+    def discard(self, key):
+        """Drop a user's client, e.g. when they disconnect"""
+        with self._lock:
+            self._clients.pop(key, None)
+    
+    def _prune(self, now):
+        """Evict clients idle for longer than idle_ttl, oldest first"""
+        while self._clients:
+            last_used, _ = next(iter(self._clients.values()))
+            if now - last_used <= self.idle_ttl:
+                break
+            self._clients.popitem(last=False)
+    
+    def __len__(self):
+        return len(self._clients)
+    
+    def stats(self):
+        return {"clients": len(self._clients), "created": self.created, "reused": self.reused}
+
+_client_pool = None
+_app_client = None
+_client_pool_lock = threading.Lock()
+
+def get_client_pool():
+    """Get the process-wide Spotify client pool"""
+    global _client_pool
+    with _client_pool_lock:
+        if _client_pool is None:
+            _client_pool = SpotifyClientPool()
+        return _client_pool
+
+def get_spotify_client(auth_token, key=None, auth_manager=None):
+    """
+    Get an authenticated Spotify client from the client pool.
+    
+    Args:
+        auth_token (str or dict): An access token, or token info.
+        key (str, optional): Pool key for the user; defaults to the access
+            token, so the same token always gets the same client.
+        auth_manager (spotipy.oauth2.SpotifyOAuth, optional): Used to
+            refresh the token in place when it is about to expire.
+    
+    Returns:
+        spotipy.Spotify: A client shared by every call for the same key.
+    """
+    token_info = auth_token if isinstance(auth_token, dict) else {"access_token": auth_token}
+    return get_client_pool().get(key or token_info["access_token"], token_info, auth_manager)
+
+def get_app_spotify_client():
+    """Get the shared client-credentials client for lookups that need no user"""
+    global _app_client
+    with _client_pool_lock:
+        if _app_client is None:
+            from spotipy.cache_handler import MemoryCacheHandler
+            from spotipy.oauth2 import SpotifyClientCredentials
+            
+            client_id, client_secret = get_spotify_credentials()
+            _app_client = create_spotify_client(auth_manager=SpotifyClientCredentials(
+                client_id=client_id,
+                client_secret=client_secret,
+                cache_handler=MemoryCacheHandler(),
+                requests_session=get_http_session(),
+                requests_timeout=TIMEOUTS
+            ))
+        return _app_client
+
+def find_track_uri(sp, song_name, artist_name=None, catalog=None):
+    """
+    Search for a track on Spotify with broader matching.
+    
+    Results (including "not found") are served from the persistent track
+    cache when possible, then from the artist's catalog index if one is
+    given, before falling back to a ranked search. Concurrent lookups of
+    the same song share one resolution. Unlike search_track_on_spotify,
+    errors raised by the Spotify client are propagated so callers can decide
+    how to handle them (e.g. back off on 429), and are never cached.
+    
+    Args:
+        sp (spotipy.Spotify): An authenticated Spotify client.
+        song_name (str): The song title.
+        artist_name (str, optional): The artist performing the song.
+        catalog (ArtistCatalog, optional): Index of the artist's own tracks.
+    
+    Returns:
+        str: The Spotify URI of the best match, or None if nothing was found.
+    """
+    cache = get_track_cache()
+    hit, uri = cache.get(song_name, artist_name)
+    if hit:
+        TRACK_RESOLUTIONS.inc(source="cache" if uri else "cache_not_found")
+        return uri
+    
+    # Identical lookups from concurrent sessions share one resolution
+    return _track_flight.do(
+        normalize_key(song_name, artist_name), _resolve_track_uri, sp, song_name, artist_name, catalog, cache
+    )
+
+def _resolve_track_uri(sp, song_name, artist_name, catalog, cache):
+    """Resolve a track that missed the cache, then cache the result"""
+    if catalog is not None:
+        uri = catalog.lookup(song_name)
+        if uri:
+            TRACK_RESOLUTIONS.inc(source="catalog")
+            cache.set(song_name, artist_name, uri)
+            return uri
+    
+    match = match_track(sp, song_name, artist_name)
+    uri = match.uri if match else None
+    TRACK_RESOLUTIONS.inc(source="search" if uri else "not_found")
+    cache.set(song_name, artist_name, uri)
+    return uri
+
+def score_track(track, song_name, artist_name=None):
+    """
+    Score how well a Spotify track matches a setlist song.
+    
+    Combines title similarity and artist match, and penalises live,
+    karaoke, tribute and similar versions unless the setlist asked for one.
+    
+    Returns:
+        float: A confidence score between 0 and 1.
+    """
+    wanted_title = normalize_title(song_name)
+    found_title = normalize_title(track["name"])
+    if wanted_title == found_title:
+        title_score = 1.0
+    else:
+        title_score = SequenceMatcher(None, wanted_title, found_title).ratio()
+    
+    if artist_name:
+        wanted_artist = normalize_key(artist_name)
+        track_artists = [normalize_key(artist["name"]) for artist in track["artists"]]
+        if wanted_artist in track_artists:
+            artist_score = 1.0
+        else:
+            # Similar names ("The Beatles" / "Beatles") only get partial credit
+            artist_score = 0.5 * max(
+                (SequenceMatcher(None, wanted_artist, name).ratio() for name in track_artists),
+                default=0.0
+            )
+        score = TITLE_WEIGHT * title_score + (1 - TITLE_WEIGHT) * artist_score
+    else:
+        score = title_score
+    
+    details = " ".join([
+        track["name"],
+        track.get("album", {}).get("name", ""),
+        *(artist["name"] for artist in track["artists"])
+    ]).lower()
+    requested = song_name.lower()
+    for term in PENALTY_TERMS:
+        if term.search(details) and not term.search(requested):
+            score -= VERSION_PENALTY
+    
+    return max(0.0, score)
+
+def match_track(sp, song_name, artist_name=None):
+    """
+    Find the best matching track with a single search query.
+    
+    Fetches a page of candidates and ranks them locally with score_track.
+    
+    Args:
+        sp (spotipy.Spotify): An authenticated Spotify client.
+        song_name (str): The song title.
+        artist_name (str, optional): The artist performing the song.
+    
+    Returns:
+        TrackMatch: The best candidate, or None if none scored at least
+            TRACK_MATCH_MIN_SCORE.
+    """
+    query = f"{song_name} {artist_name}" if artist_name else song_name
+    result = call_spotify("search", sp.search, query, type="track", limit=RANKED_SEARCH_LIMIT)
+    
+    best = None
+    for track in result["tracks"]["items"]:
+        score = score_track(track, song_name, artist_name)
+        if best is None or (score, track.get("popularity", 0)) > (best.score, best.popularity):
+            best = TrackMatch(
+                uri=track["uri"],
+                score=score,
+                name=track["name"],
+                artists=[artist["name"] for artist in track["artists"]],
+                popularity=track.get("popularity", 0)
+            )
+    
+    if best is None or best.score < TRACK_MATCH_MIN_SCORE:
+        logging.debug(f"No confident match for {song_name}: {best}")
+        return None
+    return best
 
 def search_track_on_spotify(sp, song_name, artist_name=None):
     """Search for a track on Spotify with broader matching"""
     try:
-        # First try exact match with artist
-        if artist_name:
-            query = f"track:\"{song_name}\" artist:\"{artist_name}\""
-            result = sp.search(query, type="track", limit=1)
-            if result["tracks"]["items"]:
-                return result["tracks"]["items"][0]["uri"]
-        
-        # Then try just the song name with artist
-        if artist_name:
-            query = f"{song_name} {artist_name}"
-            result = sp.search(query, type="track", limit=1)
-            if result["tracks"]["items"]:
-                return result["tracks"]["items"][0]["uri"]
-        
-        # Finally try just the song name
-        query = song_name
-        result = sp.search(query, type="track", limit=1)
-        if result["tracks"]["items"]:
-            return result["tracks"]["items"][0]["uri"]
-        
+        return find_track_uri(sp, song_name, artist_name)
     except Exception as e:
         logging.error(f"Error searching for track {song_name}: {str(e)}")
     return None
@@ -143,11 +525,10 @@ def search_track_on_spotify(sp, song_name, artist_name=None):
 def get_spotify_artist_image(artist_name):
     """Get artist image from Spotify API"""
     try:
-        auth_manager = get_spotify_auth_manager()
-        sp = spotipy.Spotify(auth_manager=auth_manager)
+        sp = get_app_spotify_client()
         
         # Search for the artist
-        results = sp.search(q=artist_name, type='artist', limit=1)
+        results = call_spotify("artist_search", sp.search, q=artist_name, type='artist', limit=1)
         
         if results['artists']['items']:
             artist = results['artists']['items'][0]
@@ -159,28 +540,19 @@ def get_spotify_artist_image(artist_name):
     return None
 
 def upload_playlist_image(playlist_id, image_url, access_token):
-    """Upload an image as playlist cover"""
+    """
+    Upload an image as playlist cover.
+    
+    The image is resized and encoded to fit Spotify's 256 KB limit by
+    get_cover_image, which serves it from the disk cache when it has been
+    prepared before (e.g. by prefetch_cover_image while tracks resolved).
+    """
+    import requests
+    
+    session = get_http_session()
     try:
-        # Download the image
-        response = requests.get(image_url)
-        if response.status_code != 200:
-            raise ValueError(f"Failed to download image: {response.status_code}")
-        
-        # Process image
-        img = Image.open(io.BytesIO(response.content))
-        
-        # Convert to RGB if necessary
-        if img.mode != 'RGB':
-            img = img.convert('RGB')
-        
-        # Resize if larger than 256KB
-        max_size = (800, 800)
-        img.thumbnail(max_size, Image.Resampling.LANCZOS)
-        
-        # Save to bytes
-        img_byte_arr = io.BytesIO()
-        img.save(img_byte_arr, format='JPEG', quality=85, optimize=True)
-        img_byte_arr = img_byte_arr.getvalue()
+        # Spotify expects the JPEG as a base64 request body
+        image_data = base64.b64encode(get_cover_image(image_url, session))
         
         # Upload image
         headers = {
@@ -188,8 +560,16 @@ def upload_playlist_image(playlist_id, image_url, access_token):
             'Content-Type': 'image/jpeg'
         }
         
-        upload_url = f'https://api.spotify.com/v1/playlists/{playlist_id}/images'
-        response = requests.put(upload_url, headers=headers, data=img_byte_arr)
+        upload_url = f'{SPOTIFY_API_URL}playlists/{playlist_id}/images'
+        
+        def put_image():
+            response = session.put(upload_url, headers=headers, data=image_data, timeout=TIMEOUTS)
+            if response.status_code == 429 or response.status_code >= 500:
+                # Let call_spotify retry rate limits and server errors
+                raise requests.HTTPError(f"{response.status_code} - {response.text}", response=response)
+            return response
+        
+        response = call_spotify("image_upload", put_image)
         
         if response.status_code != 202:
             raise ValueError(f"Failed to upload image: {response.status_code} - {response.text}")
@@ -198,4 +578,4 @@ def upload_playlist_image(playlist_id, image_url, access_token):
         
     except Exception as e:
         logging.error(f"Error uploading playlist image: {str(e)}")
-        return False 
\ No newline at end of file
+        return False
@@ -0,0 +1,228 @@
+"""
+Incremental playlist sync: update a playlist in place with as few writes as possible
+"""
+
+import os
+import logging
+import re
+from bisect import bisect_left
+from collections import Counter
+
+from .spotify import call_spotify
+
+# Every playlist the app creates says so in its description; sync looks for it
+APP_PLAYLIST_MARKER = "Created with Setlist to Spotify app"
+# Playlists other than latest-show ones tag the marker with their kind, e.g. "... app [tour]",
+# so a tour sync never takes over a latest-show playlist or the other way round
+_MARKER_PATTERN = re.compile(re.escape(APP_PLAYLIST_MARKER) + r"(?: \[(\w+)\])?\.?")
+# Playlists of the user to look through for the previous one (50 per page)
+SYNC_MAX_PLAYLIST_PAGES = int(os.getenv("SYNC_MAX_PLAYLIST_PAGES", 4))
+# Spotify accepts at most 100 items per add or remove request
+SYNC_BATCH_SIZE = 100
+
+def app_playlist_marker(kind="show"):
+    """Get the description marker for a kind of app playlist: show, tour or festival"""
+    return APP_PLAYLIST_MARKER if kind == "show" else f"{APP_PLAYLIST_MARKER} [{kind}]"
+
+def playlist_kind(description):
+    """Get the kind of app playlist a description marks, or None if the app didn't make it"""
+    match = _MARKER_PATTERN.search(description or "")
+    if match is None:
+        return None
+    return match.group(1) or "show"
+
+def mark_description(description, kind="show"):
+    """Replace any app marker in a description with the one for `kind`"""
+    if playlist_kind(description) == kind:
+        return description
+    description = _MARKER_PATTERN.sub("", description or "").strip()
+    return f"{description} {app_playlist_marker(kind)}.".strip()
+
+def find_app_playlist(sp, artist_name, user_id, kind="show"):
+    """
+    Find the most recent playlist of a kind the app made for an artist.
+
+    Args:
+        sp (spotipy.Spotify): An authenticated Spotify client.
+        artist_name (str): The artist; app playlists are named "<artist> - ...".
+        user_id (str): The current user, who must own the playlist.
+        kind (str, optional): "show" for latest-show playlists or "tour".
+
+    Returns:
+        dict: The simplified playlist object, or None if there is none.
+    """
+    prefix = f"{artist_name} - ".lower()
+    for page in range(SYNC_MAX_PLAYLIST_PAGES):
+        result = call_spotify("current_user_playlists", sp.current_user_playlists, limit=50, offset=page * 50)
+        for playlist in result["items"]:
+            if (playlist and playlist["owner"]["id"] == user_id
+                    and playlist["name"].lower().startswith(prefix)
+                    and playlist_kind(playlist.get("description")) == kind):
+                return playlist
+        if not result.get("next"):
+            break
+    return None
+
+def get_playlist_uris(sp, playlist_id):
+    """Get the track URIs of a playlist in order, and its snapshot ID"""
+    uris = []
+    offset = 0
+    while True:
+        result = call_spotify(
+            "playlist_items", sp.playlist_items, playlist_id,
+            fields="items(track(uri)),next", limit=100, offset=offset
+        )
+        # Unavailable tracks come back without a track object
+        uris.extend(item["track"]["uri"] if item.get("track") else None for item in result["items"])
+        if not result.get("next"):
+            break
+        offset += len(result["items"])
+    playlist = call_spotify("playlist_get", sp.playlist, playlist_id, fields="snapshot_id")
+    return uris, playlist["snapshot_id"]
+
+def _longest_increasing_subsequence(values):
+    """Get the indices into `values` of one longest strictly increasing subsequence"""
+    tails = []
+    tail_indices = []
+    previous = [None] * len(values)
+    for index, value in enumerate(values):
+        position = bisect_left(tails, value)
+        if position == len(tails):
+            tails.append(value)
+            tail_indices.append(index)
+        else:
+            tails[position] = value
+            tail_indices[position] = index
+        previous[index] = tail_indices[position - 1] if position else None
+    result = []
+    index = tail_indices[-1] if tail_indices else None
+    while index is not None:
+        result.append(index)
+        index = previous[index]
+    return result[::-1]
+
+def _plan(current, target, readd_moved):
+    """Build one sync plan; see plan_playlist_sync"""
+    current_counts = Counter(current)
+    target_counts = Counter(target)
+    # URIs the target does not need, or has fewer copies of, are removed
+    # entirely; surplus duplicates come back as additions
+    removed = {uri for uri, count in current_counts.items() if count > target_counts.get(uri, 0)}
+
+    # Tag each copy of a URI with its occurrence number, so duplicates match up
+    def tag(uris, skip):
+        seen = Counter()
+        tagged = []
+        for uri in uris:
+            if uri in skip:
+                tagged.append(None)
+                continue
+            tagged.append((uri, seen[uri]))
+            seen[uri] += 1
+        return tagged
+
+    kept = [item for item in tag(current, removed) if item is not None]
+    position = {item: index for index, item in enumerate(kept)}
+    wanted = tag(target, removed)
+    existing = [item for item in wanted if item in position]
+
+    # Tracks already in the right relative order stay where they are
+    in_order = {existing[i] for i in _longest_increasing_subsequence([position[item] for item in existing])}
+    moved = [item for item in existing if item not in in_order]
+
+    if readd_moved:
+        # Remove and re-add moved tracks, unless a copy of the URI stays put
+        staying = {uri for uri, _ in in_order}
+        readded = {uri for uri, _ in moved if uri not in staying}
+        removed |= readded
+        kept = [item for item in kept if item[0] not in readded]
+        existing = [item for item in existing if item[0] not in readded]
+        moved = [item for item in moved if item[0] not in readded]
+
+    operations = []
+    removed_uris = sorted(removed)
+    for start in range(0, len(removed_uris), SYNC_BATCH_SIZE):
+        operations.append(("remove", removed_uris[start:start + SYNC_BATCH_SIZE]))
+
+    # Move the remaining out-of-order tracks right after their predecessor in the target
+    order = list(kept)
+    moved = set(moved)
+    for index, item in enumerate(existing):
+        if item not in moved:
+            continue
+        start = order.index(item)
+        insert_before = order.index(existing[index - 1]) + 1 if index else 0
+        operations.append(("reorder", start, insert_before))
+        order.pop(start)
+        order.insert(insert_before - 1 if start < insert_before else insert_before, item)
+
+    # Insert new tracks as contiguous runs at their target positions
+    present = set(existing)
+    run_start = None
+    for index, item in enumerate(wanted + [None]):
+        is_new = index < len(target) and (item is None or item not in present)
+        if is_new and run_start is None:
+            run_start = index
+        elif not is_new and run_start is not None:
+            for start in range(run_start, index, SYNC_BATCH_SIZE):
+                operations.append(("add", start, target[start:min(index, start + SYNC_BATCH_SIZE)]))
+            run_start = None
+    return operations
+
+def plan_playlist_sync(current, target):
+    """
+    Plan the fewest writes that turn one track list into another.
+
+    Tracks that are already in the playlist and in order cost nothing.
+    Tracks that are no longer wanted are removed in batches, new tracks
+    are added as contiguous runs at their positions, and tracks that only
+    changed place are either moved one by one or removed and re-added,
+    whichever takes fewer requests.
+
+    Args:
+        current (list): The playlist's track URIs, in order.
+        target (list): The track URIs it should have, in order.
+
+    Returns:
+        list: Operations to apply in order, each one of
+            ("remove", uris) to remove every occurrence of the URIs,
+            ("reorder", range_start, insert_before) to move one track,
+            ("add", position, uris) to insert tracks, and
+            ("replace", uris) to replace the whole playlist.
+    """
+    if None in current:
+        # Unavailable tracks have no URI to remove them by; rewrite the playlist
+        return [("replace", target[:SYNC_BATCH_SIZE])] + [
+            ("add", start, target[start:start + SYNC_BATCH_SIZE])
+            for start in range(SYNC_BATCH_SIZE, len(target), SYNC_BATCH_SIZE)
+        ]
+    plans = [_plan(current, target, readd_moved) for readd_moved in (False, True)]
+    return min(plans, key=len)
+
+def apply_sync_plan(sp, playlist_id, operations, snapshot_id=None):
+    """
+    Apply operations from plan_playlist_sync to a playlist.
+
+    Returns:
+        str: The playlist's snapshot ID after the last write.
+    """
+    for operation in operations:
+        if operation[0] == "remove":
+            result = call_spotify(
+                "playlist_remove", sp.playlist_remove_all_occurrences_of_items, playlist_id, operation[1],
+                snapshot_id=snapshot_id
+            )
+        elif operation[0] == "replace":
+            result = call_spotify("playlist_replace", sp.playlist_replace_items, playlist_id, operation[1])
+        elif operation[0] == "reorder":
+            result = call_spotify(
+                "playlist_reorder", sp.playlist_reorder_items, playlist_id,
+                range_start=operation[1], insert_before=operation[2]
+            )
+        else:
+            result = call_spotify(
+                "playlist_add", sp.playlist_add_items, playlist_id, operation[2], position=operation[1]
+            )
+        snapshot_id = result["snapshot_id"]
+        logging.debug(f"Applied {operation[0]} to playlist {playlist_id}")
+    return snapshot_id
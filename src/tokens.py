@@ -0,0 +1,227 @@
+"""
+Spotify OAuth token stores shared by all sessions
+"""
+
+import os
+import json
+import logging
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from spotipy.cache_handler import CacheHandler
+
+# "memory" keeps tokens in this process; "sqlite" shares them between processes in one file
+TOKEN_STORE = os.getenv("TOKEN_STORE", "memory")
+TOKEN_STORE_PATH = os.getenv("TOKEN_STORE_PATH", ".spotify_tokens.sqlite3")
+TOKEN_STORE_MAX_ENTRIES = int(os.getenv("TOKEN_STORE_MAX_ENTRIES", 10000))
+# Tokens not used for this long belong to sessions that are gone
+TOKEN_STORE_IDLE_TTL = int(os.getenv("TOKEN_STORE_IDLE_TTL", 24 * 3600))
+# Refresh access tokens this many seconds before they expire
+TOKEN_REFRESH_MARGIN = int(os.getenv("TOKEN_REFRESH_MARGIN", 300))
+
+class StoreCacheHandler(CacheHandler):
+    """spotipy cache handler reading and writing one key of a token store"""
+
+    def __init__(self, store, key):
+        self.store = store
+        self.key = key
+
+    def get_cached_token(self):
+        return self.store.get(self.key)
+
+    def save_token_to_cache(self, token_info):
+        self.store.set(self.key, token_info)
+
+class MemoryTokenStore:
+    """
+    In-process token store with LRU and idle-time eviction.
+
+    Lookups are dictionary hits; tokens are lost when the process restarts,
+    which only means users have to connect to Spotify again.
+    """
+
+    def __init__(self, max_entries=TOKEN_STORE_MAX_ENTRIES, idle_ttl=TOKEN_STORE_IDLE_TTL):
+        self.max_entries = max_entries
+        self.idle_ttl = idle_ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def handler(self, key):
+        """Get a spotipy cache handler for one user's token"""
+        return StoreCacheHandler(self, key)
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            last_access, token_info = entry
+            now = time.time()
+            if now - last_access > self.idle_ttl:
+                del self._entries[key]
+                return None
+            self._entries[key] = (now, token_info)
+            self._entries.move_to_end(key)
+            return token_info
+
+    def set(self, key, token_info):
+        with self._lock:
+            self._entries[key] = (time.time(), token_info)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def __len__(self):
+        return len(self._entries)
+
+class SqliteTokenStore:
+    """
+    Token store in a single SQLite file, shared by every app process.
+
+    Entries idle for longer than `idle_ttl` and the least recently used
+    entries beyond `max_entries` are evicted periodically, so the file stays
+    bounded no matter how many visitors connect.
+    """
+
+    # How many writes to allow between eviction passes
+    EVICTION_INTERVAL = 100
+    # Only record an access this long after the previous one, to avoid a write per lookup
+    TOUCH_INTERVAL = 60
+
+    def __init__(self, path=TOKEN_STORE_PATH, max_entries=TOKEN_STORE_MAX_ENTRIES, idle_ttl=TOKEN_STORE_IDLE_TTL):
+        self.path = path
+        self.max_entries = max_entries
+        self.idle_ttl = idle_ttl
+        self._writes = 0
+        self._lock = threading.Lock()
+        # Tokens grant access to users' Spotify accounts. Create the file owner-only
+        # before SQLite opens it; SQLite gives the -wal and -shm files the same mode
+        os.close(os.open(path, os.O_CREAT | os.O_RDWR, 0o600))
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS tokens ("
+            "key TEXT PRIMARY KEY, token TEXT NOT NULL, last_access REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS tokens_last_access ON tokens (last_access)")
+        self._conn.commit()
+        # Files created before this was in place may still be readable by others
+        for file_path in (path, f"{path}-wal", f"{path}-shm"):
+            try:
+                if os.path.exists(file_path):
+                    os.chmod(file_path, 0o600)
+            except OSError as e:
+                logging.warning(f"Could not restrict permissions of {file_path}: {str(e)}")
+
+    def handler(self, key):
+        """Get a spotipy cache handler for one user's token"""
+        return StoreCacheHandler(self, key)
+
+    def get(self, key):
+        try:
+            with self._lock:
+                row = self._conn.execute(
+                    "SELECT token, last_access FROM tokens WHERE key = ?", (key,)
+                ).fetchone()
+                if row is None:
+                    return None
+                token, last_access = row
+                now = time.time()
+                if now - last_access > self.idle_ttl:
+                    self._conn.execute("DELETE FROM tokens WHERE key = ?", (key,))
+                    self._conn.commit()
+                    return None
+                if now - last_access > self.TOUCH_INTERVAL:
+                    self._conn.execute("UPDATE tokens SET last_access = ? WHERE key = ?", (now, key))
+                    self._conn.commit()
+            return json.loads(token)
+        except sqlite3.Error as e:
+            logging.error(f"Error reading token store: {str(e)}")
+            return None
+
+    def set(self, key, token_info):
+        try:
+            with self._lock:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO tokens (key, token, last_access) VALUES (?, ?, ?)",
+                    (key, json.dumps(token_info), time.time())
+                )
+                self._writes += 1
+                if self._writes % self.EVICTION_INTERVAL == 0:
+                    self._evict()
+                self._conn.commit()
+        except sqlite3.Error as e:
+            logging.error(f"Error writing token store: {str(e)}")
+
+    def delete(self, key):
+        try:
+            with self._lock:
+                self._conn.execute("DELETE FROM tokens WHERE key = ?", (key,))
+                self._conn.commit()
+        except sqlite3.Error as e:
+            logging.error(f"Error deleting from token store: {str(e)}")
+
+    def _evict(self):
+        """Drop idle tokens, then the least recently used beyond max_entries"""
+        self._conn.execute("DELETE FROM tokens WHERE last_access < ?", (time.time() - self.idle_ttl,))
+        self._conn.execute(
+            "DELETE FROM tokens WHERE key IN ("
+            "SELECT key FROM tokens ORDER BY last_access DESC LIMIT -1 OFFSET ?)",
+            (self.max_entries,)
+        )
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM tokens").fetchone()[0]
+
+def token_expires_soon(token_info, margin=TOKEN_REFRESH_MARGIN):
+    """Check if an access token expires within `margin` seconds"""
+    return token_info.get("expires_at", 0) - time.time() < margin
+
+def has_scopes(token_info, scope):
+    """Check that a token was granted every scope in a space-separated list"""
+    granted = set((token_info.get("scope") or "").split())
+    return set((scope or "").split()) <= granted
+
+def get_valid_token(auth_manager, margin=TOKEN_REFRESH_MARGIN):
+    """
+    Get the cached token for an auth manager, refreshing it ahead of expiry.
+
+    spotipy only refreshes tokens in their last minute; refreshing earlier
+    means a playlist build that starts now won't run out of token midway.
+
+    Tokens granted before the app asked for more scopes (e.g.
+    ugc-image-upload for cover images) are treated as missing, so the user
+    is asked to connect again instead of later calls failing.
+
+    Returns:
+        dict: The token info, or None if nothing usable is cached.
+    """
+    token_info = auth_manager.cache_handler.get_cached_token()
+    if token_info and not has_scopes(token_info, auth_manager.scope):
+        logging.info("Stored Spotify token lacks scopes the app needs, asking the user to reconnect")
+        return None
+    if token_info and token_expires_soon(token_info, margin):
+        # Saves the new token through the cache handler
+        token_info = auth_manager.refresh_access_token(token_info["refresh_token"])
+    return token_info
+
+_store = None
+_store_lock = threading.Lock()
+
+def get_token_store():
+    """Get the process-wide token store selected by TOKEN_STORE"""
+    global _store
+    with _store_lock:
+        if _store is None:
+            if TOKEN_STORE == "sqlite":
+                _store = SqliteTokenStore()
+            else:
+                _store = MemoryTokenStore()
+        return _store
@@ -0,0 +1,160 @@
+"""
+Tour-aggregate setlists: the expected setlist across an artist's recent shows
+"""
+
+import os
+import logging
+from contextlib import closing
+
+from .cache import TTLCache, memoize, normalize_key
+from .setlistfm import SETLISTFM_CACHE_TTL, SETLISTFM_CACHE_NEGATIVE_TTL, iter_recent_setlists
+from .utils import Song, parse_setlist
+
+# Most shows to aggregate, and the fewest before the ranking may be called stable
+TOUR_MAX_SHOWS = int(os.getenv("TOUR_MAX_SHOWS", 20))
+TOUR_MIN_SHOWS = int(os.getenv("TOUR_MIN_SHOWS", 5))
+# Consecutive shows that must leave the expected setlist unchanged before fetching stops
+TOUR_STABLE_SHOWS = int(os.getenv("TOUR_STABLE_SHOWS", 3))
+# Pages of setlists to stream at most (20 per page, song-less ones included)
+TOUR_MAX_PAGES = int(os.getenv("TOUR_MAX_PAGES", 10))
+TOUR_CACHE_MAX_ENTRIES = int(os.getenv("TOUR_CACHE_MAX_ENTRIES", 64))
+
+_tour_cache = TTLCache(SETLISTFM_CACHE_TTL, TOUR_CACHE_MAX_ENTRIES, SETLISTFM_CACHE_NEGATIVE_TTL)
+
+class SongStats:
+    """How often a song was played across shows, and where in the set"""
+
+    __slots__ = ("song", "plays", "position_total")
+
+    def __init__(self, song):
+        self.song = song
+        self.plays = 0
+        self.position_total = 0
+
+    @property
+    def average_position(self):
+        return self.position_total / self.plays if self.plays else 0
+
+class TourAggregate:
+    """
+    Running song counts over a stream of shows.
+
+    Only the counts are kept, not the setlists, so memory grows with the
+    number of distinct songs rather than the number of shows.
+    """
+
+    def __init__(self, artist_name):
+        self.artist_name = artist_name
+        self.shows = 0
+        self.setlist_ids = []
+        self._song_slots = 0
+        self._stats = {}
+
+    @property
+    def expected_length(self):
+        """The average number of distinct songs per show"""
+        return round(self._song_slots / self.shows) if self.shows else 0
+
+    def add(self, setlist):
+        """Count one show's songs; a song played twice in a show counts once"""
+        songs = parse_setlist(setlist, self.artist_name).songs
+        if not songs:
+            return
+        self.shows += 1
+        self.setlist_ids.append(setlist.get("id"))
+        seen = set()
+        for song in songs:
+            key = normalize_key(song["name"], song["original_artist"])
+            if key in seen:
+                continue
+            seen.add(key)
+            stats = self._stats.get(key)
+            if stats is None:
+                stats = self._stats[key] = SongStats(song)
+            stats.plays += 1
+            stats.position_total += song["position"]
+        self._song_slots += len(seen)
+
+    def ranking(self):
+        """Every song seen, most played first; ties go to the song played earlier in the set"""
+        return sorted(self._stats.values(), key=lambda stats: (-stats.plays, stats.average_position))
+
+    def expected_keys(self):
+        """The songs of the expected setlist, for checking whether it changed"""
+        return frozenset(
+            normalize_key(stats.song["name"], stats.song["original_artist"])
+            for stats in self.ranking()[:self.expected_length]
+        )
+
+    def expected_setlist(self):
+        """
+        Get the setlist the artist is most likely to play.
+
+        The expected_length most played songs, ordered by where they
+        usually come in the set.
+
+        Returns:
+            list: (Song, plays) pairs in set order. Songs are numbered from
+                1 and carry no show-specific info.
+        """
+        top = sorted(self.ranking()[:self.expected_length], key=lambda stats: stats.average_position)
+        return [
+            (Song(stats.song["name"], stats.song["original_artist"], "", stats.song["is_tape"],
+                  stats.song["is_cover"], position), stats.plays)
+            for position, stats in enumerate(top, 1)
+        ]
+
+def aggregate_tour(artist_mbid, artist_name, max_shows=TOUR_MAX_SHOWS, min_shows=TOUR_MIN_SHOWS,
+                   stable_shows=TOUR_STABLE_SHOWS, max_pages=TOUR_MAX_PAGES):
+    """
+    Aggregate an artist's recent shows until the expected setlist settles.
+
+    Setlists are streamed page by page; fetching stops once the expected
+    setlist has stayed the same for `stable_shows` shows in a row (after at
+    least `min_shows`), after `max_shows`, or at the 12-month boundary.
+
+    Args:
+        artist_mbid (str): The artist's MusicBrainz ID.
+        artist_name (str): Credited for songs that aren't covers.
+        max_shows (int, optional): Most shows to aggregate.
+        min_shows (int, optional): Fewest shows before stopping early.
+        stable_shows (int, optional): Shows without change that count as stable.
+        max_pages (int, optional): Most pages of setlists to fetch.
+
+    Returns:
+        TourAggregate: The counts, with no shows if none were found.
+    """
+    aggregate = TourAggregate(artist_name)
+    previous = None
+    unchanged = 0
+    with closing(iter_recent_setlists(artist_mbid, max_pages=max_pages)) as setlists:
+        for setlist in setlists:
+            aggregate.add(setlist)
+            expected = aggregate.expected_keys()
+            unchanged = unchanged + 1 if expected == previous else 0
+            previous = expected
+            if aggregate.shows >= max_shows or (aggregate.shows >= min_shows and unchanged >= stable_shows):
+                break
+    logging.info(f"Aggregated {aggregate.shows} shows for {artist_name}")
+    return aggregate
+
+@memoize(_tour_cache, key=lambda artist_mbid, artist_name: normalize_key(artist_mbid, artist_name))
+def get_tour_setlist(artist_mbid, artist_name):
+    """
+    Get the expected setlist of an artist's current tour.
+
+    Returns:
+        dict: {"songs": [(Song, plays), ...], "shows": int, "setlist_ids": list},
+            or None if there are no recent shows with songs.
+
+    Raises:
+        Exception: If setlists could not be fetched; errors are not cached.
+    """
+    aggregate = aggregate_tour(artist_mbid, artist_name)
+    if aggregate.shows:
+        return {
+            "songs": aggregate.expected_setlist(),
+            "shows": aggregate.shows,
+            "setlist_ids": list(aggregate.setlist_ids)
+        }
+    return None
@@ -2,46 +2,204 @@
 Utility functions for the application
 """
 
+import re
+import threading
+from collections import OrderedDict
+
+# Bracketed suffixes such as "(feat. X)", "[Live at Wembley]" or "(2011 Remaster)"
+_BRACKETED_SUFFIX = re.compile(
+    r"\s*[\(\[][^\)\]]*\b(feat|ft|featuring|live|remaster(ed)?|version|edit|mono|stereo)\b[^\)\]]*[\)\]]"
+)
+# Dash suffixes such as " - Live" or " - Remastered 2009"
+_DASH_SUFFIX = re.compile(
+    r"\s+-\s+[^-]*\b(live|remaster(ed)?|version|edit|mono|stereo|mix|demo)\b.*$"
+)
+# Trailing "feat. X" without brackets
+_FEAT_SUFFIX = re.compile(r"\s+(feat|ft|featuring)\.?\s.*$")
+
+# Parsed setlists kept per (setlist id, last update, artist)
+PARSED_SETLIST_CACHE_SIZE = 128
+
+class Song:
+    """
+    A song in a setlist.
+    
+    Supports song["name"] and song.get("info") like the dicts it replaces.
+    Instances are shared between callers, so treat them as read-only.
+    """
+    
+    __slots__ = ("name", "original_artist", "info", "is_tape", "is_cover", "position")
+    
+    def __init__(self, name, original_artist, info="", is_tape=False, is_cover=False, position=0):
+        self.name = name
+        self.original_artist = original_artist
+        self.info = info
+        self.is_tape = is_tape
+        self.is_cover = is_cover
+        # 1-based position in the whole setlist
+        self.position = position
+    
+    def __getitem__(self, key):
+        try:
+            return getattr(self, key)
+        except (AttributeError, TypeError):
+            raise KeyError(key) from None
+    
+    def get(self, key, default=None):
+        return getattr(self, key, default)
+    
+    def as_dict(self):
+        """Get a plain dict copy of the song"""
+        return {name: getattr(self, name) for name in self.__slots__}
+    
+    def __repr__(self):
+        return f"Song({self.name!r}, {self.original_artist!r}, position={self.position})"
+
+class Set:
+    """A set within a setlist, e.g. the main set or an encore"""
+    
+    __slots__ = ("name", "is_encore", "songs")
+    
+    def __init__(self, name, is_encore, songs):
+        self.name = name
+        self.is_encore = is_encore
+        self.songs = songs
+
+class Setlist:
+    """
+    A setlist parsed from the Setlist.fm JSON in a single pass.
+    
+    Attributes:
+        id (str): The Setlist.fm setlist ID.
+        artist_name (str): The performing artist.
+        sets (tuple): Every Set, in performance order.
+        songs (tuple): Every Song, in performance order.
+        sections (tuple): (title, sets) pairs for display: "Main Set" first,
+            then "Encore" or "Encore 1", "Encore 2", ...
+    """
+    
+    __slots__ = ("id", "artist_name", "sets", "songs", "sections")
+    
+    def __init__(self, id, artist_name, sets):
+        self.id = id
+        self.artist_name = artist_name
+        self.sets = sets
+        self.songs = tuple(song for set_ in sets for song in set_.songs)
+        
+        main_set = tuple(set_ for set_ in sets if not set_.is_encore)
+        encores = [set_ for set_ in sets if set_.is_encore]
+        sections = [("Main Set", main_set)] if main_set else []
+        for i, encore in enumerate(encores, 1):
+            sections.append((f"Encore {i}" if len(encores) > 1 else "Encore", (encore,)))
+        self.sections = tuple(sections)
+
+_parsed_setlists = OrderedDict()
+_parsed_setlists_lock = threading.Lock()
+
+def _parse_setlist(setlist, artist_name):
+    sets = []
+    position = 0
+    for set_data in setlist.get("sets", {}).get("set", []):
+        set_name = set_data.get("name", "")
+        songs = []
+        for song in set_data.get("song", []):
+            position += 1
+            cover = song.get("cover")
+            songs.append(Song(
+                song["name"],
+                cover.get("name", artist_name) if cover is not None else artist_name,
+                song.get("info", ""),
+                song.get("tape", False),
+                cover is not None,
+                position
+            ))
+        sets.append(Set(set_name, "encore" in set_name.lower(), tuple(songs)))
+    return Setlist(setlist.get("id"), artist_name, tuple(sets))
+
+def parse_setlist(setlist, artist_name=None):
+    """
+    Parse a Setlist.fm setlist into a Setlist, reusing an earlier parse.
+    
+    Args:
+        setlist (dict): The setlist as returned by the Setlist.fm API.
+        artist_name (str, optional): Credited for songs that aren't covers.
+            Defaults to the setlist's artist.
+    
+    Returns:
+        Setlist: The parsed setlist.
+    """
+    if isinstance(setlist, Setlist):
+        return setlist
+    if artist_name is None:
+        artist_name = setlist.get("artist", {}).get("name")
+    
+    setlist_id = setlist.get("id")
+    if not setlist_id:
+        return _parse_setlist(setlist, artist_name)
+    
+    key = (setlist_id, setlist.get("lastUpdated"), artist_name)
+    with _parsed_setlists_lock:
+        parsed = _parsed_setlists.get(key)
+        if parsed is not None:
+            _parsed_setlists.move_to_end(key)
+            return parsed
+    
+    parsed = _parse_setlist(setlist, artist_name)
+    with _parsed_setlists_lock:
+        _parsed_setlists[key] = parsed
+        while len(_parsed_setlists) > PARSED_SETLIST_CACHE_SIZE:
+            _parsed_setlists.popitem(last=False)
+    return parsed
+
 def format_setlist_structure(setlist):
-    """Format setlist into Main Set and Encores"""
+    """
+    Format setlist into Main Set and Encores.
+    
+    Returns:
+        list: (title, sets) pairs, where sets are the Setlist.fm set dicts.
+            The app displays parse_setlist(...).sections instead.
+    """
     formatted_sets = []
     main_set = []
     encores = []
     
-    if "sets" in setlist and "set" in setlist["sets"]:
-        for set_data in setlist["sets"]["set"]:
-            if "name" in set_data and "encore" in set_data["name"].lower():
-                encores.append(set_data)
-            else:
-                main_set.append(set_data)
-        
-        # Add main set first
-        if main_set:
-            formatted_sets.append(("Main Set", main_set))
-        
-        # Add encores with proper numbering
-        for i, encore in enumerate(encores, 1):
-            name = f"Encore {i}" if len(encores) > 1 else "Encore"
-            formatted_sets.append((name, [encore]))
+    for set_data in setlist.get("sets", {}).get("set", []):
+        if "encore" in set_data.get("name", "").lower():
+            encores.append(set_data)
+        else:
+            main_set.append(set_data)
     
+    if main_set:
+        formatted_sets.append(("Main Set", main_set))
+    for i, encore in enumerate(encores, 1):
+        formatted_sets.append((f"Encore {i}" if len(encores) > 1 else "Encore", [encore]))
     return formatted_sets
 
+def normalize_title(title):
+    """
+    Normalize a song title for matching across Setlist.fm and Spotify.
+    
+    Lowercases the title, strips live/remaster/feat. suffixes and drops
+    punctuation, so "Song 2 - 2012 Remaster" and "Song 2" compare equal.
+    """
+    title = title.lower()
+    title = _BRACKETED_SUFFIX.sub("", title)
+    title = _DASH_SUFFIX.sub("", title)
+    title = _FEAT_SUFFIX.sub("", title)
+    title = title.replace("&", " and ")
+    title = re.sub(r"[^\w\s]", "", title)
+    return re.sub(r"\s+", " ", title).strip()
+
 def extract_songs_from_setlist(setlist, artist_name):
-    """Extract songs from a setlist with proper metadata"""
-    songs = []
-    if "sets" in setlist and "set" in setlist["sets"]:
-        for set_data in setlist["sets"]["set"]:
-            if "song" in set_data:
-                for song in set_data["song"]:
-                    song_info = {
-                        "name": song["name"],
-                        "original_artist": song.get("cover", {}).get("name", artist_name),
-                        "info": song.get("info", ""),
-                        "is_tape": song.get("tape", False),
-                        "is_cover": "cover" in song
-                    }
-                    songs.append(song_info)
-    return songs
+    """
+    Extract songs from a setlist with proper metadata.
+    
+    Returns:
+        list: A dict per song with name, original_artist, info, is_tape,
+            is_cover and position. The app itself uses the shared Song
+            objects of parse_setlist(...).songs instead of copies.
+    """
+    return [song.as_dict() for song in parse_setlist(setlist, artist_name).songs]
 
 def format_song_display(song_info, index):
     """Format song information for display"""
@@ -0,0 +1,174 @@
+"""
+Streaming playlist writer that adds tracks while they are still being resolved
+"""
+
+import os
+import logging
+import threading
+import time
+from concurrent.futures import Future
+
+from .metrics import RATE_LIMIT_SLEEP_SECONDS
+from .retry import DEFAULT_POLICY, is_transient
+from .spotify import call_spotify
+
+# Spotify accepts at most 100 items per add request
+WRITE_BATCH_SIZE = 100
+# Tracks an idle writer waits for before adding them. With 1 the ready prefix is
+# written whenever the writer is idle, and tracks resolved while a write is in
+# flight go into the next batch, so writes overlap the searches at the cost of a
+# few more add requests. Raising it saves requests, but a setlist shorter than it
+# is then only written at close()
+WRITE_MIN_BATCH_SIZE = int(os.getenv("PLAYLIST_WRITE_MIN_BATCH", 1))
+MAX_WRITE_RETRIES = 3
+
+class PlaylistWriter:
+    """
+    Add resolved tracks to a playlist in order, in batches, from a background thread.
+
+    Results are fed in with add(index, uri) in any order; only the
+    contiguous prefix of the setlist is ever written, so the playlist keeps
+    setlist order. Writes happen while the remaining songs are still being
+    resolved. A failed batch is retried at its explicit position after
+    checking the playlist's snapshot and length, so a request that reached
+    Spotify but whose response was lost is not added twice.
+
+    Use as a context manager; leaving the block flushes the remaining
+    tracks and raises if a batch could not be written.
+    """
+
+    def __init__(self, sp, playlist_id, batch_size=WRITE_BATCH_SIZE, min_batch_size=WRITE_MIN_BATCH_SIZE):
+        """
+        Args:
+            sp (spotipy.Spotify): An authenticated Spotify client.
+            playlist_id (str or Future): The playlist to add to, or a future
+                for it while the playlist is still being created.
+            batch_size (int, optional): Maximum tracks per add request.
+            min_batch_size (int, optional): Tracks an idle writer waits for
+                before adding them.
+        """
+        self.snapshot_id = None
+        self.written = 0
+        self.requests = 0
+        self._sp = sp
+        self._playlist_id = playlist_id
+        self._batch_size = max(1, min(batch_size, WRITE_BATCH_SIZE))
+        self._min_batch_size = max(1, min(min_batch_size, self._batch_size))
+        self._results = {}
+        self._next_index = 0
+        self._ready = []
+        self._closed = False
+        self._aborted = False
+        self._error = None
+        self._condition = threading.Condition()
+        self._thread = threading.Thread(target=self._run, daemon=True, name="playlist-writer")
+        self._thread.start()
+
+    @property
+    def playlist_id(self):
+        if isinstance(self._playlist_id, Future):
+            self._playlist_id = self._playlist_id.result()["id"]
+        return self._playlist_id
+
+    def add(self, index, uri):
+        """Record the URI (or None if not found) for the song at `index`"""
+        with self._condition:
+            self._results[index] = uri
+            while self._next_index in self._results:
+                uri = self._results.pop(self._next_index)
+                if uri:
+                    self._ready.append(uri)
+                self._next_index += 1
+            if len(self._ready) >= self._min_batch_size:
+                self._condition.notify()
+
+    def close(self, flush=True):
+        """
+        Stop accepting tracks and wait for the writer thread.
+
+        Args:
+            flush (bool, optional): Write the remaining ready tracks first;
+                when False, pending tracks are dropped.
+
+        Raises:
+            Exception: The error that stopped a batch from being written.
+        """
+        with self._condition:
+            self._closed = True
+            self._aborted = not flush
+            self._condition.notify()
+        self._thread.join()
+        if self._error is not None:
+            raise self._error
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            try:
+                self.close(flush=False)
+            except Exception as e:
+                logging.error(f"Error writing playlist tracks: {str(e)}")
+
+    def _next_batch(self):
+        """Wait for a batch that is ready to write; None once closed and drained"""
+        with self._condition:
+            while not self._aborted:
+                if len(self._ready) >= self._min_batch_size or (self._closed and self._ready):
+                    batch = self._ready[:self._batch_size]
+                    del self._ready[:self._batch_size]
+                    return batch
+                if self._closed:
+                    return None
+                self._condition.wait()
+            return None
+
+    def _run(self):
+        try:
+            while True:
+                batch = self._next_batch()
+                if batch is None:
+                    return
+                self._write(batch)
+        except Exception as e:
+            self._error = e
+            with self._condition:
+                self._aborted = True
+
+    def _already_written(self, batch):
+        """Check whether a batch whose request failed was applied anyway"""
+        playlist = call_spotify(
+            "playlist_get", self._sp.playlist, self.playlist_id, fields="snapshot_id,tracks.total"
+        )
+        if playlist["snapshot_id"] == self.snapshot_id:
+            return False
+        if playlist["tracks"]["total"] == self.written + len(batch):
+            self.snapshot_id = playlist["snapshot_id"]
+            return True
+        return False
+
+    def _write(self, batch):
+        """Add one batch at the end of what has been written so far, retrying on failure"""
+        for attempt in range(MAX_WRITE_RETRIES + 1):
+            try:
+                if attempt and self._already_written(batch):
+                    break
+                self.requests += 1
+                result = call_spotify(
+                    "playlist_add", self._sp.playlist_add_items, self.playlist_id, batch, position=self.written
+                )
+                self.snapshot_id = result["snapshot_id"]
+                break
+            except Exception as e:
+                # call_spotify only retries adds that cannot have been applied;
+                # after other transient errors, check the playlist before retrying
+                if attempt == MAX_WRITE_RETRIES or not is_transient(e):
+                    raise
+                wait = DEFAULT_POLICY.delay(e, attempt)
+                logging.warning(f"Error adding {len(batch)} tracks to playlist, retrying in {wait:.1f} seconds: {str(e)}")
+                RATE_LIMIT_SLEEP_SECONDS.observe(wait, api="spotify", reason="write_retry")
+                time.sleep(wait)
+        self.written += len(batch)
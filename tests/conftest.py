@@ -0,0 +1,23 @@
+"""
+Shared pytest setup
+"""
+
+import sys
+from pathlib import Path
+
+import pytest
+
+# Add the project root directory to Python path, like the benchmarks do
+project_root = Path(__file__).parent.parent.resolve()
+if str(project_root) not in sys.path:
+    sys.path.insert(0, str(project_root))
+
+@pytest.fixture
+def spotify_calls(monkeypatch):
+    """Let call_spotify through without rate limiting, with fresh circuit breakers"""
+    from src import retry, spotify
+    from src.ratelimit import TokenBucket
+
+    limiter = TokenBucket(rate=1000, capacity=1000)
+    monkeypatch.setattr(spotify, "get_spotify_limiter", lambda: limiter)
+    monkeypatch.setattr(retry, "_breakers", {})
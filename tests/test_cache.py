@@ -0,0 +1,170 @@
+"""
+Tests for the caching utilities in src/cache.py
+"""
+
+import threading
+
+import pytest
+
+from src import cache
+from src.cache import SingleFlight, TrackCache, TTLCache, memoize, normalize_key
+
+class FakeClock:
+    """Stands in for the time module so entries can be expired without sleeping"""
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self):
+        return self.now
+
+    def time(self):
+        return self.now
+
+def test_keys_ignore_case_and_whitespace():
+    assert normalize_key(" The  Band ", "Song") == normalize_key("the band", "song")
+    assert normalize_key("a", None) == normalize_key("a", "")
+
+def test_entries_expire_after_their_ttl(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(cache, "time", clock)
+    ttl_cache = TTLCache(ttl=60, max_entries=10, negative_ttl=5)
+    ttl_cache.set("found", {"id": 1})
+    ttl_cache.set("missing", None)
+
+    clock.now += 10
+    assert ttl_cache.get("found") == (True, {"id": 1})
+    # None results expire after the shorter negative TTL
+    assert ttl_cache.get("missing") == (False, None)
+
+    clock.now += 60
+    assert ttl_cache.get("found") == (False, None)
+    assert ttl_cache.stats()["hits"] == 1 and ttl_cache.stats()["misses"] == 2
+
+def test_least_recently_used_entry_is_evicted():
+    ttl_cache = TTLCache(ttl=60, max_entries=2)
+    ttl_cache.set("a", 1)
+    ttl_cache.set("b", 2)
+    ttl_cache.get("a")
+    ttl_cache.set("c", 3)
+    assert ttl_cache.get("b") == (False, None)
+    assert ttl_cache.get("a") == (True, 1)
+    assert len(ttl_cache) == 2
+
+def test_memoize_calls_once_per_key():
+    calls = []
+
+    @memoize(TTLCache(ttl=60, max_entries=10), key=lambda name: normalize_key(name))
+    def lookup(name):
+        calls.append(name)
+        return None if name == "nobody" else name.upper()
+
+    assert lookup("Band") == "BAND"
+    assert lookup(" band") == "BAND"
+    # "Not found" is cached too
+    assert lookup("nobody") is None
+    assert lookup("nobody") is None
+    assert calls == ["Band", "nobody"]
+    assert lookup.cache.stats()["calls_saved"] == 2
+
+def run_concurrently(flight, func, callers=5):
+    """Call flight.do from several threads; returns what each got, value or exception"""
+    results = [None] * callers
+    started = threading.Barrier(callers)
+
+    def call(i):
+        started.wait()
+        try:
+            results[i] = flight.do("key", func)
+        except Exception as e:
+            results[i] = e
+
+    threads = [threading.Thread(target=call, args=(i,)) for i in range(callers)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results
+
+def test_concurrent_calls_share_one_result():
+    flight = SingleFlight("test")
+    release = threading.Event()
+    calls = []
+
+    def slow():
+        calls.append(1)
+        release.wait(5)
+        return "value"
+
+    # Hold the leader until every other caller is waiting on it
+    threading.Timer(0.2, release.set).start()
+    assert run_concurrently(flight, slow) == ["value"] * 5
+    assert len(calls) == 1
+    assert flight.coalesced == 4
+
+def test_waiters_get_the_leaders_exception():
+    flight = SingleFlight("test")
+    release = threading.Event()
+
+    def failing():
+        release.wait(5)
+        raise ValueError("upstream down")
+
+    threading.Timer(0.2, release.set).start()
+    results = run_concurrently(flight, failing)
+    assert all(isinstance(result, ValueError) for result in results)
+    assert flight.coalesced == 4
+    # Nothing is left in flight, so the next call runs again
+    with pytest.raises(ValueError):
+        flight.do("key", failing)
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(cache, "time", clock)
+    return clock
+
+@pytest.fixture
+def track_cache(tmp_path, clock):
+    return TrackCache(path=str(tmp_path / "tracks.sqlite3"), ttl=3600, negative_ttl=60, max_entries=2)
+
+def last_access(track_cache, song, artist):
+    return track_cache._conn.execute(
+        "SELECT last_access FROM track_cache WHERE key = ?", (normalize_key(song, artist),)
+    ).fetchone()[0]
+
+def test_not_found_results_expire_sooner(track_cache, clock):
+    track_cache.set("Song", "Band", "spotify:track:1")
+    track_cache.set("Lost Song", "Band", None)
+    assert track_cache.get("song ", "band") == (True, "spotify:track:1")
+    assert track_cache.get("Lost Song", "Band") == (True, None)
+
+    clock.now += 120
+    assert track_cache.get("Song", "Band") == (True, "spotify:track:1")
+    assert track_cache.get("Lost Song", "Band") == (False, None)
+    assert track_cache.stats() == {"hits": 2, "negative_hits": 1, "misses": 1, "hit_rate": 0.75}
+
+def test_results_survive_a_restart(tmp_path):
+    path = str(tmp_path / "tracks.sqlite3")
+    TrackCache(path=path).set("Song", "Band", "spotify:track:1")
+    assert TrackCache(path=path).get("Song", "Band") == (True, "spotify:track:1")
+
+def test_access_is_recorded_at_most_once_per_interval(track_cache, clock):
+    track_cache.set("Song", "Band", "spotify:track:1")
+    written = clock.now
+
+    clock.now += TrackCache.TOUCH_INTERVAL / 2
+    track_cache.get("Song", "Band")
+    assert last_access(track_cache, "Song", "Band") == written
+
+    clock.now += TrackCache.TOUCH_INTERVAL
+    track_cache.get("Song", "Band")
+    assert last_access(track_cache, "Song", "Band") == clock.now
+
+def test_least_recently_used_entries_are_evicted(track_cache, clock, monkeypatch):
+    monkeypatch.setattr(TrackCache, "EVICTION_INTERVAL", 1)
+    for i in range(3):
+        clock.now += 1
+        track_cache.set(f"Song {i}", "Band", f"spotify:track:{i}")
+    assert track_cache.get("Song 0", "Band") == (False, None)
+    assert track_cache.get("Song 2", "Band") == (True, "spotify:track:2")
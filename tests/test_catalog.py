@@ -0,0 +1,66 @@
+"""
+Tests for the artist catalog index in src/catalog.py
+"""
+
+import threading
+
+import pytest
+
+from src import catalog
+from src.catalog import get_artist_catalog
+
+class FakeSpotify:
+    """Serves one artist with one album, or fails every artist search"""
+
+    def __init__(self, fail=False):
+        self.fail = fail
+        self.searches = 0
+        self._lock = threading.Lock()
+
+    def search(self, q, type, limit):
+        with self._lock:
+            self.searches += 1
+        if self.fail:
+            raise ValueError("search failed")
+        return {"artists": {"items": [{"id": "ar1", "name": "The Band"}]}}
+
+    def artist_albums(self, artist_id, include_groups, limit, offset):
+        return {"items": [{"id": "al1", "release_date": "2020-01-01"}], "next": None}
+
+    def albums(self, album_ids):
+        tracks = [
+            {"name": "First Song - Remastered 2011", "uri": "spotify:track:1", "artists": [{"id": "ar1"}]},
+            {"name": "Guest Song", "uri": "spotify:track:2", "artists": [{"id": "ar2"}]}
+        ]
+        return {"albums": [{"id": "al1", "tracks": {"items": tracks, "total": len(tracks)}}]}
+
+@pytest.fixture(autouse=True)
+def empty_catalogs(spotify_calls):
+    catalog._catalogs.clear()
+
+def test_catalog_matches_the_artists_own_tracks():
+    artist_catalog = get_artist_catalog(FakeSpotify(), "The Band")
+    assert artist_catalog.lookup("First Song") == "spotify:track:1"
+    assert artist_catalog.lookup("Guest Song") is None
+    assert get_artist_catalog(FakeSpotify(), "the band") is artist_catalog
+
+def test_concurrent_lookups_share_one_build():
+    sp = FakeSpotify()
+    artist_catalog = get_artist_catalog(sp, "The Band")
+    threads = [threading.Thread(target=artist_catalog.lookup, args=("First Song",)) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert sp.searches == 1
+
+def test_failed_build_is_not_retried_until_its_ttl_passes(monkeypatch):
+    sp = FakeSpotify(fail=True)
+    for _ in range(5):
+        assert get_artist_catalog(sp, "The Band").lookup("First Song") is None
+    assert sp.searches == 1
+
+    monkeypatch.setattr(catalog, "CATALOG_FAILURE_TTL", 0)
+    sp.fail = False
+    assert get_artist_catalog(sp, "The Band").lookup("First Song") == "spotify:track:1"
+    assert sp.searches == 2
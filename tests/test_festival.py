@@ -0,0 +1,19 @@
+"""
+Tests for festival playlists in src/festival.py
+"""
+
+from src.festival import merge_lineup_songs
+from src.utils import Song
+
+def test_shared_songs_are_kept_once_in_lineup_order():
+    lineup = [
+        {"songs": [Song("Opener", "Support Act"), Song("Hey Jude", "The Beatles")]},
+        {"songs": []},
+        {"songs": [Song("hey  jude", "the beatles"), Song("Opener", "Headliner"), Song("Encore", "Headliner")]},
+    ]
+    songs, owners = merge_lineup_songs(lineup)
+    # A cover of a song already on the bill is dropped; a same-titled song by another artist is not
+    assert [(song.name, song.original_artist) for song in songs] == [
+        ("Opener", "Support Act"), ("Hey Jude", "The Beatles"), ("Opener", "Headliner"), ("Encore", "Headliner")
+    ]
+    assert owners == [0, 0, 2, 2]
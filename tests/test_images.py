@@ -0,0 +1,39 @@
+"""
+Tests for cover image encoding in src/images.py
+"""
+
+import io
+import random
+
+from PIL import Image
+
+from src.images import COVER_IMAGE_MAX_BYTES, COVER_MAX_QUALITY, COVER_MIN_QUALITY, encode_jpeg
+
+def noise(size, seed=1):
+    """An image of random pixels, about the hardest thing to compress"""
+    rng = random.Random(seed)
+    return Image.frombytes("RGB", (size, size), bytes(rng.getrandbits(8) for _ in range(size * size * 3)))
+
+def test_simple_image_keeps_the_best_quality():
+    data, quality, encodes = encode_jpeg(Image.new("RGB", (640, 640), "red"))
+    assert quality == COVER_MAX_QUALITY
+    assert encodes == 1
+    assert len(data) <= COVER_IMAGE_MAX_BYTES
+
+def test_quality_is_lowered_to_fit_the_budget():
+    img = noise(320)
+    max_bytes = 60 * 1024
+    data, quality, encodes = encode_jpeg(img, max_bytes=max_bytes)
+    assert len(data) <= max_bytes
+    assert COVER_MIN_QUALITY <= quality < COVER_MAX_QUALITY
+    # The chosen quality is close to the best that fits
+    higher = io.BytesIO()
+    img.save(higher, format="JPEG", quality=quality + 4, optimize=True)
+    assert len(higher.getvalue()) > max_bytes * 0.9
+    assert Image.open(io.BytesIO(data)).size == img.size
+
+def test_image_is_shrunk_when_the_lowest_quality_is_too_large():
+    img = noise(320)
+    data, quality, encodes = encode_jpeg(img, max_bytes=8 * 1024)
+    assert len(data) <= 8 * 1024
+    assert Image.open(io.BytesIO(data)).width < img.width
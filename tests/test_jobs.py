@@ -0,0 +1,60 @@
+"""
+Tests for the playlist job queue in src/jobs.py
+"""
+
+import threading
+
+import pytest
+
+from src import jobs
+from src.jobs import DONE, JobExecutor
+
+@pytest.fixture
+def fake_build(monkeypatch):
+    """Replace the build, cover lookup and upload, recording the calls"""
+    calls = {"lookups": [], "uploads": []}
+
+    def get_spotify_artist_image(artist_name):
+        calls["lookups"].append((artist_name, threading.current_thread().name))
+        return f"https://images.test/{artist_name}.jpg"
+
+    def create_playlist_from_songs(sp, songs, **kwargs):
+        return {"playlist_id": "pl1", "track_uris": ["spotify:track:1"], "not_found": []}
+
+    def sync_playlist_from_songs(sp, songs, **kwargs):
+        return dict(create_playlist_from_songs(sp, songs), created=False, changes={"requests": 0})
+
+    def upload_playlist_image(playlist_id, image_url, access_token):
+        calls["uploads"].append((playlist_id, image_url))
+        return True
+
+    monkeypatch.setattr(jobs, "get_spotify_artist_image", get_spotify_artist_image)
+    monkeypatch.setattr(jobs, "prefetch_cover_image", lambda image_url, session=None: None)
+    monkeypatch.setattr(jobs, "create_playlist_from_songs", create_playlist_from_songs)
+    monkeypatch.setattr(jobs, "sync_playlist_from_songs", sync_playlist_from_songs)
+    monkeypatch.setattr(jobs, "upload_playlist_image", upload_playlist_image)
+    return calls
+
+def wait_for(executor, job):
+    executor._executor.shutdown(wait=True)
+    return job.snapshot()
+
+def test_cover_is_looked_up_in_the_background_and_uploaded(fake_build):
+    executor = JobExecutor(max_workers=1)
+    job = executor.submit("session", None, [{"name": "Song"}], name="Playlist", description="",
+                          access_token="token", cover_artist="The Band")
+    snapshot = wait_for(executor, job)
+
+    assert snapshot["status"] == DONE and snapshot["cover_uploaded"]
+    assert fake_build["lookups"][0][0] == "The Band"
+    assert fake_build["lookups"][0][1] != threading.current_thread().name
+    assert fake_build["uploads"] == [("pl1", "https://images.test/The Band.jpg")]
+
+def test_updated_playlist_keeps_its_cover(fake_build):
+    executor = JobExecutor(max_workers=1)
+    job = executor.submit("session", None, [{"name": "Song"}], name="Playlist", description="",
+                          access_token="token", cover_artist="The Band", sync_artist="The Band")
+    snapshot = wait_for(executor, job)
+
+    assert snapshot["status"] == DONE and not snapshot["cover_uploaded"]
+    assert fake_build["uploads"] == []
@@ -0,0 +1,23 @@
+"""
+Tests for playlist build profiling in src/metrics.py
+"""
+
+from src import metrics
+
+def test_only_the_first_builds_are_profiled(tmp_path, monkeypatch):
+    monkeypatch.setattr(metrics, "PROFILE_DIR", str(tmp_path))
+    monkeypatch.setattr(metrics, "_profiles_left", 1)
+    for label in ("first", "second", "third"):
+        with metrics.profile_playlist_build(label):
+            sum(range(1000))
+    assert [path.suffix for path in sorted(tmp_path.glob("*first*"))] == [".prof", ".txt"]
+    assert len(list(tmp_path.iterdir())) == 2
+
+def test_builds_overlapping_a_profile_run_unprofiled(tmp_path, monkeypatch):
+    monkeypatch.setattr(metrics, "PROFILE_DIR", str(tmp_path))
+    monkeypatch.setattr(metrics, "_profiles_left", 2)
+    with metrics.profile_playlist_build("outer"):
+        with metrics.profile_playlist_build("inner"):
+            pass
+    assert not list(tmp_path.glob("*inner*"))
+    assert metrics._profiles_left == 1
@@ -0,0 +1,31 @@
+"""
+Tests for the token buckets in src/ratelimit.py
+"""
+
+import threading
+
+from src.ratelimit import SqliteTokenBucket, TokenBucket
+
+def test_token_bucket_allows_a_burst_then_spaces_calls():
+    bucket = TokenBucket(rate=10, capacity=2)
+    assert bucket._reserve() == 0
+    assert bucket._reserve() == 0
+    assert 0.05 < bucket._reserve() <= 0.1
+
+def test_sqlite_bucket_is_shared_between_instances(tmp_path):
+    path = str(tmp_path / "limits.sqlite3")
+    first = SqliteTokenBucket("api:key", rate=1, capacity=1, path=path)
+    second = SqliteTokenBucket("api:key", rate=1, capacity=1, path=path)
+    assert first._reserve() == 0
+    assert second._reserve() > 0.5
+
+def test_sqlite_bucket_falls_back_to_local_bucket_without_deadlock(tmp_path):
+    bucket = SqliteTokenBucket("api:key", rate=10, capacity=5, path=str(tmp_path / "limits.sqlite3"))
+    # Every statement on a closed connection raises sqlite3.Error, including the rollback
+    bucket._conn.close()
+    waits = []
+    thread = threading.Thread(target=lambda: waits.append(bucket._reserve()), daemon=True)
+    thread.start()
+    thread.join(timeout=5)
+    assert not thread.is_alive(), "_reserve deadlocked on its own lock"
+    assert waits == [0]
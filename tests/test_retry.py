@@ -0,0 +1,91 @@
+"""
+Tests for retries and circuit breaking in src/retry.py
+"""
+
+import time
+
+import pytest
+import requests
+
+from src import retry
+from src.retry import CircuitBreaker, CircuitOpenError, RetryPolicy, call_with_retry
+
+NO_WAIT = RetryPolicy(max_attempts=3, base_delay=0, max_delay=0, deadline=5)
+
+class RateLimited(Exception):
+    http_status = 429
+    headers = {"Retry-After": "0"}
+
+def test_retries_transient_error_with_empty_message():
+    attempts = []
+
+    def flaky():
+        attempts.append(1)
+        if len(attempts) < 3:
+            raise requests.ReadTimeout()
+        return "ok"
+
+    assert call_with_retry("test-empty-message", "endpoint", flaky, policy=NO_WAIT) == "ok"
+    assert len(attempts) == 3
+
+def test_breaker_opens_after_consecutive_failures():
+    breaker = CircuitBreaker("test", failure_threshold=3, reset_timeout=60)
+    breaker.record_failure()
+    breaker.record_failure()
+    breaker.record_success()
+    breaker.record_failure()
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.CLOSED
+    breaker.before_call()
+
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+
+def test_half_open_breaker_lets_one_trial_through():
+    breaker = CircuitBreaker("test", failure_threshold=1, reset_timeout=0.01)
+    breaker.record_failure()
+    time.sleep(0.02)
+
+    breaker.before_call()
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+
+    breaker.record_success()
+    assert breaker.state == CircuitBreaker.CLOSED
+    breaker.before_call()
+
+def test_failed_trial_opens_the_breaker_again():
+    breaker = CircuitBreaker("test", failure_threshold=3, reset_timeout=0.01)
+    for _ in range(3):
+        breaker.record_failure()
+    time.sleep(0.02)
+
+    breaker.before_call()
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+
+def test_neutral_trial_lets_another_trial_through():
+    breaker = CircuitBreaker("test", failure_threshold=1, reset_timeout=0.01)
+    breaker.record_failure()
+    time.sleep(0.02)
+
+    breaker.before_call()
+    breaker.record_neutral()
+    breaker.before_call()
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+
+def test_rate_limits_do_not_open_the_breaker(monkeypatch):
+    breaker = CircuitBreaker("test-rate-limit", failure_threshold=1)
+    monkeypatch.setattr(retry, "_breakers", {"test-rate-limit": breaker})
+
+    def rate_limited():
+        raise RateLimited()
+
+    with pytest.raises(RateLimited):
+        call_with_retry("test-rate-limit", "endpoint", rate_limited, policy=NO_WAIT)
+    assert breaker.state == CircuitBreaker.CLOSED
@@ -0,0 +1,74 @@
+"""
+Tests for the Setlist.fm client in src/setlistfm.py, against the mock server
+"""
+
+import pytest
+
+from benchmarks.mock_servers import MockConfig, SetlistFmServer, artist_name
+from src import retry, setlistfm
+from src.ratelimit import TokenBucket
+
+MOCK_MBID = "00000000-0000-0000-0000-000000000001"
+
+@pytest.fixture
+def server(monkeypatch):
+    """A mock Setlist.fm server, with the module's caches emptied"""
+    server = SetlistFmServer(MockConfig(latency=0)).start()
+    client = setlistfm.SetlistFmClient(headers={"x-api-key": "test"}, base_url=server.api_url)
+    client.limiter = TokenBucket(rate=1000, capacity=1000)
+    monkeypatch.setattr(setlistfm, "get_setlistfm_client", lambda: client)
+    monkeypatch.setattr(retry, "_breakers", {})
+    monkeypatch.setattr(retry, "DEFAULT_POLICY", retry.RetryPolicy(base_delay=0, max_delay=0))
+    for function in (setlistfm.search_artist, setlistfm.get_latest_setlist,
+                     setlistfm.get_artist, setlistfm.get_setlist):
+        function.cache.clear()
+    yield server
+    server.stop()
+
+def test_unknown_artist_is_a_cached_empty_result(server):
+    assert setlistfm.search_artist("Nobody At All") is None
+    assert setlistfm.search_artist("Nobody At All") is None
+    assert server.calls["search_artists"] == 1
+
+def test_artist_without_setlists_has_no_latest_setlist(server):
+    server.config.setlist_pages = 0
+    assert setlistfm.get_latest_setlist(MOCK_MBID) is None
+    assert setlistfm.search_artist(artist_name(1))["mbid"] == MOCK_MBID
+
+def test_server_errors_are_raised_and_not_cached(server):
+    server.config.error_ratio = 1
+    with pytest.raises(Exception):
+        setlistfm.search_artist(artist_name(1))
+    server.config.error_ratio = 0
+    assert setlistfm.search_artist(artist_name(1))["mbid"] == MOCK_MBID
+
+def test_repeat_request_is_conditional_and_reuses_the_cached_body(server, monkeypatch):
+    client = setlistfm.get_setlistfm_client()
+    sent = []
+    session_get = client.session.get
+
+    def get(url, headers=None, **kwargs):
+        sent.append(dict(headers or {}))
+        return session_get(url, headers=headers, **kwargs)
+
+    monkeypatch.setattr(client.session, "get", get)
+    first = client.get_json(f"/artist/{MOCK_MBID}")
+    second = client.get_json(f"/artist/{MOCK_MBID}")
+
+    assert sent[0] == {}
+    assert sent[1]["If-None-Match"] and sent[1]["If-Modified-Since"]
+    assert server.not_modified == 1
+    assert second == first
+
+def test_single_page_artist_needs_one_request(server):
+    # One page of song-less setlists: nothing to find, and no page 2 to ask for
+    server.config.setlists_per_page = 5
+    server.config.setlist_pages = 1
+    assert setlistfm.get_latest_setlist(MOCK_MBID, prefetch_pages=3) is None
+    assert server.calls["artist_setlists"] == 1
+
+def test_later_pages_are_prefetched_once_page_one_is_read(server):
+    server.config.empty_pages = 2
+    setlist = setlistfm.get_latest_setlist(MOCK_MBID, prefetch_pages=2)
+    assert setlist["id"] == f"{MOCK_MBID}-40"
+    assert server.calls["artist_setlists"] <= 4
@@ -0,0 +1,54 @@
+"""
+Tests for ranked track matching in src/spotify.py
+"""
+
+from src.spotify import TRACK_MATCH_MIN_SCORE, match_track, score_track
+
+def track(name, artist="The Band", album="Album", popularity=50, uri=None):
+    return {
+        "name": name,
+        "artists": [{"name": artist}],
+        "album": {"name": album},
+        "popularity": popularity,
+        "uri": uri or f"spotify:track:{name}-{artist}-{popularity}",
+    }
+
+class FakeSearch:
+    """Returns the same candidates for every search"""
+
+    def __init__(self, tracks):
+        self.tracks = tracks
+        self.queries = []
+
+    def search(self, q, type, limit):
+        self.queries.append(q)
+        return {"tracks": {"items": self.tracks}}
+
+def test_exact_title_and_artist_score_full_marks():
+    assert score_track(track("Song"), "Song", "The Band") == 1.0
+    assert score_track(track("Song - 2011 Remaster"), "Song", "the band") == 1.0
+
+def test_other_artist_scores_below_the_threshold():
+    assert score_track(track("Song", artist="Someone Else"), "Song", "The Band") < TRACK_MATCH_MIN_SCORE
+
+def test_live_and_karaoke_versions_are_penalised():
+    studio = score_track(track("Song"), "Song", "The Band")
+    assert score_track(track("Song - Live at Wembley"), "Song", "The Band") < studio
+    assert score_track(track("Song", artist="Karaoke Hits"), "Song", "The Band") < TRACK_MATCH_MIN_SCORE
+    # Unless the setlist asked for that version
+    assert score_track(track("Song (Live)"), "Song (Live)", "The Band") == studio
+
+def test_best_candidate_wins_with_popularity_breaking_ties(spotify_calls):
+    sp = FakeSearch([
+        track("Song - Live", popularity=90),
+        track("Song", popularity=10, uri="spotify:track:quiet"),
+        track("Song", popularity=60, uri="spotify:track:popular"),
+        track("Song", artist="Tribute Band", popularity=99),
+    ])
+    match = match_track(sp, "Song", "The Band")
+    assert match.uri == "spotify:track:popular"
+    assert sp.queries == ["Song The Band"]
+
+def test_no_confident_candidate_is_no_match(spotify_calls):
+    assert match_track(FakeSearch([track("Another Song", artist="Someone")]), "Song", "The Band") is None
+    assert match_track(FakeSearch([]), "Song", "The Band") is None
@@ -0,0 +1,119 @@
+"""
+Tests for playlist sync planning in src/sync.py
+"""
+
+import random
+
+from src.sync import (
+    SYNC_BATCH_SIZE,
+    app_playlist_marker,
+    apply_sync_plan,
+    find_app_playlist,
+    mark_description,
+    plan_playlist_sync,
+)
+
+class FakePlaylist:
+    """A Spotify client holding one playlist, applying writes like the Web API"""
+
+    def __init__(self, uris):
+        self.uris = list(uris)
+        self.requests = 0
+
+    def _snapshot(self):
+        self.requests += 1
+        return {"snapshot_id": f"snapshot-{self.requests}"}
+
+    def playlist_remove_all_occurrences_of_items(self, playlist_id, uris, snapshot_id=None):
+        assert len(uris) <= SYNC_BATCH_SIZE
+        removed = set(uris)
+        self.uris = [uri for uri in self.uris if uri not in removed]
+        return self._snapshot()
+
+    def playlist_replace_items(self, playlist_id, uris):
+        assert len(uris) <= SYNC_BATCH_SIZE
+        self.uris = list(uris)
+        return self._snapshot()
+
+    def playlist_reorder_items(self, playlist_id, range_start, insert_before):
+        assert 0 <= range_start < len(self.uris) and 0 <= insert_before <= len(self.uris)
+        uri = self.uris[range_start]
+        self.uris.insert(insert_before, uri)
+        del self.uris[range_start if range_start < insert_before else range_start + 1]
+        return self._snapshot()
+
+    def playlist_add_items(self, playlist_id, uris, position=None):
+        assert len(uris) <= SYNC_BATCH_SIZE and 0 <= position <= len(self.uris)
+        self.uris[position:position] = uris
+        return self._snapshot()
+
+def sync(current, target):
+    sp = FakePlaylist(current)
+    operations = plan_playlist_sync(current, target)
+    apply_sync_plan(sp, "playlist", operations)
+    return sp, operations
+
+def test_unchanged_playlist_needs_no_writes(spotify_calls):
+    uris = ["a", "b", "a", "c"]
+    assert plan_playlist_sync(uris, uris) == []
+
+def random_lists(rng):
+    """A current and target track list drawn from a small pool, so they share and repeat URIs"""
+    pool = [f"spotify:track:{i}" for i in range(rng.randint(1, 10))]
+    current = [rng.choice(pool) for _ in range(rng.randint(0, 15))]
+    if rng.random() < 0.5:
+        # Mostly the same setlist: a few songs dropped, added and swapped
+        target = [uri for uri in current if rng.random() > 0.2]
+        for _ in range(rng.randint(0, 3)):
+            target.insert(rng.randint(0, len(target)), rng.choice(pool))
+        if len(target) > 1:
+            i, j = rng.sample(range(len(target)), 2)
+            target[i], target[j] = target[j], target[i]
+    else:
+        target = [rng.choice(pool) for _ in range(rng.randint(0, 15))]
+    return current, target
+
+def test_plan_turns_current_into_target(spotify_calls):
+    for seed in range(300):
+        current, target = random_lists(random.Random(seed))
+        sp, operations = sync(current, target)
+        assert sp.uris == target, f"seed {seed}: {current} -> {target}"
+        assert sp.requests == len(operations)
+
+def test_long_target_is_added_in_batches(spotify_calls):
+    target = [f"spotify:track:{i}" for i in range(250)]
+    sp, operations = sync([], target)
+    assert sp.uris == target
+    assert [operation[0] for operation in operations] == ["add", "add", "add"]
+
+def test_unavailable_tracks_rewrite_the_playlist(spotify_calls):
+    target = [f"spotify:track:{i}" for i in range(150)]
+    sp, operations = sync(["spotify:track:1", None], target)
+    assert sp.uris == target
+    assert [operation[0] for operation in operations] == ["replace", "add"]
+
+class FakeLibrary:
+    """A Spotify client listing the current user's playlists, newest first"""
+
+    def __init__(self, playlists):
+        self.playlists = playlists
+
+    def current_user_playlists(self, limit=50, offset=0):
+        return {"items": self.playlists[offset:offset + limit], "next": None}
+
+def test_sync_only_finds_playlists_of_its_kind(spotify_calls):
+    sp = FakeLibrary([
+        {"id": "tour", "name": "Band - Tour setlist (10 shows)", "owner": {"id": "me"},
+         "description": f"The expected setlist. {app_playlist_marker('tour')}."},
+        {"id": "show", "name": "Band - Venue (01-01-2024)", "owner": {"id": "me"},
+         "description": f"Setlist from Band. {app_playlist_marker()}."},
+    ])
+    assert find_app_playlist(sp, "Band", "me")["id"] == "show"
+    assert find_app_playlist(sp, "Band", "me", kind="tour")["id"] == "tour"
+    assert find_app_playlist(sp, "Band", "me", kind="festival") is None
+
+def test_description_gets_the_marker_for_its_kind():
+    assert mark_description("Tour.", "tour") == f"Tour. {app_playlist_marker('tour')}."
+    # A marker for another kind, e.g. left in an edited default description, is replaced
+    assert mark_description(f"Tour. {app_playlist_marker()}.", "tour") == f"Tour. {app_playlist_marker('tour')}."
+    assert mark_description(f"Show. {app_playlist_marker()}.") == f"Show. {app_playlist_marker()}."
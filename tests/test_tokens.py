@@ -0,0 +1,40 @@
+"""
+Tests for token refresh and scope checks in src/tokens.py
+"""
+
+import time
+
+from src.tokens import MemoryTokenStore, get_valid_token
+
+class FakeAuthManager:
+    def __init__(self, store, scope):
+        self.cache_handler = store.handler("user")
+        self.scope = scope
+        self.refreshed = 0
+
+    def refresh_access_token(self, refresh_token):
+        self.refreshed += 1
+        token_info = dict(self.cache_handler.get_cached_token(), expires_at=time.time() + 3600)
+        self.cache_handler.save_token_to_cache(token_info)
+        return token_info
+
+def store_token(scope, expires_in=3600):
+    store = MemoryTokenStore()
+    store.set("user", {"access_token": "a", "refresh_token": "r", "scope": scope,
+                       "expires_at": time.time() + expires_in})
+    return store
+
+def test_token_missing_a_scope_is_not_used():
+    auth_manager = FakeAuthManager(store_token("playlist-modify-public"), "playlist-modify-public ugc-image-upload")
+    assert get_valid_token(auth_manager) is None
+
+def test_token_with_every_scope_is_used():
+    store = store_token("ugc-image-upload playlist-modify-public user-read-email")
+    auth_manager = FakeAuthManager(store, "playlist-modify-public ugc-image-upload")
+    assert get_valid_token(auth_manager)["access_token"] == "a"
+    assert auth_manager.refreshed == 0
+
+def test_token_close_to_expiry_is_refreshed():
+    auth_manager = FakeAuthManager(store_token("ugc-image-upload", expires_in=10), "ugc-image-upload")
+    assert get_valid_token(auth_manager)["expires_at"] > time.time() + 3000
+    assert auth_manager.refreshed == 1
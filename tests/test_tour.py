@@ -0,0 +1,53 @@
+"""
+Tests for tour-aggregate setlists in src/tour.py
+"""
+
+from src import tour
+from src.tour import TourAggregate, aggregate_tour
+
+def show(id, *songs):
+    return {"id": id, "sets": {"set": [{"song": [{"name": name} for name in songs]}]}}
+
+def fake_setlists(monkeypatch, shows):
+    """Serve `shows` from iter_recent_setlists; returns the list of setlists handed out"""
+    served = []
+
+    def iter_recent_setlists(artist_mbid, max_pages=None):
+        for setlist in shows:
+            served.append(setlist)
+            yield setlist
+
+    monkeypatch.setattr(tour, "iter_recent_setlists", iter_recent_setlists)
+    return served
+
+def test_expected_setlist_keeps_the_usual_songs_in_set_order():
+    aggregate = TourAggregate("The Band")
+    aggregate.add(show("tour-1", "Intro", "Hit", "Hit", "Rarity", "Closer"))
+    aggregate.add(show("tour-2", "Intro", "Hit", "Deep Cut", "Closer"))
+    aggregate.add(show("tour-3", "Hit", "Intro", "Closer"))
+    aggregate.add(show("tour-4"))
+
+    # A song played twice in one show counts once; song-less shows are skipped.
+    # Of the songs played once, the one that came earlier in the set makes it
+    assert aggregate.shows == 3
+    assert aggregate.expected_length == 4
+    expected = aggregate.expected_setlist()
+    assert [(song.name, plays) for song, plays in expected] == [
+        ("Intro", 3), ("Hit", 3), ("Deep Cut", 1), ("Closer", 3)
+    ]
+    assert [song.position for song, _ in expected] == [1, 2, 3, 4]
+
+def test_fetching_stops_once_the_setlist_is_stable(monkeypatch):
+    served = fake_setlists(monkeypatch, [show(f"stable-{i}", "A", "B", "C") for i in range(20)])
+    aggregate = aggregate_tour("mbid", "The Band", min_shows=5, stable_shows=3)
+    assert aggregate.shows == 5
+    assert len(served) == 5
+
+def test_fetching_stops_at_max_shows(monkeypatch):
+    # A different closer every night never settles
+    shows = [show(f"changing-{i}", "A", "B", f"Closer {i}") for i in range(20)]
+    served = fake_setlists(monkeypatch, shows)
+    aggregate = aggregate_tour("mbid", "The Band", max_shows=8, min_shows=2, stable_shows=20)
+    assert aggregate.shows == 8
+    assert len(served) == 8
+    assert aggregate.setlist_ids == [f"changing-{i}" for i in range(8)]
@@ -0,0 +1,48 @@
+"""
+Tests for setlist parsing and title normalization in src/utils.py
+"""
+
+import json
+
+from src.utils import extract_songs_from_setlist, format_setlist_structure, normalize_title, parse_setlist
+
+SETLIST = {
+    "id": "abc123",
+    "lastUpdated": "2024-06-01T12:00:00.000+0000",
+    "artist": {"name": "The Band"},
+    "sets": {"set": [
+        {"song": [{"name": "Opener"}, {"name": "Borrowed", "cover": {"name": "Other Artist"}}]},
+        {"name": "Encore 1", "encore": 1, "song": [{"name": "Intro Tape", "tape": True}]},
+        {"name": "Encore 2", "encore": 2, "song": [{"name": "Closer", "info": "extended"}]}
+    ]}
+}
+
+def test_parse_setlist_credits_covers_and_numbers_songs():
+    songs = parse_setlist(SETLIST).songs
+    assert [(song.name, song.original_artist, song.position) for song in songs] == [
+        ("Opener", "The Band", 1), ("Borrowed", "Other Artist", 2),
+        ("Intro Tape", "The Band", 3), ("Closer", "The Band", 4)
+    ]
+    assert songs[1].is_cover and songs[2].is_tape and songs[3]["info"] == "extended"
+
+def test_parse_setlist_sections_and_reuse():
+    parsed = parse_setlist(SETLIST)
+    assert [title for title, _ in parsed.sections] == ["Main Set", "Encore 1", "Encore 2"]
+    assert parse_setlist(dict(SETLIST)) is parsed
+    assert parse_setlist(SETLIST, "Someone Else") is not parsed
+
+def test_extract_songs_returns_plain_dicts():
+    songs = extract_songs_from_setlist(SETLIST, "The Band")
+    assert songs[1] == {"name": "Borrowed", "original_artist": "Other Artist", "info": "",
+                        "is_tape": False, "is_cover": True, "position": 2}
+    json.dumps(songs)
+
+def test_format_setlist_structure_returns_setlist_fm_sets():
+    sections = format_setlist_structure(SETLIST)
+    assert [title for title, _ in sections] == ["Main Set", "Encore 1", "Encore 2"]
+    assert sections[1][1] == [SETLIST["sets"]["set"][1]]
+
+def test_normalize_title_drops_versions_and_punctuation():
+    assert normalize_title("Song 2 - 2012 Remaster") == "song 2"
+    assert normalize_title("Rock & Roll (feat. Someone)") == "rock and roll"
+    assert normalize_title("Don't Stop [Live at Wembley]") == "dont stop"
@@ -0,0 +1,79 @@
+"""
+Tests for the streaming playlist writer in src/writer.py
+"""
+
+import random
+
+import pytest
+import requests
+
+from src import writer
+from src.retry import RetryPolicy
+from src.writer import PlaylistWriter
+
+class FakePlaylist:
+    """A Spotify client holding one playlist; adds can be made to fail"""
+
+    def __init__(self):
+        self.uris = []
+        self.adds = 0
+        self.snapshots = 0
+        # Errors for upcoming adds: (error, applied) where applied means the
+        # request reached Spotify and only the response was lost
+        self.failures = []
+
+    def playlist_add_items(self, playlist_id, uris, position=None):
+        self.adds += 1
+        error, applied = self.failures.pop(0) if self.failures else (None, True)
+        if applied:
+            self.uris[position:position] = uris
+            self.snapshots += 1
+        if error is not None:
+            raise error
+        return {"snapshot_id": f"snapshot-{self.snapshots}"}
+
+    def playlist(self, playlist_id, fields=None):
+        return {"snapshot_id": f"snapshot-{self.snapshots}", "tracks": {"total": len(self.uris)}}
+
+@pytest.fixture
+def no_write_backoff(monkeypatch):
+    monkeypatch.setattr(writer, "DEFAULT_POLICY", RetryPolicy(base_delay=0, max_delay=0))
+
+def write(sp, results, **kwargs):
+    with PlaylistWriter(sp, "playlist", **kwargs) as playlist_writer:
+        for index, uri in results:
+            playlist_writer.add(index, uri)
+    return playlist_writer
+
+def test_tracks_are_written_in_setlist_order(spotify_calls):
+    uris = [f"spotify:track:{i}" if i % 4 else None for i in range(40)]
+    results = list(enumerate(uris))
+    random.Random(1).shuffle(results)
+
+    sp = FakePlaylist()
+    playlist_writer = write(sp, results, batch_size=5)
+    assert sp.uris == [uri for uri in uris if uri]
+    assert playlist_writer.written == len(sp.uris)
+
+def test_lost_response_is_not_added_twice(spotify_calls, no_write_backoff):
+    sp = FakePlaylist()
+    sp.failures = [(None, True), (requests.ReadTimeout(), True)]
+    uris = [f"spotify:track:{i}" for i in range(6)]
+    playlist_writer = write(sp, enumerate(uris), batch_size=3, min_batch_size=3)
+    assert sp.uris == uris
+    assert sp.adds == 2
+    assert playlist_writer.snapshot_id == f"snapshot-{sp.snapshots}"
+
+def test_failed_add_is_retried_at_its_position(spotify_calls, no_write_backoff):
+    sp = FakePlaylist()
+    sp.failures = [(None, True), (requests.ReadTimeout(), False)]
+    uris = [f"spotify:track:{i}" for i in range(6)]
+    write(sp, enumerate(uris), batch_size=3, min_batch_size=3)
+    assert sp.uris == uris
+    assert sp.adds == 3
+
+def test_permanent_error_is_raised_on_close(spotify_calls):
+    sp = FakePlaylist()
+    sp.failures = [(ValueError("bad request"), False)]
+    with pytest.raises(ValueError):
+        write(sp, [(0, "spotify:track:0")])